@@ -0,0 +1,356 @@
+"""Local HTTP/JSON API for a shared DownloaderService.
+
+    POST   /jobs               {"url": ..., "format": "Video", "quality": "High",
+                                "force": false, "priority": 0, "rate_limit": "2M"}
+    GET    /jobs               jobs the server knows about (?state=running)
+    GET    /jobs/<id>          one job (falls back to the history once evicted)
+    DELETE /jobs/<id>          cancel a job
+    GET    /jobs/<id>/events   server-sent events for one job, until it finishes; a
+                               playlist's entries report as entry_progress/entry_done
+    GET    /events             server-sent events for every job
+    GET    /history            finished jobs (?url=&video_id=&status=&q=&limit=)
+    GET    /status             queue, bandwidth and post-processing counters
+
+    python api_server.py --port 8700 --jobs 4
+"""
+import argparse
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from logger_config import app_logger
+from bandwidth import parse_rate
+from downloader_service import DownloaderService, DownloadRequest, Settings
+from job_queue import JobState
+from progress_events import ProgressEvent
+from toolchain import discover_toolchain
+
+_JOB_PATH_RE = re.compile(r"^/jobs/([0-9A-Za-z_-]+)(/events)?$")
+FORMATS = ("Video", "Audio")
+QUALITIES = ("High", "Medium", "Low")
+
+
+class EventHub:
+    """Fans job events out to server-sent-event subscribers.
+
+    Each subscriber gets a bounded queue; a client that stops reading loses
+    events (and is told how many) instead of growing the server's memory.
+    """
+
+    def __init__(self, max_pending: int = 1000):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._subscribers: List[Tuple[Optional[str], "queue.Queue[Dict[str, Any]]", List[int]]] = []
+
+    def subscribe(self, job_id: Optional[str] = None) -> Tuple["queue.Queue[Dict[str, Any]]", List[int]]:
+        """Queue of events for ``job_id`` (or every job), plus a one-item dropped-event counter."""
+        subscription = (job_id, queue.Queue(maxsize=self.max_pending), [0])
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription[1], subscription[2]
+
+    def unsubscribe(self, events: "queue.Queue[Dict[str, Any]]") -> None:
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[1] is not events]
+
+    def publish(self, event: str, job_id: str, data: Dict[str, Any]) -> None:
+        message = {"event": event, "job_id": job_id, "data": data}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for wanted, events, dropped in subscribers:
+            if wanted is not None and wanted != job_id:
+                continue
+            try:
+                events.put_nowait(message)
+            except queue.Full:
+                dropped[0] += 1
+
+
+class ApiServer:
+    """Serves the job API for ``service`` on a background thread.
+
+    At most ``max_pending`` jobs may wait in the queue; further submissions
+    get ``429 Too Many Requests`` until it drains. Binds to localhost by
+    default; set ``token`` to require ``Authorization: Bearer <token>``.
+    """
+
+    KEEPALIVE_SECONDS = 15.0
+
+    def __init__(
+        self,
+        service: DownloaderService,
+        host: str = "127.0.0.1",
+        port: int = 8700,
+        max_pending: int = 1000,
+        token: Optional[str] = None,
+    ):
+        self.service = service
+        self.max_pending = max_pending
+        self.token = token
+        self.events = EventHub()
+        self._closed = threading.Event()
+        self._submit_lock = threading.Lock()
+        service.progress_listeners.append(self._on_progress)
+
+        api = self
+
+        class Handler(ApiRequestHandler):
+            server_api = api
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="api-server", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "ApiServer":
+        self._thread.start()
+        app_logger.log_info(f"Job API listening on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        self._closed.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._on_progress in self.service.progress_listeners:
+            self.service.progress_listeners.remove(self._on_progress)
+
+    def submit(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        url = body.get("url")
+        if not isinstance(url, str) or not url.strip():
+            return 400, {"error": "'url' is required"}
+        format_ = body.get("format", "Video")
+        quality = body.get("quality", "High")
+        if format_ not in FORMATS or quality not in QUALITIES:
+            return 400, {"error": f"'format' must be one of {FORMATS} and 'quality' one of {QUALITIES}"}
+        try:
+            rate_limit = parse_rate(body["rate_limit"]) if body.get("rate_limit") else None
+            priority = int(body.get("priority", 0))
+        except (TypeError, ValueError, OverflowError) as e:
+            return 400, {"error": str(e)}
+        req = DownloadRequest(
+            url=url.strip(), format_=format_, quality=quality,
+            force=bool(body.get("force")), rate_limit=rate_limit,
+        )
+        # Chosen up front so the callbacks can tag their events with it
+        job_id = uuid.uuid4().hex[:12]
+        with self._submit_lock:
+            if self.service.status()["queued"] >= self.max_pending:
+                return 429, {"error": "Too many queued jobs; retry later"}
+            self.service.run(req, priority=priority, job_id=job_id, **self._callbacks(job_id))
+        app_logger.log_info(f"API queued job {job_id} for {req.url}")
+        return 202, {"job_id": job_id, "state": JobState.QUEUED}
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.service.queue.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        return self.service.history.get(job_id)
+
+    def _callbacks(self, job_id: str) -> Dict[str, Any]:
+        events = self.events
+
+        def on_line(line: str) -> None:
+            events.publish("output", job_id, {"line": line})
+
+        def on_entry_done(success: bool, destination: Optional[str], error: Optional[str]) -> None:
+            events.publish("entry_done", job_id, {"success": success, "destination": destination, "error": error})
+
+        def on_done(success: bool, destination: Optional[str], error: Optional[str]) -> None:
+            events.publish("done", job_id, {"success": success, "destination": destination, "error": error})
+
+        def on_progress(event: ProgressEvent) -> None:
+            # The job's own progress arrives through _on_progress; this forwards its
+            # playlist entries', which are published under their own job IDs
+            if event.job_id != job_id:
+                events.publish("entry_progress", job_id, dict(event.to_dict(), entry_job_id=event.job_id))
+
+        return {"on_line": on_line, "on_done": on_done, "on_entry_done": on_entry_done, "on_progress": on_progress}
+
+    def _on_progress(self, event: ProgressEvent) -> None:
+        self.events.publish("progress", event.job_id, event.to_dict())
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_api: ApiServer
+
+    def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+        app_logger.log_debug(f"API {self.address_string()} {format % args}")
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        api = self.server_api
+        parts = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        path = parts.path.rstrip("/") or "/"
+        match = _JOB_PATH_RE.match(path)
+        if path == "/status":
+            self._send_json(200, api.service.status())
+        elif path == "/jobs":
+            jobs = [job.snapshot() for job in api.service.queue.jobs()]
+            if params.get("state"):
+                jobs = [job for job in jobs if job["state"] == params["state"]]
+            self._send_json(200, {"jobs": jobs})
+        elif path == "/history":
+            try:
+                limit = min(int(params.get("limit", 100)), 1000)
+            except ValueError:
+                self._send_json(400, {"error": "'limit' must be a number"})
+                return
+            rows = api.service.history.search(
+                url=params.get("url"), video_id=params.get("video_id"),
+                status=params.get("status"), text=params.get("q"), limit=limit,
+            )
+            self._send_json(200, {"jobs": rows})
+        elif path == "/events":
+            self._stream_events(None)
+        elif match and match.group(2):
+            if api.job(match.group(1)) is None:
+                self._send_json(404, {"error": "No such job"})
+            else:
+                self._stream_events(match.group(1))
+        elif match:
+            job = api.job(match.group(1))
+            self._send_json(200, job) if job else self._send_json(404, {"error": "No such job"})
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if urlsplit(self.path).path.rstrip("/") != "/jobs":
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, UnicodeDecodeError):
+            self._send_json(400, {"error": "Body must be a JSON object"})
+            return
+        if not isinstance(body, dict):
+            self._send_json(400, {"error": "Body must be a JSON object"})
+            return
+        status, payload = self.server_api.submit(body)
+        headers = {"Retry-After": "5"} if status == 429 else {}
+        self._send_json(status, payload, headers)
+
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        match = _JOB_PATH_RE.match(urlsplit(self.path).path.rstrip("/"))
+        if not match or match.group(2):
+            self._send_json(404, {"error": "Not found"})
+            return
+        if self.server_api.service.cancel(match.group(1)):
+            self._send_json(200, {"job_id": match.group(1), "cancelled": True})
+        elif self.server_api.job(match.group(1)) is None:
+            self._send_json(404, {"error": "No such job"})
+        else:
+            self._send_json(409, {"error": "Job already finished"})
+
+    def _authorized(self) -> bool:
+        token = self.server_api.token
+        if token and self.headers.get("Authorization") != f"Bearer {token}":
+            self._send_json(401, {"error": "Unauthorized"})
+            return False
+        return True
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self, job_id: Optional[str]) -> None:
+        api = self.server_api
+        events, dropped = api.events.subscribe(job_id)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            if job_id is not None:
+                # Late subscribers still learn how an already finished job ended
+                snapshot = api.job(job_id) or {}
+                if snapshot.get("state") in JobState.FINISHED or snapshot.get("status") in JobState.FINISHED:
+                    self._write_event("done", job_id, snapshot)
+                    return
+            reported_drops = 0
+            while not api._closed.is_set():
+                try:
+                    message = events.get(timeout=api.KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                if dropped[0] != reported_drops:
+                    self._write_event("dropped", message["job_id"], {"count": dropped[0] - reported_drops})
+                    reported_drops = dropped[0]
+                self._write_event(message["event"], message["job_id"], message["data"])
+                if job_id is not None and message["event"] == "done":
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            api.events.unsubscribe(events)
+
+    def _write_event(self, event: str, job_id: str, data: Dict[str, Any]) -> None:
+        payload = json.dumps(dict(data, job_id=job_id), ensure_ascii=False)
+        self.wfile.write(f"event: {event}\ndata: {payload}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the downloader as a local HTTP/JSON job API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("-o", "--output-dir", default=os.path.expanduser("~/Downloads"))
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="Concurrent downloads (default: 2)")
+    parser.add_argument("--output-template", help="Output layout (flat, by-uploader, by-date, by-id) or yt-dlp template")
+    parser.add_argument("--max-pending", type=int, default=1000, help="Queued jobs before submissions get 429")
+    parser.add_argument("--token", default=os.environ.get("YTD_API_TOKEN"),
+                        help="Require this bearer token (default: $YTD_API_TOKEN)")
+    args = parser.parse_args(argv)
+
+    settings = Settings(
+        downloads_dir=os.path.abspath(os.path.expanduser(args.output_dir)),
+        max_concurrent_downloads=args.jobs,
+        log_to_stderr=True,
+        output_template=args.output_template,
+    )
+    os.makedirs(settings.downloads_dir, exist_ok=True)
+    toolchain = discover_toolchain(os.path.join(settings.data_dir, "toolchain.json"))
+    settings.ffmpeg_path = toolchain.ffmpeg_path
+    service = DownloaderService(yt_dlp_path=toolchain.yt_dlp_path, settings=settings)
+
+    server = ApiServer(service, args.host, args.port, args.max_pending, args.token)
+    print(f"Job API listening on {server.base_url}", file=sys.stderr)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.queue.shutdown(cancel_pending=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
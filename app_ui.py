@@ -1,12 +1,23 @@
+import queue
+import time
 import tkinter as tk
+from collections import deque
 from tkinter import messagebox, scrolledtext, ttk
-from typing import Optional
+from typing import Deque, Iterable, Optional
 
 from logger_config import app_logger
 from downloader_service import DownloaderService, DownloadRequest
+from progress_events import ProgressEvent, ProgressPhase, format_progress_line
 
 
 class AppUI:
+    QUEUE_POLL_MS = 1000
+    # Progress window refresh period and the number of log lines it keeps
+    UI_FRAME_MS = 100
+    LOG_MAX_LINES = 500
+    # Rows shown in the history window per search
+    HISTORY_ROWS = 500
+
     def __init__(self, root: tk.Tk, service: DownloaderService):
         try:
             app_logger.log_info("Initializing AppUI...")
@@ -59,6 +70,14 @@ class AppUI:
         ttk.Button(
             self.mainframe, text="Download", command=self.on_download_click
         ).grid(column=1, row=6, sticky=tk.W)
+        ttk.Button(
+            self.mainframe, text="History", command=self.show_history_window
+        ).grid(column=1, row=6, sticky=tk.E)
+
+        self.queue_status_var = tk.StringVar(value="")
+        ttk.Label(self.mainframe, textvariable=self.queue_status_var).grid(
+            column=0, row=7, columnspan=2, sticky=tk.W
+        )
 
         for child in self.mainframe.winfo_children():
             child.grid_configure(padx=5, pady=5)
@@ -66,6 +85,18 @@ class AppUI:
         self.url_entry.focus()
         self.root.bind("<Return>", lambda _: self.on_download_click())
 
+        self._poll_queue_status()
+        self._resume_interrupted()
+
+    def _resume_interrupted(self) -> None:
+        """Reopen downloads that were still running when the app last quit."""
+        try:
+            for req in self.service.interrupted_requests():
+                app_logger.log_info(f"Resuming interrupted download: {req.url}")
+                self.show_progress_window(req)
+        except Exception:
+            app_logger.log_exception("Error resuming interrupted downloads")
+
     def on_download_click(self):
         try:
             url = self.url_entry.get().strip()
@@ -91,39 +122,167 @@ class AppUI:
         progress_window.title("Download in Progress")
         progress_window.geometry("500x300")
 
-        ttk.Label(progress_window, text="Downloading...").pack(pady=5)
+        status_var = tk.StringVar(value="Waiting in queue...")
+        ttk.Label(progress_window, textvariable=status_var).pack(pady=5)
 
         text_area = scrolledtext.ScrolledText(progress_window, wrap=tk.WORD, height=10)
         text_area.pack(expand=True, fill="both", padx=10, pady=5)
 
-        progress_bar = ttk.Progressbar(progress_window, mode="indeterminate")
+        progress_bar = ttk.Progressbar(progress_window, mode="indeterminate", maximum=100)
         progress_bar.pack(fill="x", padx=10, pady=5)
         progress_bar.start()
 
+        job_id: Optional[str] = None
+        ttk.Button(
+            progress_window,
+            text="Cancel",
+            command=lambda: job_id and self.service.cancel(job_id),
+        ).pack(pady=5)
+
+        # Worker threads only enqueue; the Tk thread drains the queue at a fixed frame rate
+        updates: "queue.Queue[tuple]" = queue.Queue()
+        window_open = [True]
+
         def on_line(line: str) -> None:
-            self.root.after(0, lambda: self._append_text(text_area, line))
+            if window_open[0]:
+                updates.put(("line", line))
+
+        def on_progress(event: ProgressEvent) -> None:
+            if window_open[0]:
+                updates.put(("progress", event))
 
         def on_done(
             success: bool, destination: Optional[str], error: Optional[str]
         ) -> None:
-            def finalize():
-                progress_window.after(1000, progress_window.destroy)
-                if success:
-                    if destination:
-                        messagebox.showinfo(
-                            "Download Completed", f"File saved to:\n{destination}"
-                        )
-                        print(f"File saved to: {destination}")
-                    else:
-                        messagebox.showinfo(
-                            "Success", "Download completed, but file path not found!"
-                        )
+            updates.put(("done", (success, destination, error)))
+
+        def finalize(success: bool, destination: Optional[str], error: Optional[str]) -> None:
+            progress_window.after(1000, progress_window.destroy)
+            if success:
+                if destination:
+                    messagebox.showinfo(
+                        "Download Completed", f"File saved to:\n{destination}"
+                    )
+                    print(f"File saved to: {destination}")
                 else:
-                    messagebox.showerror("Error", f"Download failed: {error}")
+                    messagebox.showinfo(
+                        "Success", "Download completed, but file path not found!"
+                    )
+            else:
+                messagebox.showerror("Error", f"Download failed: {error}")
+
+        def pump() -> None:
+            if not progress_window.winfo_exists():
+                # Closed by the user; stop buffering output nobody will see
+                window_open[0] = False
+                return
+            lines: Deque[str] = deque(maxlen=self.LOG_MAX_LINES)
+            latest: Optional[ProgressEvent] = None
+            result = None
+            try:
+                while True:
+                    kind, payload = updates.get_nowait()
+                    if kind == "line":
+                        lines.append(payload)
+                    elif kind == "progress":
+                        latest = payload
+                    else:
+                        result = payload
+            except queue.Empty:
+                pass
+
+            if lines:
+                self._append_lines(text_area, lines)
+            if latest is not None:
+                self._show_progress(progress_bar, status_var, latest)
+            if result is not None:
+                progress_bar.stop()
+                finalize(*result)
+                return
+            progress_window.after(self.UI_FRAME_MS, pump)
+
+        job_id = self.service.run(req, on_line=on_line, on_done=on_done, on_progress=on_progress)
+        pump()
+
+    def show_history_window(self) -> None:
+        """Browse finished downloads, newest first, filtered by text and status."""
+        window = tk.Toplevel(self.root)
+        window.title("Download History")
+        window.geometry("800x400")
+
+        filters = ttk.Frame(window)
+        filters.pack(fill="x", padx=10, pady=5)
+        ttk.Label(filters, text="Search:").pack(side=tk.LEFT)
+        search_entry = ttk.Entry(filters, width=40)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        status_var = tk.StringVar(value="all")
+        ttk.Combobox(
+            filters,
+            textvariable=status_var,
+            values=["all", "completed", "failed", "cancelled"],
+            state="readonly",
+            width=10,
+        ).pack(side=tk.LEFT, padx=5)
 
-            self.root.after(0, finalize)
+        columns = ("finished", "status", "title", "size", "result")
+        tree = ttk.Treeview(window, columns=columns, show="headings")
+        for column, heading, width in (
+            ("finished", "Finished", 130),
+            ("status", "Status", 80),
+            ("title", "Title", 250),
+            ("size", "Size", 80),
+            ("result", "File / error", 260),
+        ):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor=tk.W)
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill="y")
+        tree.pack(expand=True, fill="both", padx=10, pady=5)
 
-        self.service.run(req, on_line=on_line, on_done=on_done)
+        def refresh(*_) -> None:
+            status = status_var.get()
+            rows = self.service.history.search(
+                status=None if status == "all" else status,
+                text=search_entry.get().strip() or None,
+                limit=self.HISTORY_ROWS,
+            )
+            tree.delete(*tree.get_children())
+            for row in rows:
+                size = f"{row['size'] / (1024 * 1024):.1f} MiB" if row.get("size") else ""
+                tree.insert("", tk.END, values=(
+                    time.strftime("%Y-%m-%d %H:%M", time.localtime(row["finished_at"])),
+                    row["status"],
+                    row.get("title") or row["url"],
+                    size,
+                    row.get("destination") or row.get("error") or "",
+                ))
+
+        ttk.Button(filters, text="Search", command=refresh).pack(side=tk.LEFT, padx=5)
+        search_entry.bind("<Return>", refresh)
+        status_var.trace_add("write", refresh)
+        refresh()
+
+    def _poll_queue_status(self) -> None:
+        """Refresh the queue summary line once a second."""
+        try:
+            status = self.service.status()
+            converting = status.get("postprocess", {})
+            converting_count = converting.get("running", 0) + converting.get("queued", 0)
+            if not status.get("toolchain_ready", True):
+                self.queue_status_var.set("Preparing downloader...")
+            elif status["queued"] or status["running"] or status["paused"] or converting_count:
+                self.queue_status_var.set(
+                    f"Running {status['running']}/{status['max_workers']}, "
+                    f"queued {status['queued']}, paused {status['paused']}, "
+                    f"converting {converting_count} "
+                    f"({status['jobs_per_minute']:.1f} jobs/min)"
+                )
+            else:
+                self.queue_status_var.set("")
+        except Exception:
+            app_logger.log_exception("Error polling download queue status")
+        self.root.after(self.QUEUE_POLL_MS, self._poll_queue_status)
 
     def on_closing(self):
         """Handle window closing event"""
@@ -133,7 +292,25 @@ class AppUI:
             self.root.quit()
             self.root.destroy()
 
-    @staticmethod
-    def _append_text(text_area: scrolledtext.ScrolledText, message: str) -> None:
-        text_area.insert(tk.END, message + "\n")
+    @classmethod
+    def _append_lines(cls, text_area: scrolledtext.ScrolledText, lines: Iterable[str]) -> None:
+        """Append a batch of lines in one insert and trim the view to LOG_MAX_LINES."""
+        text_area.insert(tk.END, "\n".join(lines) + "\n")
+        line_count = int(text_area.index("end-1c").split(".")[0]) - 1
+        if line_count > cls.LOG_MAX_LINES:
+            text_area.delete("1.0", f"{line_count - cls.LOG_MAX_LINES + 1}.0")
         text_area.yview(tk.END)
+
+    @staticmethod
+    def _show_progress(
+        progress_bar: ttk.Progressbar, status_var: tk.StringVar, event: ProgressEvent
+    ) -> None:
+        fraction = event.fraction
+        if event.phase == ProgressPhase.DOWNLOADING and fraction is not None:
+            if str(progress_bar.cget("mode")) != "determinate":
+                progress_bar.stop()
+                progress_bar.configure(mode="determinate")
+            progress_bar["value"] = fraction * 100
+        elif event.phase == ProgressPhase.FINISHED:
+            progress_bar["value"] = 100
+        status_var.set(format_progress_line(event).splitlines()[0])
@@ -0,0 +1,293 @@
+import asyncio
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from logger_config import app_logger
+from downloader_service import BinaryOutput, DownloaderService, DownloadRequest
+from job_queue import DownloadJob, JobState
+from progress_events import ProgressEvent
+
+JobResult = Tuple[bool, Optional[str], Optional[str]]
+
+
+class AsyncDownloadEngine:
+    """Runs DownloaderService jobs on an asyncio event loop instead of one thread per job.
+
+    yt-dlp subprocesses are driven with ``asyncio.create_subprocess_exec``
+    and read without blocking, so a binary job costs a coroutine rather
+    than a thread. Jobs on the yt-dlp Python module still need a thread and
+    run in a bounded executor of ``module_workers`` threads. Binary jobs do
+    their blocking bookkeeping (archive, metadata cache, disk admission,
+    journal and history I/O) in a separate executor with a thread per
+    concurrent job, never on the event loop. Jobs waiting there for disk
+    space then can't hold up the jobs whose completion frees it. At most
+    ``max_concurrent`` jobs download at once; the rest wait on a semaphore.
+
+    Jobs share the service's archive, metadata cache, journal and
+    bandwidth scheduler with the threaded queue. Playlist entries are
+    fanned out onto the service's threaded queue.
+    """
+
+    def __init__(
+        self,
+        service: DownloaderService,
+        max_concurrent: Optional[int] = None,
+        module_workers: Optional[int] = None,
+    ):
+        self.service = service
+        self.max_concurrent = max_concurrent or service.settings.max_concurrent_downloads
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=module_workers or service.settings.max_concurrent_downloads,
+            thread_name_prefix="async-download",
+        )
+        # One thread per job that can be past the semaphore
+        self._housekeeping = ThreadPoolExecutor(
+            max_workers=self.max_concurrent,
+            thread_name_prefix="async-housekeeping",
+        )
+        self._jobs: Dict[str, DownloadJob] = {}
+        self._results: Dict[str, "asyncio.Future[JobResult]"] = {}
+        self._tasks: Dict[str, "asyncio.Task[None]"] = {}
+
+    async def submit(
+        self,
+        req: DownloadRequest,
+        on_line: Optional[Callable[[str], None]] = None,
+        on_done: Optional[Callable[[bool, Optional[str], Optional[str]], None]] = None,
+        on_entry_done: Optional[Callable[[bool, Optional[str], Optional[str]], None]] = None,
+        job_id: Optional[str] = None,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+    ) -> str:
+        """Start a download and return its job ID; ``wait`` returns its result.
+
+        Callbacks may be invoked from executor threads for module jobs.
+        """
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        result: "asyncio.Future[JobResult]" = loop.create_future()
+
+        def finished(success: bool, destination: Optional[str], error: Optional[str]) -> None:
+            if on_done is not None:
+                on_done(success, destination, error)
+            loop.call_soon_threadsafe(_set_result, result, (success, destination, error))
+
+        job = self.service.create_job(
+            req,
+            on_line=on_line or (lambda line: None),
+            on_done=finished,
+            on_entry_done=on_entry_done,
+            job_id=job_id,
+            on_progress=on_progress,
+        )
+        self._jobs[job.job_id] = job
+        self._results[job.job_id] = result
+        self._tasks[job.job_id] = loop.create_task(self._run(job))
+        return job.job_id
+
+    async def wait(self, job_id: str) -> JobResult:
+        """Wait for a job and return ``(success, destination, error)``."""
+        return await asyncio.shield(self._results[job_id])
+
+    async def download(self, req: DownloadRequest, **callbacks: Any) -> JobResult:
+        """Submit a download and wait for it."""
+        return await self.wait(await self.submit(req, **callbacks))
+
+    async def cancel(self, job_id: str, resumable: bool = False) -> bool:
+        """Cancel a job; with ``resumable`` it stays journaled for the next launch."""
+        job = self._jobs.get(job_id)
+        if job is None or job.state in JobState.FINISHED:
+            return False
+        app_logger.log_info(f"Cancelling async job {job_id}")
+        job.request_cancel(resumable)
+        if job.started_at is None:
+            job.finish(False, None, "Cancelled")
+        return True
+
+    def get(self, job_id: str) -> Optional[DownloadJob]:
+        return self._jobs.get(job_id)
+
+    def status(self) -> Dict[str, int]:
+        counts = {state: 0 for state in (
+            JobState.QUEUED, JobState.RUNNING, JobState.COMPLETED, JobState.FAILED, JobState.CANCELLED
+        )}
+        for job in self._jobs.values():
+            counts[job.state] = counts.get(job.state, 0) + 1
+        counts["max_concurrent"] = self.max_concurrent
+        return counts
+
+    async def aclose(self, cancel_pending: bool = True) -> None:
+        """Cancel (resumably) or wait for outstanding jobs, then stop the executor."""
+        pending = [job_id for job_id, task in self._tasks.items() if not task.done()]
+        if cancel_pending:
+            for job_id in pending:
+                await self.cancel(job_id, resumable=True)
+        if pending:
+            await asyncio.gather(*(self._tasks[job_id] for job_id in pending), return_exceptions=True)
+        self._executor.shutdown(wait=False)
+        self._housekeeping.shutdown(wait=False)
+
+    async def _run(self, job: DownloadJob) -> None:
+        assert self._semaphore is not None
+        async with self._semaphore:
+            if job.cancelled or job.state in JobState.FINISHED:
+                return
+            job.state = JobState.RUNNING
+            job.started_at = time.time()
+            try:
+                await self._run_with_retries(job)
+            except Exception as exc:
+                app_logger.log_exception(f"Unhandled error in async job {job.job_id}")
+                job.finish(False, None, str(exc))
+            if not job.deferred and job.state not in JobState.FINISHED:
+                job.finish(False, None, "Job ended without reporting a result")
+        # A fanned-out playlist finishes later, when its last entry does
+        await asyncio.shield(self._results[job.job_id])
+
+    async def _run_with_retries(self, job: DownloadJob) -> None:
+        """Attempts and backoff as the threaded queue does them, sleeping on the loop in between."""
+        service = self.service
+        loop = asyncio.get_running_loop()
+        service.start_job(job)
+        while True:
+            wait = service.host_wait(job)
+            if wait > 0:
+                if await self._sleep_unless_cancelled(job, wait):
+                    job.finish(False, None, "Cancelled")
+                    return
+                continue
+            if service.use_python_module:
+                await loop.run_in_executor(self._executor, service.attempt, job)
+            else:
+                job.attempts += 1
+                await self._run_binary(job)
+                await loop.run_in_executor(self._housekeeping, service.end_attempt, job)
+            delay = service.take_retry(job)
+            if delay is None:
+                return
+            if await self._sleep_unless_cancelled(job, delay):
+                job.finish(False, None, "Cancelled")
+                return
+
+    @staticmethod
+    async def _sleep_unless_cancelled(job: DownloadJob, seconds: float) -> bool:
+        """Sleep up to ``seconds``; True if the job was cancelled meanwhile."""
+        if seconds <= 0 or job.cancelled:
+            return job.cancelled
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(woken.set)
+
+        job.add_cancel_callback(wake)
+        try:
+            await asyncio.wait_for(woken.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # A job can wait out many backoffs; don't leave one waker behind per wait
+            job.remove_cancel_callback(wake)
+        return job.cancelled
+
+    async def _run_binary(self, job: DownloadJob) -> None:
+        service = self.service
+        loop = asyncio.get_running_loop()
+        app_logger.log_info(f"Starting async download job {job.job_id}")
+
+        existing = None
+        if not job.req.force:
+            existing = await loop.run_in_executor(self._housekeeping, service.find_existing, job.req)
+        if existing:
+            app_logger.log_info(f"Already downloaded: {existing['path']}")
+            job.on_line(f"[archive] Already downloaded: {existing['path']}")
+            job.finish(True, existing["path"], None)
+            return
+        if await loop.run_in_executor(self._housekeeping, service.fan_out_binary, job):
+            return
+
+        # Metadata cache reads and disk admission; nothing that blocks runs on the loop
+        prepared = await loop.run_in_executor(self._housekeeping, service._prepare_binary, job)
+        if prepared is None:
+            return
+        command, env = prepared
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+            # Progress lines carry file names; allow long ones
+            limit=1024 * 1024,
+        )
+        app_logger.log_info(f"Process started with PID: {process.pid}")
+
+        def terminate() -> None:
+            if process.returncode is None:
+                _send_signal(process, "SIGCONT")
+                loop.call_soon_threadsafe(_terminate, process)
+
+        job.add_cancel_callback(terminate)
+        if job.cancelled:
+            terminate()
+
+        service.bandwidth.register(job.job_id, job.req.rate_limit or service.settings.job_rate_limit)
+        try:
+            output = BinaryOutput(service, job)
+            stderr_task = loop.create_task(process.stderr.read())
+            assert process.stdout is not None
+            while True:
+                raw = await process.stdout.readline()
+                if not raw:
+                    break
+                delay = output.feed(raw.decode("utf-8", errors="replace"))
+                if delay > 0 and not job.cancelled:
+                    await self._throttle(job, process, delay)
+            returncode = await process.wait()
+            error_output = (await stderr_task).decode("utf-8", errors="replace")
+        finally:
+            service.bandwidth.unregister(job.job_id)
+            # Don't leave yt-dlp running if reading its output failed
+            _send_signal(process, "SIGCONT")
+            _terminate(process)
+        # Journal, history and archive writes
+        await loop.run_in_executor(
+            self._housekeeping, service._finish_binary, job, returncode, error_output, output.destination_path
+        )
+
+    @staticmethod
+    async def _throttle(job: DownloadJob, process: "asyncio.subprocess.Process", seconds: float) -> None:
+        """Async counterpart of DownloadJob.throttle: stop the process, sleep, continue it."""
+        stopped = _send_signal(process, "SIGSTOP")
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            if stopped and not job.cancelled:
+                _send_signal(process, "SIGCONT")
+
+
+def _set_result(future: "asyncio.Future[JobResult]", result: JobResult) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+def _terminate(process: "asyncio.subprocess.Process") -> None:
+    if process.returncode is None:
+        try:
+            process.terminate()
+        except ProcessLookupError:
+            pass
+
+
+def _send_signal(process: "asyncio.subprocess.Process", sig_name: str) -> bool:
+    sig = getattr(signal, sig_name, None)
+    if sig is None or process.returncode is not None:
+        return False
+    try:
+        os.kill(process.pid, sig)
+    except OSError:
+        return False
+    return True
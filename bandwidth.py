@@ -0,0 +1,190 @@
+import math
+import threading
+import time
+from typing import Dict, Optional, Union
+
+from logger_config import app_logger
+
+# Jobs are never squeezed below this, so a stalled job can't starve to zero
+MIN_RATE = 16 * 1024
+
+
+def parse_rate(value: Union[str, int, float]) -> float:
+    """Parse a rate such as ``500K``, ``2.5M`` or a plain number (bytes per second, binary units)."""
+    if isinstance(value, bool):
+        raise ValueError(f"Not a rate: {value}")
+    text = str(value).strip().upper().rstrip("B").rstrip("I")
+    multiplier = 1
+    if text and text[-1] in _RATE_UNITS:
+        multiplier = _RATE_UNITS[text[-1]]
+        text = text[:-1]
+    rate = float(text) * multiplier
+    if not math.isfinite(rate):
+        raise ValueError(f"Rate must be a finite number: {value}")
+    if rate < 0:
+        raise ValueError(f"Negative rate: {value}")
+    return rate
+
+
+_RATE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+class _JobBucket:
+    def __init__(self, limit: Optional[float]):
+        self.limit = limit
+        self.rate: Optional[float] = None
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        # Measured throughput, used to hand budget a job isn't using to the others
+        self.window_start = self.updated
+        self.window_bytes = 0
+        self.observed: Optional[float] = None
+        # Last cumulative byte count per file, to turn progress reports into deltas
+        self.reported: Dict[str, int] = {}
+
+
+class BandwidthScheduler:
+    """Shared token-bucket rate limiter for every running download.
+
+    Each job gets its own bucket refilled at its current allocation. The
+    global budget is split max-min fairly: jobs capped below their fair share
+    (by a per-job limit, or because they are measured to be slower) keep
+    only what they use and the rest goes to the others. Allocations are
+    recomputed whenever a job starts or stops, a limit changes, or every
+    ``rebalance_interval`` seconds from measured throughput, so limit
+    changes apply to jobs that are already running.
+
+    ``consume`` never sleeps; it returns how long the caller should hold
+    off, which lets each backend throttle in its own way.
+    """
+
+    def __init__(
+        self,
+        global_limit: Optional[float] = None,
+        burst_seconds: float = 1.0,
+        rebalance_interval: float = 1.0,
+    ):
+        self.global_limit = global_limit or None
+        self.burst_seconds = burst_seconds
+        self.rebalance_interval = rebalance_interval
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, _JobBucket] = {}
+        self._last_rebalance = time.monotonic()
+
+    def register(self, job_id: str, limit: Optional[float] = None) -> None:
+        with self._lock:
+            self._jobs[job_id] = _JobBucket(limit or None)
+            self._rebalance_locked()
+
+    def unregister(self, job_id: str) -> None:
+        with self._lock:
+            if self._jobs.pop(job_id, None) is not None:
+                self._rebalance_locked()
+
+    def set_global_limit(self, limit: Optional[float]) -> None:
+        """Bytes per second shared by all jobs; None or 0 removes the cap."""
+        with self._lock:
+            self.global_limit = limit or None
+            self._rebalance_locked()
+        app_logger.log_info(f"Global bandwidth limit set to {self.global_limit or 'unlimited'}")
+
+    def set_job_limit(self, job_id: str, limit: Optional[float]) -> bool:
+        with self._lock:
+            bucket = self._jobs.get(job_id)
+            if bucket is None:
+                return False
+            bucket.limit = limit or None
+            self._rebalance_locked()
+        return True
+
+    def allocation(self, job_id: str) -> Optional[float]:
+        """Current bytes-per-second allowance for a job (None = unlimited)."""
+        with self._lock:
+            bucket = self._jobs.get(job_id)
+            return bucket.rate if bucket else None
+
+    def consume(self, job_id: str, nbytes: int) -> float:
+        """Charge ``nbytes`` to a job and return the seconds it should wait."""
+        if nbytes <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._jobs.get(job_id)
+            if bucket is None:
+                return 0.0
+            bucket.window_bytes += nbytes
+            elapsed = now - bucket.window_start
+            if elapsed >= self.rebalance_interval:
+                bucket.observed = bucket.window_bytes / elapsed
+                bucket.window_start = now
+                bucket.window_bytes = 0
+            if now - self._last_rebalance >= self.rebalance_interval:
+                self._rebalance_locked()
+
+            rate = bucket.rate
+            if rate is None:
+                return 0.0
+            bucket.tokens = min(
+                rate * self.burst_seconds, bucket.tokens + (now - bucket.updated) * rate
+            )
+            bucket.updated = now
+            bucket.tokens -= nbytes
+            return -bucket.tokens / rate if bucket.tokens < 0 else 0.0
+
+    def consume_progress(self, job_id: str, filename: Optional[str], downloaded_bytes: Optional[int]) -> float:
+        """Like ``consume`` but takes the cumulative byte count from a progress report."""
+        if downloaded_bytes is None:
+            return 0.0
+        with self._lock:
+            bucket = self._jobs.get(job_id)
+            if bucket is None:
+                return 0.0
+            key = filename or ""
+            previous = bucket.reported.get(key, 0)
+            bucket.reported[key] = downloaded_bytes
+        # A smaller count means the file restarted from scratch
+        delta = downloaded_bytes - previous if downloaded_bytes >= previous else downloaded_bytes
+        return self.consume(job_id, delta)
+
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        with self._lock:
+            return {
+                job_id: {"limit": b.limit, "allocation": b.rate, "observed": b.observed}
+                for job_id, b in self._jobs.items()
+            }
+
+    def _demand_locked(self, bucket: _JobBucket) -> float:
+        demand = bucket.limit or float("inf")
+        # A job running well under its allowance only needs a little headroom
+        if bucket.observed is not None and bucket.rate is not None and bucket.observed < 0.8 * bucket.rate:
+            demand = min(demand, max(MIN_RATE, bucket.observed * 1.25))
+        return demand
+
+    def _rebalance_locked(self) -> None:
+        self._last_rebalance = time.monotonic()
+        if not self._jobs:
+            return
+        if self.global_limit is None:
+            for bucket in self._jobs.values():
+                self._set_rate_locked(bucket, bucket.limit)
+            return
+
+        # Water-filling: satisfy the smallest demands first, split the rest evenly
+        remaining = float(self.global_limit)
+        pending = sorted(self._jobs.values(), key=self._demand_locked)
+        while pending:
+            share = remaining / len(pending)
+            demand = self._demand_locked(pending[0])
+            if demand > share:
+                for bucket in pending:
+                    self._set_rate_locked(bucket, max(MIN_RATE, share))
+                break
+            bucket = pending.pop(0)
+            self._set_rate_locked(bucket, max(MIN_RATE, demand))
+            remaining -= demand
+
+    @staticmethod
+    def _set_rate_locked(bucket: _JobBucket, rate: Optional[float]) -> None:
+        if rate is not None and bucket.rate is not None and bucket.tokens > rate:
+            bucket.tokens = rate
+        bucket.rate = rate
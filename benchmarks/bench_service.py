@@ -0,0 +1,257 @@
+"""End-to-end DownloaderService benchmark against a local fake media server.
+
+For each backend (yt-dlp Python module, binary with one process per URL,
+and binary with URLs batched into shared processes) and concurrency level,
+a fresh interpreter downloads ``--jobs`` synthetic files and reports:
+per-job startup latency (job starts running -> first downloaded bytes),
+aggregate throughput, scaling relative to concurrency 1, peak RSS of the
+service process and of yt-dlp child processes, and the rate of UI
+callbacks (on_line + on_progress) the service generated.
+
+``--extractor stub`` seeds the metadata cache with synthetic info dicts so
+module-backend jobs skip yt-dlp's generic extractor entirely; the binary
+backend always extracts. Run from the repository root:
+
+    python benchmarks/bench_service.py --jobs 8 --concurrency 1 2 4 --output bench.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_media_server import FakeMediaServer  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def synthetic_info(url: str, name: str, size: int) -> dict:
+    """What the generic extractor would return for a direct media link."""
+    return {
+        "_type": "video",
+        "id": name,
+        "title": name,
+        "extractor": "generic",
+        "extractor_key": "Generic",
+        "webpage_url": url,
+        "formats": [{
+            "format_id": "mp4",
+            "url": url,
+            "ext": "mp4",
+            "protocol": "http",
+            "filesize": size,
+            "vcodec": "h264",
+            "acodec": "aac",
+        }],
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its largest child, in MiB."""
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB elsewhere
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / MB
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / MB
+    return own, children
+
+
+def run_scenario(config: dict) -> dict:
+    """Runs in a child interpreter so memory high-water marks don't leak between scenarios."""
+    from downloader_service import DownloaderService, DownloadRequest, Settings
+    from progress_events import ProgressPhase
+
+    tmp = tempfile.mkdtemp(prefix="ytd-bench-")
+    try:
+        settings = Settings(
+            downloads_dir=os.path.join(tmp, "downloads"),
+            data_dir=os.path.join(tmp, "data"),
+            max_concurrent_downloads=config["concurrency"],
+            log_to_stderr=True,
+            progress_interval=config["progress_interval"],
+            # Batches split the jobs evenly between the workers
+            binary_batch_size=(
+                -(-config["jobs"] // config["concurrency"]) if config["backend"] == "binary-batch" else 1
+            ),
+        )
+        os.makedirs(settings.downloads_dir)
+        service = DownloaderService(yt_dlp_path=shutil.which("yt-dlp"), settings=settings)
+        service.use_python_module = config["backend"] == "module"
+
+        size = config["size"]
+        urls = [
+            f"{config['base_url']}/media/{size}/job{i}.mp4" + (f"?rate={config['rate']}" if config["rate"] else "")
+            for i in range(config["jobs"])
+        ]
+        if config["extractor"] == "stub":
+            for i, url in enumerate(urls):
+                service.metadata_cache.put(url, synthetic_info(url, f"job{i}", size))
+
+        lock = threading.Lock()
+        all_done = threading.Event()
+        job_ids = {}
+        first_bytes = {}
+        results = []
+        callbacks = [0]
+
+        def track(index: int):
+            def on_line(line: str) -> None:
+                with lock:
+                    callbacks[0] += 1
+
+            def on_progress(event) -> None:
+                now = time.time()
+                with lock:
+                    callbacks[0] += 1
+                    if event.phase == ProgressPhase.DOWNLOADING and event.downloaded_bytes:
+                        first_bytes.setdefault(index, now)
+
+            def on_done(success, destination, error) -> None:
+                with lock:
+                    results.append((success, error))
+                    if len(results) == len(urls):
+                        all_done.set()
+
+            return on_line, on_done, on_progress
+
+        started = time.perf_counter()
+        # Everything is queued before the workers start, so batches see the whole list
+        service.queue.pause_all()
+        for i, url in enumerate(urls):
+            on_line, on_done, on_progress = track(i)
+            job_ids[i] = service.run(
+                DownloadRequest(url, "Video", "High", force=True),
+                on_line=on_line,
+                on_done=on_done,
+                on_progress=on_progress,
+            )
+        service.queue.resume_all()
+        all_done.wait(config["timeout"])
+        wall = time.perf_counter() - started
+
+        startup = sorted(
+            (first_bytes[i] - service.queue.get(job_ids[i]).started_at) * 1000 for i in first_bytes
+        )
+        ok = sum(1 for success, _ in results if success)
+        own_rss, child_rss = peak_rss_mb()
+        return {
+            "backend": config["backend"],
+            "extractor": config["extractor"] if config["backend"] == "module" else "generic",
+            "concurrency": config["concurrency"],
+            "jobs": len(urls),
+            "succeeded": ok,
+            "errors": sorted({error for success, error in results if not success and error})[:5],
+            "timed_out": not all_done.is_set(),
+            "wall_seconds": wall,
+            "throughput_mb_s": ok * size / MB / wall if wall else None,
+            "startup_ms_median": statistics.median(startup) if startup else None,
+            "startup_ms_p95": startup[max(0, int(len(startup) * 0.95) - 1)] if startup else None,
+            "peak_rss_mb": own_rss,
+            "peak_child_rss_mb": child_rss,
+            "ui_callbacks": callbacks[0],
+            "ui_callbacks_per_second": callbacks[0] / wall if wall else None,
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def run_in_child(config: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--scenario", json.dumps(config)],
+        capture_output=True,
+        text=True,
+        cwd=REPO_ROOT,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "scenario failed")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", choices=["module", "binary", "binary-batch"],
+                        default=["module", "binary", "binary-batch"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--size-mb", type=float, default=16.0, help="Size of each synthetic file")
+    parser.add_argument(
+        "--origin-rate-mb", type=float, default=32.0,
+        help="Per-connection server throughput in MiB/s (0 = unthrottled)",
+    )
+    parser.add_argument("--extractor", choices=["generic", "stub"], default="generic")
+    parser.add_argument("--progress-interval", type=float, default=0.25)
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per-scenario timeout in seconds")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(json.loads(args.scenario))))
+        return 0
+
+    if not shutil.which("yt-dlp") and any(b != "module" for b in args.backends):
+        print("yt-dlp binary not on PATH; skipping the binary backends", file=sys.stderr)
+        args.backends = [b for b in args.backends if b == "module"]
+
+    rows = []
+    with FakeMediaServer() as server:
+        for backend in args.backends:
+            baseline = None
+            for concurrency in args.concurrency:
+                config = {
+                    "backend": backend,
+                    "concurrency": concurrency,
+                    "jobs": args.jobs,
+                    "size": int(args.size_mb * MB),
+                    "rate": int(args.origin_rate_mb * MB),
+                    "extractor": args.extractor,
+                    "progress_interval": args.progress_interval,
+                    "timeout": args.timeout,
+                    "base_url": server.base_url,
+                }
+                row = run_in_child(config)
+                if baseline is None and row["throughput_mb_s"]:
+                    baseline = row["throughput_mb_s"]
+                row["speedup"] = row["throughput_mb_s"] / baseline if baseline and row["throughput_mb_s"] else None
+                rows.append(row)
+                print(
+                    f"{backend:<12} c={concurrency:<3} {row['throughput_mb_s'] or 0:8.1f} MB/s "
+                    f"startup {row['startup_ms_median'] or 0:7.1f} ms  "
+                    f"rss {row['peak_rss_mb'] or 0:6.1f} MB  "
+                    f"callbacks {row['ui_callbacks_per_second'] or 0:6.1f}/s  "
+                    f"ok {row['succeeded']}/{row['jobs']}",
+                    file=sys.stderr,
+                )
+
+    results = {
+        "config": {
+            "jobs": args.jobs,
+            "size_mb": args.size_mb,
+            "origin_rate_mb": args.origin_rate_mb,
+            "extractor": args.extractor,
+            "progress_interval": args.progress_interval,
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+        },
+        "results": rows,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(row["succeeded"] == row["jobs"] for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
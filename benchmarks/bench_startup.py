@@ -0,0 +1,103 @@
+"""Startup-time benchmark: how long until the window could be shown.
+
+Each sample runs in a fresh interpreter and records, relative to process
+start: module imports, DownloaderService construction, Tk window creation
+(skipped when no display is available) and toolchain discovery, both with
+a cold and a warm toolchain cache. Discovery runs in the background in the
+real app, so the budget applies to time-to-window only.
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 300
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {repo!r})
+from downloader_service import DownloaderService, Settings
+from toolchain import discover_toolchain
+t_import = time.perf_counter()
+settings = Settings(downloads_dir={tmp!r}, data_dir={tmp!r})
+service = DownloaderService(yt_dlp_path=None, settings=settings, wait_for_toolchain=True)
+t_service = time.perf_counter()
+t_window = None
+try:
+    import tkinter as tk
+    from app_ui import AppUI
+    root = tk.Tk()
+    AppUI(root, service)
+    root.update_idletasks()
+    t_window = time.perf_counter()
+    root.destroy()
+except Exception:
+    pass
+t_disc0 = time.perf_counter()
+discover_toolchain(os.path.join({tmp!r}, "toolchain.json"))
+t_disc1 = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (t_import - t0) * 1000,
+    "service_ms": (t_service - t_import) * 1000,
+    "window_ms": None if t_window is None else (t_window - t0) * 1000,
+    "ready_ms": (t_service - t0) * 1000,
+    "discovery_ms": (t_disc1 - t_disc0) * 1000,
+}}))
+"""
+
+
+def run_probe(tmp: str) -> dict:
+    code = PROBE.format(repo=REPO_ROOT, tmp=tmp)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def median(samples: list, key: str):
+    values = [s[key] for s in samples if s[key] is not None]
+    return statistics.median(values) if values else None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=300.0, help="Time-to-window budget")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("cold", "warm"):
+        samples = []
+        tmp = tempfile.mkdtemp(prefix="ytd-startup-")
+        try:
+            if mode == "warm":
+                run_probe(tmp)
+            for _ in range(args.runs):
+                if mode == "cold":
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    os.makedirs(tmp)
+                samples.append(run_probe(tmp))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        results[mode] = {key: median(samples, key) for key in samples[0]}
+
+    warm = results["warm"]
+    measured = warm["window_ms"] if warm["window_ms"] is not None else warm["ready_ms"]
+    results["budget_ms"] = args.budget_ms
+    results["within_budget"] = measured <= args.budget_ms
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0 if results["within_budget"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
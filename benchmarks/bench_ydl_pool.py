@@ -0,0 +1,89 @@
+"""Per-job yt-dlp startup latency: fresh YoutubeDL per job vs. YoutubeDLPool.
+
+Measures the work a job does before any network I/O: constructing the
+downloader (extractor registry, cookie jar, request director) and resolving
+the generic extractor. Run from the repository root:
+
+    python benchmarks/bench_ydl_pool.py --jobs 50
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloader_service import DownloaderService, DownloadRequest, Settings  # noqa: E402
+from ydl_pool import YoutubeDLPool  # noqa: E402
+
+
+def _startup(ydl) -> None:
+    ydl.get_info_extractor("Generic")
+
+
+def bench_fresh(options: dict, jobs: int) -> list:
+    import yt_dlp
+
+    samples = []
+    for _ in range(jobs):
+        started = time.perf_counter()
+        ydl = yt_dlp.YoutubeDL(dict(options))
+        _startup(ydl)
+        samples.append(time.perf_counter() - started)
+        ydl.close()
+    return samples
+
+
+def bench_pooled(options: dict, jobs: int) -> list:
+    pool = YoutubeDLPool(max_idle=4)
+    samples = []
+    for _ in range(jobs):
+        started = time.perf_counter()
+        with pool.checkout(options) as ydl:
+            _startup(ydl)
+            samples.append(time.perf_counter() - started)
+    pool.clear()
+    return samples
+
+
+def summarize(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "jobs": len(samples),
+        "mean_ms": statistics.mean(samples) * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "p95_ms": ordered[int(len(ordered) * 0.95) - 1] * 1000,
+        "first_ms": samples[0] * 1000,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=30)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    # Keep the service's cache, journal, history and archive out of the user's profile
+    with tempfile.TemporaryDirectory(prefix="ytd-bench-pool-") as tmp:
+        service = DownloaderService(yt_dlp_path=None, settings=Settings(tmp, data_dir=tmp))
+        options = service.build_options(DownloadRequest("https://example.com/v.mp4", "Video", "High"))
+        options["quiet"] = True
+
+        results = {
+            "fresh": summarize(bench_fresh(options, args.jobs)),
+            "pooled": summarize(bench_pooled(options, args.jobs)),
+        }
+    results["speedup_median"] = results["fresh"]["median_ms"] / max(results["pooled"]["median_ms"], 1e-6)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Local HTTP stand-in for a media host, for benchmarks.
+
+Serves synthetic files of any size without touching the disk:
+
+    GET /media/<size_bytes>/<name>.mp4[?rate=<bytes_per_second>]
+
+Responses carry a video/mp4 Content-Type (so yt-dlp's generic extractor
+treats them as direct media links), honour single ``Range`` requests and
+can be throttled per connection to simulate a slower origin.
+
+    python benchmarks/fake_media_server.py --port 8765
+"""
+import argparse
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+_PATH_RE = re.compile(r"^/media/(\d+)/[^/]+\.(mp4|webm|m4a)$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_CHUNK = 64 * 1024
+_PATTERN = bytes(range(256)) * (_CHUNK // 256)
+
+
+class FakeMediaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body: bool) -> None:
+        parts = urlsplit(self.path)
+        match = _PATH_RE.match(parts.path)
+        if not match:
+            self.send_error(404)
+            return
+        size = int(match.group(1))
+        rate = _parse_rate(parse_qs(parts.query).get("rate", [None])[0])
+        content_type = "audio/mp4" if match.group(2) == "m4a" else f"video/{match.group(2)}"
+
+        byte_range = self._requested_range(size)
+        if byte_range is None:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, end = byte_range
+        partial = "Range" in self.headers
+        self.send_response(206 if partial else 200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if send_body:
+            self._write_body(start, end, rate)
+
+    def _requested_range(self, size: int) -> Optional[Tuple[int, int]]:
+        header = self.headers.get("Range")
+        if not header:
+            return 0, size - 1
+        match = _RANGE_RE.match(header.strip())
+        if not match or not (match.group(1) or match.group(2)):
+            return 0, size - 1
+        if not match.group(1):
+            length = int(match.group(2))
+            return max(0, size - length), size - 1
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+        if start >= size or end < start:
+            return None
+        return start, min(end, size - 1)
+
+    def _write_body(self, start: int, end: int, rate: Optional[float]) -> None:
+        remaining = end - start + 1
+        began = time.monotonic()
+        sent = 0
+        try:
+            while remaining > 0:
+                chunk = _PATTERN[: min(_CHUNK, remaining)]
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+                sent += len(chunk)
+                if rate:
+                    ahead = sent / rate - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def _parse_rate(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class FakeMediaServer:
+    """Runs the fake media host on a background thread; use as a context manager."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.httpd = ThreadingHTTPServer((host, port), FakeMediaHandler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, size: int, name: str = "clip", rate: Optional[float] = None) -> str:
+        url = f"{self.base_url}/media/{size}/{name}.mp4"
+        return f"{url}?rate={int(rate)}" if rate else url
+
+    def start(self) -> "FakeMediaServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeMediaServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server = FakeMediaServer(args.host, args.port)
+    print(f"Serving synthetic media on {server.base_url}/media/<size>/<name>.mp4")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
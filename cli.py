@@ -0,0 +1,392 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, TextIO, Tuple
+
+from logger_config import app_logger
+from async_engine import AsyncDownloadEngine
+from bandwidth import parse_rate
+from disk_space import GiB, parse_size
+from downloader_service import DownloaderService, DownloadRequest, Settings, default_data_dir
+from job_history import JobHistory
+from retry_policy import DEFAULT_RULES, FATAL, RetryPolicy, RetryRule
+from streaming import StreamError
+from toolchain import discover_toolchain
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+
+class JsonLinesReporter:
+    """Writes one JSON object per line to ``stream``; safe to call from worker threads."""
+
+    def __init__(self, stream: TextIO, include_output: bool = True):
+        self.stream = stream
+        self.include_output = include_output
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, **fields) -> None:
+        if event == "output" and not self.include_output:
+            return
+        record = {"event": event, "time": round(time.time(), 3)}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def read_urls(lines: Iterable[str]) -> List[str]:
+    """URLs from a batch file: one per line, blank lines and ``#`` comments skipped."""
+    urls = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            urls.append(line)
+    return urls
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Download videos/audio without the GUI. Progress is written to stdout as JSON lines."
+    )
+    parser.add_argument("urls", nargs="*", help="URLs to download")
+    parser.add_argument(
+        "-a", "--batch-file",
+        help="File with one URL per line ('-' reads standard input)",
+    )
+    parser.add_argument("--format", dest="format_", choices=["Video", "Audio"], default="Video")
+    parser.add_argument("--quality", choices=["High", "Medium", "Low"], default="High")
+    parser.add_argument(
+        "-o", "--output-dir",
+        default=os.path.expanduser("~/Downloads"),
+        help="Directory to save downloads to (default: ~/Downloads)",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="Concurrent downloads (default: 2)")
+    parser.add_argument(
+        "--playlist-concurrency", type=int, default=3,
+        help="Entries of one playlist downloaded in parallel (default: 3)",
+    )
+    parser.add_argument("--force", action="store_true", help="Download even if already in the archive")
+    parser.add_argument(
+        "--limit-rate", type=parse_rate, default=None, metavar="RATE",
+        help="Total bandwidth for all downloads, e.g. 500K or 2M (bytes/s)",
+    )
+    parser.add_argument(
+        "--job-limit-rate", type=parse_rate, default=None, metavar="RATE",
+        help="Bandwidth cap for each download, e.g. 200K (bytes/s)",
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Also resume downloads left unfinished by an earlier run that quit or crashed",
+    )
+    parser.add_argument(
+        "--connections", type=int, default=1,
+        help="Parallel connections per file (fragments, or aria2c when installed; default: 1)",
+    )
+    parser.add_argument(
+        "--engine", choices=["threads", "asyncio"], default="threads",
+        help="Run jobs on worker threads or on an asyncio event loop (default: threads)",
+    )
+    parser.add_argument(
+        "--history", type=int, nargs="?", const=50, metavar="N",
+        help="List the N most recent finished jobs (default 50) as 'history' events and exit",
+    )
+    parser.add_argument(
+        "--history-search", metavar="TEXT",
+        help="With --history: only jobs whose title or URL contains TEXT",
+    )
+    parser.add_argument(
+        "--output-template", metavar="LAYOUT",
+        help="File layout under the output directory: flat, by-uploader, by-date, by-id "
+        "or a yt-dlp output template (default: flat)",
+    )
+    parser.add_argument(
+        "--portable-filenames", action="store_true",
+        help="Only use file names that are valid on Windows/SMB shares as well",
+    )
+    parser.add_argument(
+        "--min-free", type=parse_size, default=GiB, metavar="SIZE",
+        help="Hold downloads back unless they leave this much disk space free, e.g. 5G (default: 1G)",
+    )
+    parser.add_argument(
+        "--no-preallocate", action="store_true",
+        help="Don't reserve each download's estimated size on disk before it starts",
+    )
+    parser.add_argument(
+        "--stream", action="store_true",
+        help="Write the media of a single URL to stdout instead of a file (events go to stderr)",
+    )
+    parser.add_argument(
+        "--retries", type=int,
+        help="Re-run a download up to N times after transient errors (default: depends on the error)",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="Write metrics (Prometheus text, or JSON if the name ends in .json) to this file",
+    )
+    parser.add_argument(
+        "--no-output", action="store_true",
+        help="Only emit queued/progress/entry_done/done/summary events, not yt-dlp output lines",
+    )
+    return parser
+
+
+def collect_urls(args: argparse.Namespace, stdin: TextIO) -> List[str]:
+    urls = list(args.urls)
+    if args.batch_file == "-":
+        urls += read_urls(stdin)
+    elif args.batch_file:
+        with open(args.batch_file, "r", encoding="utf-8") as f:
+            urls += read_urls(f)
+    elif not urls and not stdin.isatty():
+        urls += read_urls(stdin)
+    return urls
+
+
+class BatchTracker:
+    """Reports per-job events and counts outcomes until every job has finished."""
+
+    def __init__(self, reporter: JsonLinesReporter, total: int):
+        self.reporter = reporter
+        self.total = total
+        self.remaining = total
+        self.failures = 0
+        self.lock = threading.Lock()
+        self.all_done = threading.Event()
+        if total == 0:
+            self.all_done.set()
+
+    def callbacks(self, url: str, job_id: str) -> Dict[str, Callable]:
+        reporter = self.reporter
+
+        def on_line(line: str) -> None:
+            reporter.emit("output", job_id=job_id, url=url, line=line)
+
+        def on_progress(event) -> None:
+            fields = event.to_dict()
+            fields["progress_job_id"] = fields.pop("job_id")
+            reporter.emit("progress", job_id=job_id, url=url, **fields)
+
+        def on_entry_done(success: bool, destination: Optional[str], error: Optional[str]) -> None:
+            reporter.emit(
+                "entry_done", job_id=job_id, url=url,
+                success=success, destination=destination, error=error,
+            )
+
+        def on_done(success: bool, destination: Optional[str], error: Optional[str]) -> None:
+            reporter.emit(
+                "done", job_id=job_id, url=url,
+                success=success, destination=destination, error=error,
+            )
+            with self.lock:
+                self.remaining -= 1
+                if not success:
+                    self.failures += 1
+                if self.remaining == 0:
+                    self.all_done.set()
+
+        return {
+            "on_line": on_line,
+            "on_done": on_done,
+            "on_entry_done": on_entry_done,
+            "on_progress": on_progress,
+        }
+
+    def summarize(self) -> int:
+        self.reporter.emit(
+            "summary", total=self.total, succeeded=self.total - self.failures, failed=self.failures
+        )
+        return EXIT_FAILED if self.failures else EXIT_OK
+
+
+def batch_requests(
+    urls: List[str], args: argparse.Namespace, resumed: Optional[List[DownloadRequest]] = None
+) -> List[Tuple[DownloadRequest, bool]]:
+    """Requests to run, each paired with whether it was resumed from the journal."""
+    return [(req, True) for req in resumed or []] + [
+        (DownloadRequest(url=url, format_=args.format_, quality=args.quality, force=args.force), False)
+        for url in urls
+    ]
+
+
+def run_batch(
+    service: DownloaderService,
+    urls: List[str],
+    args: argparse.Namespace,
+    reporter: JsonLinesReporter,
+    resumed: Optional[List[DownloadRequest]] = None,
+) -> int:
+    """Queue every URL (plus any ``resumed`` requests), wait for all of them and return the exit code."""
+    requests = batch_requests(urls, args, resumed)
+    tracker = BatchTracker(reporter, len(requests))
+    job_ids: List[str] = []
+
+    for req, is_resumed in requests:
+        # IDs are assigned up front so events emitted by a fast job already carry them
+        job_id = uuid.uuid4().hex[:12]
+        reporter.emit("queued", job_id=job_id, url=req.url, resumed=is_resumed)
+        service.run(req, job_id=job_id, **tracker.callbacks(req.url, job_id))
+        job_ids.append(job_id)
+
+    try:
+        while not tracker.all_done.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        reporter.emit("interrupted")
+        for job_id in job_ids:
+            # Left in the journal so `--resume` can pick them up
+            service.cancel(job_id, resumable=True)
+        tracker.all_done.wait(5)
+        return EXIT_INTERRUPTED
+
+    return tracker.summarize()
+
+
+async def run_batch_async(
+    engine: AsyncDownloadEngine,
+    urls: List[str],
+    args: argparse.Namespace,
+    reporter: JsonLinesReporter,
+    resumed: Optional[List[DownloadRequest]] = None,
+) -> int:
+    """``run_batch`` on the asyncio engine: one coroutine per job instead of a worker thread."""
+    requests = batch_requests(urls, args, resumed)
+    tracker = BatchTracker(reporter, len(requests))
+    job_ids: List[str] = []
+    try:
+        for req, is_resumed in requests:
+            job_id = uuid.uuid4().hex[:12]
+            reporter.emit("queued", job_id=job_id, url=req.url, resumed=is_resumed)
+            await engine.submit(req, job_id=job_id, **tracker.callbacks(req.url, job_id))
+            job_ids.append(job_id)
+        for job_id in job_ids:
+            await engine.wait(job_id)
+    except asyncio.CancelledError:
+        reporter.emit("interrupted")
+        await engine.aclose(cancel_pending=True)
+        return EXIT_INTERRUPTED
+    await engine.aclose(cancel_pending=False)
+    return tracker.summarize()
+
+
+def run_stream(
+    service: DownloaderService,
+    url: str,
+    args: argparse.Namespace,
+    reporter: JsonLinesReporter,
+    out: BinaryIO,
+) -> int:
+    """Stream one URL's media into ``out`` without writing it to disk."""
+    job_id = uuid.uuid4().hex[:12]
+    tracker = BatchTracker(reporter, 1)
+    callbacks = tracker.callbacks(url, job_id)
+    callbacks.pop("on_entry_done")
+    reporter.emit("queued", job_id=job_id, url=url, resumed=False)
+    req = DownloadRequest(url=url, format_=args.format_, quality=args.quality, force=args.force)
+    try:
+        with service.open_stream(req, **callbacks) as stream:
+            for chunk in stream.iter_chunks():
+                out.write(chunk)
+            out.flush()
+    except (StreamError, RuntimeError, BrokenPipeError):
+        # Failures were reported through on_done; nothing was started if RuntimeError
+        if not tracker.all_done.is_set():
+            app_logger.log_exception(f"Could not stream {url}")
+            return EXIT_FAILED
+    except KeyboardInterrupt:
+        reporter.emit("interrupted")
+        return EXIT_INTERRUPTED
+    return tracker.summarize()
+
+
+def retry_policy(retries: Optional[int]) -> Optional[RetryPolicy]:
+    """Policy giving every retryable error class ``retries`` extra attempts, or None for the defaults."""
+    if retries is None:
+        return None
+    return RetryPolicy(rules={
+        error_class: RetryRule(retries + 1, rule.base_delay, rule.max_delay)
+        for error_class, rule in DEFAULT_RULES.items()
+        if error_class != FATAL
+    })
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # Streamed media owns stdout, so the events move to stderr
+    events = sys.stderr if args.stream else sys.stdout
+    reporter = JsonLinesReporter(events, include_output=not args.no_output)
+    if args.history is not None:
+        history = JobHistory(os.path.join(default_data_dir(), "job_history.sqlite3"))
+        for row in history.search(text=args.history_search, limit=args.history):
+            reporter.emit("history", **row)
+        return EXIT_OK
+
+    try:
+        urls = collect_urls(args, sys.stdin)
+    except OSError as e:
+        reporter.emit("error", error=f"Could not read batch file: {e}")
+        return EXIT_USAGE
+    if not urls and not args.resume:
+        parser.print_usage(sys.stderr)
+        print("error: no URLs given", file=sys.stderr)
+        return EXIT_USAGE
+    if args.stream and (len(urls) != 1 or args.resume):
+        parser.print_usage(sys.stderr)
+        print("error: --stream takes exactly one URL", file=sys.stderr)
+        return EXIT_USAGE
+
+    try:
+        settings = Settings(
+            downloads_dir=os.path.abspath(os.path.expanduser(args.output_dir)),
+            max_concurrent_downloads=args.jobs,
+            playlist_concurrency=args.playlist_concurrency,
+            log_to_stderr=True,
+            download_connections=args.connections,
+            global_rate_limit=args.limit_rate,
+            job_rate_limit=args.job_limit_rate,
+            metrics_path=args.metrics_file,
+            retry_policy=retry_policy(args.retries),
+            output_template=args.output_template,
+            portable_filenames=args.portable_filenames,
+            min_free_space=args.min_free,
+            preallocate_space=not args.no_preallocate,
+        )
+        os.makedirs(settings.downloads_dir, exist_ok=True)
+        toolchain = discover_toolchain(os.path.join(settings.data_dir, "toolchain.json"))
+        settings.ffmpeg_path = toolchain.ffmpeg_path
+        service = DownloaderService(yt_dlp_path=toolchain.yt_dlp_path, settings=settings)
+    except Exception as e:
+        app_logger.log_exception("Error initializing headless downloader")
+        reporter.emit("error", error=str(e))
+        return EXIT_FAILED
+
+    if args.stream:
+        try:
+            return run_stream(service, urls[0], args, reporter, sys.stdout.buffer)
+        finally:
+            service.metrics.stop_export()
+
+    resumed = service.interrupted_requests() if args.resume else []
+    try:
+        if args.engine == "asyncio":
+            engine = AsyncDownloadEngine(service, max_concurrent=args.jobs)
+            try:
+                return asyncio.run(run_batch_async(engine, urls, args, reporter, resumed))
+            except KeyboardInterrupt:
+                return EXIT_INTERRUPTED
+        return run_batch(service, urls, args, reporter, resumed)
+    finally:
+        service.metrics.stop_export()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+import math
+import os
+import re
+import shutil
+import socket
+import threading
+from typing import TYPE_CHECKING, Dict, Optional, Union
+
+from logger_config import app_logger
+
+if TYPE_CHECKING:
+    from job_queue import DownloadJob
+
+GiB = 1024 * 1024 * 1024
+# Placeholders are only shrunk in steps this big, to keep truncate() calls rare
+_SHRINK_STEP = 16 * 1024 * 1024
+PLACEHOLDER_PREFIX = ".ytd-reserve-"
+_SIZE_RE = re.compile(r"^([0-9]*\.?[0-9]+(?:E[+-]?[0-9]+)?)\s*([KMGT]?)(?:I?B)?$")
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": GiB, "T": 1024 * GiB}
+
+
+def parse_size(value: Union[str, int, float]) -> int:
+    """Parse a disk size such as ``5G``, ``500MiB``, ``1.5GB`` or a plain byte count (binary units)."""
+    if isinstance(value, bool):
+        raise ValueError(f"Not a size: {value}")
+    if isinstance(value, (int, float)):
+        size = float(value)
+    else:
+        match = _SIZE_RE.match(str(value).strip().upper())
+        if match is None:
+            raise ValueError(f"Not a size: {value!r} (expected e.g. 500M, 5G or a number of bytes)")
+        size = float(match.group(1)) * _SIZE_UNITS[match.group(2)]
+    if not math.isfinite(size):
+        raise ValueError(f"Size must be a finite number: {value}")
+    if size < 0:
+        raise ValueError(f"Negative size: {value}")
+    return int(size)
+
+
+class DiskSpaceError(Exception):
+    """A download can't fit on its volume, and waiting for other jobs won't help."""
+
+
+class _Reservation:
+    def __init__(self, job_id: str, device: int, size: int):
+        self.job_id = job_id
+        self.device = device
+        self.size = size
+        # Bytes written so far, per file (video and audio of a merge download separately)
+        self.written: Dict[str, int] = {}
+        self.placeholder: Optional[str] = None
+        # Bytes the placeholder currently occupies on disk
+        self.held = 0
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.size - sum(self.written.values()))
+
+
+class DiskReservations:
+    """Admission control for disk space shared by concurrent downloads.
+
+    Before a job writes anything it reserves its estimated size on the
+    volume. It is admitted when that fits into the free space, after
+    subtracting what other running jobs will still write and a
+    ``min_free`` safety margin. Otherwise it waits until other jobs finish,
+    and fails if nothing else is running that could free space. A job with
+    no estimate reserves nothing but still needs the margin.
+
+    With ``preallocate`` the reservation is also held on disk by a
+    placeholder file allocated up front (where posix_fallocate exists) and
+    shrunk as the real file grows. Space that other programs take can then
+    no longer run a download out of disk mid-way. yt-dlp's own .part files
+    aren't preallocated, because it resumes from their size.
+    """
+
+    POLL_SECONDS = 1.0
+
+    def __init__(self, min_free: int = GiB, preallocate: bool = True):
+        self.min_free = min_free
+        self.preallocate = preallocate and hasattr(os, "posix_fallocate")
+        self._cond = threading.Condition()
+        self._reservations: Dict[str, _Reservation] = {}
+
+    def admit(self, job: "DownloadJob", directory: str, size: Optional[int], wait: bool = True) -> bool:
+        """Block until ``size`` bytes are reserved for ``job`` in ``directory``'s volume.
+
+        Returns False if the job was cancelled while waiting or, with
+        ``wait=False``, as soon as it would have to wait for other jobs.
+        Raises DiskSpaceError when the download can never fit.
+        """
+        size = max(0, int(size or 0))
+        directory = _existing_ancestor(directory)
+        device = os.stat(directory).st_dev
+        self.release(job.job_id)
+        waiting = False
+        with self._cond:
+            while True:
+                if job.cancelled:
+                    return False
+                free = shutil.disk_usage(directory).free
+                others = [r for r in self._reservations.values() if r.device == device]
+                # Placeholder bytes are already missing from ``free``
+                pending = sum(max(0, r.remaining - r.held) for r in others)
+                available = free - pending - self.min_free
+                if size <= available:
+                    reservation = _Reservation(job.job_id, device, size)
+                    self._reservations[job.job_id] = reservation
+                    break
+                if not others:
+                    raise DiskSpaceError(
+                        f"Not enough disk space: need {_mib(size)} plus {_mib(self.min_free)} free, "
+                        f"{_mib(free)} available in {directory}"
+                    )
+                if not wait:
+                    return False
+                if not waiting:
+                    waiting = True
+                    app_logger.log_info(
+                        f"Job {job.job_id} needs {_mib(size)}, {_mib(max(0, available))} left after "
+                        f"{len(others)} running downloads; waiting"
+                    )
+                    job.on_line(f"[disk] Waiting for {_mib(size)} of disk space")
+                self._cond.wait(self.POLL_SECONDS)
+        if self.preallocate and size:
+            self._allocate_placeholder(reservation, directory)
+        return True
+
+    def progress(self, job_id: str, filename: Optional[str], downloaded_bytes: Optional[int]) -> None:
+        """Count bytes the job has written, handing the placeholder's space over to them."""
+        if downloaded_bytes is None:
+            return
+        with self._cond:
+            reservation = self._reservations.get(job_id)
+            if reservation is None:
+                return
+            reservation.written[filename or ""] = downloaded_bytes
+            target = reservation.remaining
+            shrink = reservation.placeholder is not None and reservation.held - target >= _SHRINK_STEP
+            if shrink:
+                reservation.held = target
+        if shrink:
+            try:
+                os.truncate(reservation.placeholder, target)
+            except OSError as e:
+                app_logger.log_warning(f"Could not shrink disk reservation for job {job_id}: {e}")
+
+    def release(self, job_id: str) -> None:
+        with self._cond:
+            reservation = self._reservations.pop(job_id, None)
+            self._cond.notify_all()
+        if reservation is not None and reservation.placeholder is not None:
+            try:
+                os.remove(reservation.placeholder)
+            except OSError:
+                pass
+
+    def reserved(self) -> int:
+        """Bytes that admitted jobs are still expected to write."""
+        with self._cond:
+            return sum(r.remaining for r in self._reservations.values())
+
+    def _allocate_placeholder(self, reservation: _Reservation, directory: str) -> None:
+        # Host and PID in the name tell a live process's placeholder from a crashed one's
+        name = f"{PLACEHOLDER_PREFIX}{socket.gethostname()}-{os.getpid()}-{reservation.job_id}"
+        path = os.path.join(directory, name)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            try:
+                os.posix_fallocate(fd, 0, reservation.size)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            # Unsupported by the filesystem, or out of space after all; the accounting still holds
+            app_logger.log_warning(f"Could not preallocate {_mib(reservation.size)} for job {reservation.job_id}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return
+        with self._cond:
+            if self._reservations.get(reservation.job_id) is reservation:
+                reservation.placeholder = path
+                reservation.held = reservation.size
+                return
+        # Released while allocating
+        os.remove(path)
+
+
+def remove_stale_placeholders(directory: str) -> None:
+    """Delete placeholders left behind by crashed processes on this host."""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    prefix = f"{PLACEHOLDER_PREFIX}{socket.gethostname()}-"
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        pid = name[len(prefix):].split("-", 1)[0]
+        if pid.isdigit() and not _process_alive(int(pid)):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill() would terminate it; placeholders aren't created on Windows anyway
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to someone else
+        return True
+    return True
+
+
+def _existing_ancestor(directory: str) -> str:
+    path = os.path.abspath(directory)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return path
+
+
+def _mib(size: int) -> str:
+    if size >= GiB:
+        return f"{size / GiB:.1f} GiB"
+    return f"{size / (1024 * 1024):.1f} MiB"
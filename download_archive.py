@@ -0,0 +1,243 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from logger_config import app_logger
+
+MEDIA_EXTENSIONS = {
+    ".mp4", ".mkv", ".webm", ".mov", ".flv", ".avi", ".3gp",
+    ".mp3", ".m4a", ".opus", ".ogg", ".aac", ".flac", ".wav",
+}
+AUDIO_EXTENSIONS = {".mp3", ".m4a", ".opus", ".ogg", ".aac", ".flac", ".wav"}
+# Matches the " [<id>]" suffix of yt-dlp's default "%(title)s [%(id)s].%(ext)s" template
+_ID_IN_NAME_RE = re.compile(r"\[([0-9A-Za-z_-]{11})\]")
+_HASH_SPAN = 1024 * 1024
+
+
+def format_key(format_: str, quality: str) -> str:
+    """Archive key for the rendition a request asks for."""
+    if format_ == "Audio":
+        return "audio"
+    return f"video-{quality.lower()}"
+
+
+def quick_hash(path: str, size: Optional[int] = None) -> str:
+    """Hash of the size plus the first and last MiB: cheap on multi-GB files."""
+    if size is None:
+        size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode("ascii"))
+    with open(path, "rb") as f:
+        digest.update(f.read(_HASH_SPAN))
+        if size > 2 * _HASH_SPAN:
+            f.seek(-_HASH_SPAN, os.SEEK_END)
+            digest.update(f.read(_HASH_SPAN))
+    return digest.hexdigest()
+
+
+class DownloadArchive:
+    """Persistent index of finished downloads, keyed by (video key, format key).
+
+    Entries live in a dict for O(1) lookups and are persisted as an
+    append-only JSON-lines file that is compacted on load once superseded
+    lines outnumber live ones. A hit is only trusted if the file still exists
+    with the recorded size, which costs one stat call.
+
+    Entries seeded by ``rebuild`` cannot know the quality a video was fetched
+    at, so they are stored under a ``video-*`` wildcard that matches any
+    video quality.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[Tuple[str, str], Dict[str, Any]]] = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._ensure_loaded_locked())
+
+    def lookup(self, video_keys: Iterable[str], fmt: str) -> Optional[Dict[str, Any]]:
+        """Return the archived entry for any of ``video_keys`` if its file is intact."""
+        candidates = [fmt]
+        if fmt.startswith("video-"):
+            candidates.append("video-*")
+        with self._lock:
+            entries = self._ensure_loaded_locked()
+            for video_key in video_keys:
+                for candidate in candidates:
+                    entry = entries.get((video_key, candidate))
+                    if entry is None:
+                        continue
+                    try:
+                        if os.path.getsize(entry["path"]) == entry["size"]:
+                            return entry
+                    except OSError:
+                        pass
+                    self._drop_locked(video_key, candidate)
+        return None
+
+    def record(self, video_keys: Iterable[str], fmt: str, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            digest = quick_hash(path, size)
+        except OSError as e:
+            app_logger.log_warning(f"Not archiving {path}: {e}")
+            return
+        with self._lock:
+            entries = self._ensure_loaded_locked()
+            lines = []
+            for video_key in set(video_keys):
+                entry = {
+                    "video_key": video_key,
+                    "format_key": fmt,
+                    "path": os.path.abspath(path),
+                    "size": size,
+                    "hash": digest,
+                    "added_at": time.time(),
+                }
+                entries[(video_key, fmt)] = entry
+                lines.append(entry)
+            self._append_locked(lines)
+
+    def rebuild(self, downloads_dir: str, title_index: Optional[Dict[str, str]] = None) -> int:
+        """Seed the archive from files already in ``downloads_dir``.
+
+        Video keys come from an ``[id]`` suffix in the file name or, failing
+        that, from ``title_index`` (file stem -> video key), typically built
+        from the metadata cache. Returns the number of files indexed.
+        """
+        title_index = title_index or {}
+        seeded = []
+        for root, _dirs, files in os.walk(downloads_dir):
+            for name in files:
+                stem, ext = os.path.splitext(name)
+                ext = ext.lower()
+                if ext not in MEDIA_EXTENSIONS:
+                    continue
+                match = _ID_IN_NAME_RE.search(stem)
+                video_key = f"youtube:{match.group(1)}" if match else title_index.get(stem)
+                if not video_key:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    size = os.path.getsize(path)
+                    digest = quick_hash(path, size)
+                except OSError:
+                    continue
+                seeded.append({
+                    "video_key": video_key,
+                    "format_key": "audio" if ext in AUDIO_EXTENSIONS else "video-*",
+                    "path": os.path.abspath(path),
+                    "size": size,
+                    "hash": digest,
+                    "added_at": time.time(),
+                })
+        with self._lock:
+            entries = self._ensure_loaded_locked()
+            for entry in seeded:
+                entries[(entry["video_key"], entry["format_key"])] = entry
+            self._rewrite_locked()
+        app_logger.log_info(f"Archive rebuilt from {downloads_dir}: {len(seeded)} files indexed")
+        return len(seeded)
+
+    def _ensure_loaded_locked(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        if self._entries is not None:
+            return self._entries
+        entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        lines = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    key = (entry.get("video_key"), entry.get("format_key"))
+                    if entry.get("deleted"):
+                        entries.pop(key, None)
+                    else:
+                        entries[key] = entry
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            app_logger.log_warning(f"Could not read download archive {self.path}: {e}")
+        self._entries = entries
+        if lines > 2 * len(entries) + 100:
+            self._rewrite_locked()
+        return entries
+
+    def _drop_locked(self, video_key: str, fmt: str) -> None:
+        if self._entries is not None and self._entries.pop((video_key, fmt), None) is not None:
+            self._append_locked([{"video_key": video_key, "format_key": fmt, "deleted": True}])
+
+    def _append_locked(self, lines) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for line in lines:
+                    f.write(json.dumps(line) + "\n")
+        except OSError as e:
+            app_logger.log_warning(f"Could not update download archive {self.path}: {e}")
+
+    def _rewrite_locked(self) -> None:
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in (self._entries or {}).values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            app_logger.log_warning(f"Could not compact download archive {self.path}: {e}")
+
+
+def title_index_from_cache(cache_dir: str) -> Dict[str, str]:
+    """Map cached video titles to video keys, for matching ``%(title)s`` file names."""
+    from metadata_cache import info_video_key
+
+    index: Dict[str, str] = {}
+    if not os.path.isdir(cache_dir):
+        return index
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(cache_dir, name), "r", encoding="utf-8") as f:
+                info = json.load(f).get("info") or {}
+        except (OSError, ValueError):
+            continue
+        key = info_video_key(info)
+        title = info.get("title")
+        if key and title:
+            # yt-dlp replaces path separators in titles when building file names
+            index[title.replace("/", "⧸")] = key
+            index[title] = key
+    return index
+
+
+def main(argv=None) -> int:
+    from downloader_service import default_data_dir
+
+    parser = argparse.ArgumentParser(description="Manage the download archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="Scan a downloads directory and seed the archive")
+    rebuild.add_argument("--downloads-dir", default=os.path.expanduser("~/Downloads"))
+    rebuild.add_argument("--data-dir", default=default_data_dir())
+    args = parser.parse_args(argv)
+
+    archive = DownloadArchive(os.path.join(args.data_dir, "download_archive.jsonl"))
+    titles = title_index_from_cache(os.path.join(args.data_dir, "metadata_cache"))
+    count = archive.rebuild(args.downloads_dir, titles)
+    print(f"Indexed {count} files; archive now holds {len(archive)} entries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
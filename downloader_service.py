@@ -1,78 +1,252 @@
+import importlib.util
+import json
 import os
+import shutil
+import signal
 import subprocess
 import threading
 import sys
-from typing import Callable, List, Optional
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from logger_config import app_logger
+from bandwidth import BandwidthScheduler
+from disk_space import GiB, DiskReservations, DiskSpaceError, parse_size, remove_stale_placeholders
+from download_archive import DownloadArchive, format_key
+from format_selection import FormatChoice, format_spec, select_formats
+from job_history import JobHistory
+from job_journal import JobJournal
+from job_queue import DownloadJob, JobCancelled, JobQueue, JobState
+from metrics import Metrics, NullMetrics
+from metadata_cache import MetadataCache, cache_key_for_url, canonical_video_id, info_video_key
+from playlist import PlaylistFanOut, is_playlist, looks_like_playlist
+from streaming import DEFAULT_CHUNK_SIZE, MediaStream
+from retry_policy import RetryPolicy, classify_error, host_of
+from output_paths import SUFFIX_FIELD, PathClaims, collision_safe, output_template
+from postprocess import PostProcessStage, extract_audio_command, run_ffmpeg
+from progress_events import (
+    FINAL_PATH_PREFIX,
+    ITEM_PREFIX,
+    ITEM_TEMPLATE,
+    ProgressEmitter,
+    ProgressEvent,
+    ProgressPhase,
+    binary_progress_args,
+    event_from_hook,
+    event_from_postprocessor_hook,
+    format_progress_line,
+    parse_progress_line,
+)
+from ydl_pool import YoutubeDLPool
+
+
+def default_data_dir() -> str:
+    """Per-user directory for caches and indexes kept between launches."""
+    if sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    elif os.name == "nt":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "YouTube Downloader")
 
 
 class Settings:
-    def __init__(self, downloads_dir: str, ffmpeg_path: Optional[str] = None):
+    def __init__(
+        self,
+        downloads_dir: str,
+        ffmpeg_path: Optional[str] = None,
+        max_concurrent_downloads: int = 2,
+        ydl_pool_size: int = 4,
+        data_dir: Optional[str] = None,
+        metadata_cache_ttl: float = 3600.0,
+        playlist_concurrency: int = 3,
+        log_to_stderr: bool = False,
+        progress_interval: float = 0.25,
+        download_connections: int = 1,
+        http_chunk_size: Optional[int] = None,
+        global_rate_limit: Optional[float] = None,
+        job_rate_limit: Optional[float] = None,
+        postprocess_workers: Optional[int] = None,
+        staged_postprocessing: bool = True,
+        metrics_enabled: bool = False,
+        metrics_path: Optional[str] = None,
+        metrics_export_interval: float = 15.0,
+        retry_policy: Optional[RetryPolicy] = None,
+        output_template: Optional[str] = None,
+        max_filename_length: Optional[int] = 180,
+        portable_filenames: bool = False,
+        binary_batch_size: int = 8,
+        min_free_space: Union[int, str] = GiB,
+        preallocate_space: bool = True,
+    ):
         self.downloads_dir = downloads_dir
         self.ffmpeg_path = ffmpeg_path
+        # Upper bound on simultaneous yt-dlp sessions; extra requests wait in the queue
+        self.max_concurrent_downloads = max_concurrent_downloads
+        # Idle yt_dlp.YoutubeDL instances kept warm between jobs
+        self.ydl_pool_size = ydl_pool_size
+        self.data_dir = data_dir or default_data_dir()
+        # Extracted info dicts are reused for this long; stream URLs expire after a few hours
+        self.metadata_cache_ttl = metadata_cache_ttl
+        # Entries of one playlist/channel downloaded in parallel (still bounded by the worker pool)
+        self.playlist_concurrency = playlist_concurrency
+        # Keep yt-dlp's own console output off stdout (the CLI writes JSON lines there)
+        self.log_to_stderr = log_to_stderr
+        # Minimum seconds between forwarded "downloading" progress events per job
+        self.progress_interval = progress_interval
+        # Parallel connections per file: fragments of DASH/HLS formats, or aria2c
+        # segments for plain HTTP files when aria2c is installed
+        self.download_connections = download_connections
+        # Fetch plain HTTP files in ranged requests of this many bytes (None = one request)
+        self.http_chunk_size = http_chunk_size
+        # Bytes per second shared by all downloads, and the default cap for each one (None = unlimited)
+        self.global_rate_limit = global_rate_limit
+        self.job_rate_limit = job_rate_limit
+        # Audio extraction runs in its own stage (one ffmpeg per core by default) so
+        # download workers move on to the next download instead of transcoding
+        self.postprocess_workers = postprocess_workers
+        self.staged_postprocessing = staged_postprocessing
+        # Counters/histograms/job spans; a metrics_path (Prometheus text, or JSON if it
+        # ends in .json) implies metrics_enabled and is rewritten every export interval
+        self.metrics_enabled = metrics_enabled or bool(metrics_path)
+        self.metrics_path = metrics_path
+        self.metrics_export_interval = metrics_export_interval
+        # Job/request/fragment retries, backoff and per-host circuit breaking
+        self.retry_policy = retry_policy or RetryPolicy()
+        # A layout name from output_paths.OUTPUT_LAYOUTS or a yt-dlp output template,
+        # relative to downloads_dir; sharded layouts keep directories small
+        self.output_template = output_template
+        self.max_filename_length = max_filename_length
+        # Names valid on Windows/SMB shares too, whatever the local OS
+        self.portable_filenames = portable_filenames
+        # Binary backend: queued jobs with the same format/quality share one yt-dlp
+        # process, up to this many URLs (1 = a process per URL)
+        self.binary_batch_size = binary_batch_size
+        # Downloads are admitted only while their estimated size fits with this much
+        # left free (bytes, or a size such as "5G"); preallocation holds the space on disk
+        # while they run
+        self.min_free_space = parse_size(min_free_space)
+        self.preallocate_space = preallocate_space
 
 
 class DownloadRequest:
-    def __init__(self, url: str, format_: str, quality: str):
+    def __init__(
+        self,
+        url: str,
+        format_: str,
+        quality: str,
+        force: bool = False,
+        rate_limit: Optional[float] = None,
+    ):
         self.url = url
         self.format_ = format_
         self.quality = quality
+        # Download even if the archive says this video is already on disk
+        self.force = force
+        # Bytes per second for this job; overrides Settings.job_rate_limit
+        self.rate_limit = rate_limit
 
 
 class DownloaderService:
-    def __init__(self, yt_dlp_path: Optional[str], settings: Settings):
+    def __init__(
+        self,
+        yt_dlp_path: Optional[str],
+        settings: Settings,
+        wait_for_toolchain: bool = False,
+    ):
         self.yt_dlp_path = yt_dlp_path
         self.settings = settings
-        self.use_python_module = False
-        
-        # Try to use yt-dlp as Python module first (better SSL support)
-        try:
-            import yt_dlp
-            self.use_python_module = True
+
+        # Prefer the yt-dlp Python module (better SSL support). Only check that it
+        # is installed here; the import itself is deferred to the first download.
+        self.use_python_module = importlib.util.find_spec("yt_dlp") is not None
+        if self.use_python_module:
             app_logger.log_info("Using yt-dlp Python module (better SSL certificate support)")
-        except ImportError:
+        else:
             app_logger.log_info(f"yt-dlp Python module not available, using binary: {yt_dlp_path}")
-            if not yt_dlp_path:
+            if not yt_dlp_path and not wait_for_toolchain:
                 app_logger.log_error("Neither yt-dlp module nor binary is available!")
-        
+
         app_logger.log_info(f"Downloads directory: {settings.downloads_dir}")
 
+        self.ydl_pool = YoutubeDLPool(max_idle=settings.ydl_pool_size)
+        self.metadata_cache = MetadataCache(
+            os.path.join(settings.data_dir, "metadata_cache"),
+            ttl=settings.metadata_cache_ttl,
+        )
+        self.archive = DownloadArchive(os.path.join(settings.data_dir, "download_archive.jsonl"))
+        # Queued/running jobs, so downloads interrupted by a quit or crash can be resumed
+        self.journal = JobJournal(os.path.join(settings.data_dir, "job_journal.jsonl"))
+        self.history = JobHistory(os.path.join(settings.data_dir, "job_history.sqlite3"))
+        self.output_template = collision_safe(output_template(settings.output_template))
+        self.path_claims = PathClaims()
+        self.disk_space = DiskReservations(settings.min_free_space, settings.preallocate_space)
+        remove_stale_placeholders(settings.downloads_dir)
+        self.bandwidth = BandwidthScheduler(settings.global_rate_limit)
+        self.postprocess = PostProcessStage(settings.postprocess_workers)
+        self.metrics: Metrics = Metrics() if settings.metrics_enabled else NullMetrics()
+        if settings.metrics_path:
+            self.metrics.start_export(settings.metrics_path, settings.metrics_export_interval)
+        self.retry_policy = settings.retry_policy
+        # Created once so pooled yt-dlp instances keep matching the same option set
+        self._retry_sleep_functions = {
+            'http': self.retry_policy.sleep_function('network'),
+            'fragment': self.retry_policy.sleep_function('network'),
+            'extractor': self.retry_policy.sleep_function('server'),
+        }
+        self.progress_listeners: List[Callable[[ProgressEvent], None]] = []
+        self.queue = JobQueue(self.execute, max_workers=settings.max_concurrent_downloads)
+        # When binaries are still being discovered, accept jobs but hold them in the queue
+        self.toolchain_ready = not wait_for_toolchain
+        if wait_for_toolchain:
+            self.queue.pause_all()
+
+    def apply_toolchain(self, yt_dlp_path: Optional[str], ffmpeg_path: Optional[str]) -> None:
+        """Adopt binaries discovered after construction and start dispatching queued jobs."""
+        self.yt_dlp_path = yt_dlp_path
+        self.settings.ffmpeg_path = ffmpeg_path
+        if not self.use_python_module and not yt_dlp_path:
+            app_logger.log_error("Neither yt-dlp module nor binary is available!")
+        self.toolchain_ready = True
+        self.queue.resume_all()
+
     def build_options(self, req: DownloadRequest) -> dict:
         """Build yt-dlp options dictionary for Python API."""
         options = {
-            'outtmpl': os.path.join(self.settings.downloads_dir, '%(title)s.%(ext)s'),
+            'outtmpl': os.path.join(self.settings.downloads_dir, self.output_template),
             'quiet': False,
             'no_warnings': False,
+            # Continue an existing .part file with a range request instead of starting over
+            'continuedl': True,
         }
+        if self.settings.log_to_stderr:
+            options['logtostderr'] = True
+        if self.settings.max_filename_length:
+            options['trim_file_name'] = self.settings.max_filename_length
+        if self.settings.portable_filenames:
+            options['windowsfilenames'] = True
+        options.update(self._transfer_options())
         
         # Add ffmpeg location if available
         if self.settings.ffmpeg_path and os.path.exists(self.settings.ffmpeg_path):
             options['ffmpeg_location'] = self.settings.ffmpeg_path
             app_logger.log_info(f"Using ffmpeg from: {self.settings.ffmpeg_path}")
         
+        # Same selector and ranking as the binary gets; jobs normally narrow the
+        # format list to an explicit choice first (see _apply_format_choice)
+        options['format'], options['format_sort'] = format_spec(req.format_, req.quality, self._can_merge())
+
         # Audio extraction options
-        if req.format_ == "Audio":
-            options.update({
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '0',
-                }],
-                'outtmpl': os.path.join(self.settings.downloads_dir, '%(title)s.%(ext)s'),
-            })
-        else:
-            # Video quality options
-            if req.quality == "High":
-                options['format'] = 'best'
-            elif req.quality == "Medium":
-                options['format'] = 'worst'
-            elif req.quality == "Low":
-                options['format'] = 'worst'
-        
+        if req.format_ == "Audio" and not self._staged_audio(req):
+            options['postprocessors'] = [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '0',
+            }]
+
         return options
 
-    def build_command(self, req: DownloadRequest) -> List[str]:
+    def build_command(self, req: DownloadRequest, choice: Optional[FormatChoice] = None) -> List[str]:
         try:
             app_logger.log_info(f"Building command for URL: {req.url}")
             app_logger.log_info(f"Format: {req.format_}, Quality: {req.quality}")
@@ -80,8 +254,12 @@ class DownloaderService:
             command: List[str] = [
                 self.yt_dlp_path,
                 "-o",
-                os.path.join(self.settings.downloads_dir, "%(title)s.%(ext)s"),
+                os.path.join(self.settings.downloads_dir, self.output_template),
             ]
+            command += self._filename_args()
+            # Machine-readable progress lines, parsed back into ProgressEvents
+            command += binary_progress_args()
+            command += self._transfer_args()
 
             # Note: yt-dlp should respect SSL_CERT_FILE and REQUESTS_CA_BUNDLE environment variables
             # which are set in the subprocess environment (see run() method)
@@ -108,7 +286,9 @@ class DownloaderService:
                     app_logger.log_error(f"ffmpeg path does not exist: {ffmpeg_path}")
                     # Don't add --ffmpeg-location if path doesn't exist
 
-            if req.format_ == "Audio":
+            if req.format_ == "Audio" and self._staged_audio(req):
+                app_logger.log_info("Audio will be extracted by the post-processing stage")
+            elif req.format_ == "Audio":
                 app_logger.log_info("Adding audio extraction parameters")
                 command += [
                     "--extract-audio",
@@ -116,19 +296,15 @@ class DownloaderService:
                     "mp3",
                     "--audio-quality",
                     "0",
-                    "--output",
-                    os.path.join(self.settings.downloads_dir, "%(title)s.mp3"),
                 ]
 
-            if req.quality == "High":
-                command += ["-f", "bestaudio/best"]
-                app_logger.log_info("Using high quality format")
-            elif req.quality == "Medium":
-                command += ["-f", "worstaudio/worst"]
-                app_logger.log_info("Using medium quality format")
-            elif req.quality == "Low":
-                command += ["-f", "worstaudio"]
-                app_logger.log_info("Using low quality format")
+            if choice is not None:
+                command += ["-f", choice.spec]
+                app_logger.log_info(f"Using selected format {choice.describe()}")
+            else:
+                spec, sort = format_spec(req.format_, req.quality, self._can_merge())
+                command += ["-f", spec, "-S", ",".join(sort)]
+                app_logger.log_info(f"Using format selector {spec} sorted by {','.join(sort)}")
 
             command.append(req.url)
             app_logger.log_info(f"Final command: {' '.join(command)}")
@@ -138,171 +314,1235 @@ class DownloaderService:
             app_logger.log_exception("Error building command")
             raise
 
+    def _aria2c_connections(self) -> int:
+        """Connections to hand to aria2c, or 0 to use yt-dlp's own HTTP downloader."""
+        connections = self.settings.download_connections
+        if connections > 1 and shutil.which("aria2c"):
+            return min(connections, 16)
+        return 0
+
+    def _transfer_options(self) -> dict:
+        """Resume/chunking/multi-connection/retry options for the Python API."""
+        options: Dict[str, Any] = {
+            'retries': self.retry_policy.request_retries,
+            'fragment_retries': self.retry_policy.fragment_retries,
+            'retry_sleep_functions': self._retry_sleep_functions,
+        }
+        if self.settings.download_connections > 1:
+            options['concurrent_fragment_downloads'] = self.settings.download_connections
+        if self.settings.http_chunk_size:
+            options['http_chunk_size'] = self.settings.http_chunk_size
+        aria2c = self._aria2c_connections()
+        if aria2c:
+            options['external_downloader'] = {'http': 'aria2c'}
+            options['external_downloader_args'] = {
+                'aria2c': ['-x', str(aria2c), '-s', str(aria2c), '-k', '1M', '--continue=true']
+            }
+        return options
+
+    def _transfer_args(self) -> List[str]:
+        """Command-line equivalent of ``_transfer_options`` for the yt-dlp binary."""
+        args = ["--continue"] + self._retry_args()
+        if self.settings.download_connections > 1:
+            args += ["--concurrent-fragments", str(self.settings.download_connections)]
+        if self.settings.http_chunk_size:
+            args += ["--http-chunk-size", str(self.settings.http_chunk_size)]
+        aria2c = self._aria2c_connections()
+        if aria2c:
+            args += [
+                "--downloader", "http:aria2c",
+                "--downloader-args", f"aria2c:-x {aria2c} -s {aria2c} -k 1M --continue=true",
+            ]
+        return args
+
+    def _filename_args(self) -> List[str]:
+        """Command-line equivalent of the file name options in ``build_options``."""
+        args = []
+        if self.settings.max_filename_length:
+            args += ["--trim-filenames", str(self.settings.max_filename_length)]
+        if self.settings.portable_filenames:
+            args.append("--windows-filenames")
+        return args
+
+    def _retry_args(self) -> List[str]:
+        """yt-dlp's own request/fragment retries, paced like the retry policy's backoff."""
+        policy = self.retry_policy
+        return [
+            "--retries", str(policy.request_retries),
+            "--fragment-retries", str(policy.fragment_retries),
+            "--retry-sleep", f"http:{policy.sleep_expression('network')}",
+            "--retry-sleep", f"fragment:{policy.sleep_expression('network')}",
+            "--retry-sleep", f"extractor:{policy.sleep_expression('server')}",
+        ]
+
+    def _ffmpeg_binary(self) -> Optional[str]:
+        if self.settings.ffmpeg_path and os.path.exists(self.settings.ffmpeg_path):
+            return self.settings.ffmpeg_path
+        return shutil.which("ffmpeg")
+
+    def _can_merge(self) -> bool:
+        """Separate video and audio streams can only be merged with ffmpeg around."""
+        return self._ffmpeg_binary() is not None
+
+    def choose_formats(
+        self, req: DownloadRequest, info: Optional[dict], can_merge: Optional[bool] = None
+    ) -> Optional[FormatChoice]:
+        """Formats ``req`` would download from an extracted ``info`` dict, with a size estimate."""
+        if not isinstance(info, dict) or info.get('_type', 'video') != 'video':
+            return None
+        if can_merge is None:
+            can_merge = self._can_merge()
+        return select_formats(info, req.format_, req.quality, can_merge)
+
+    def plan_formats(self, req: DownloadRequest) -> Optional[FormatChoice]:
+        """Probe ``req`` (through the metadata cache) and report what would be downloaded."""
+        return self.choose_formats(req, self.probe(req))
+
+    def _apply_format_choice(self, job: DownloadJob, info: dict, ydl) -> dict:
+        """Narrow ``info`` to the formats chosen for the job so yt-dlp downloads exactly those.
+
+        Also settles the output file name, so it can't collide with another job's.
+        """
+        choice = self.choose_formats(job.req, info)
+        if choice is not None:
+            self._note_format_choice(job, choice)
+        # Without a format choice nothing is reserved, but the free-space margin still applies
+        size = choice.estimated_bytes if choice is not None else 0
+        if not self.disk_space.admit(job, self.settings.downloads_dir, size):
+            raise JobCancelled(f"Job {job.job_id} was cancelled")
+        if choice is None:
+            return info
+        narrowed = dict(info)
+        narrowed['formats'] = choice.formats
+        if choice.ext:
+            self._claim_output_path(job, ydl, narrowed, choice.ext)
+        return narrowed
+
+    def _claim_output_path(self, job: DownloadJob, ydl, info: dict, ext: str) -> None:
+        try:
+            path = ydl.prepare_filename(dict(info, ext=ext))
+        except Exception:
+            app_logger.log_exception(f"Could not work out the file name for job {job.job_id}")
+            return
+
+        def is_same_download(candidate: str) -> bool:
+            # An earlier download of this very request, which yt-dlp may reuse
+            existing = self.find_existing(job.req)
+            return existing is not None and os.path.normcase(os.path.abspath(existing["path"])) == candidate
+
+        suffix = self.path_claims.claim(job.job_id, path, is_same_download)
+        if suffix:
+            info[SUFFIX_FIELD] = suffix
+            job.on_line(f"[output] {os.path.basename(path)} is taken; saving as{suffix} variant")
+            app_logger.log_info(f"Job {job.job_id}: {path} already in use, adding '{suffix.strip()}'")
+
+    def _admit_download(self, job: DownloadJob, wait: bool = True) -> bool:
+        """Reserve disk space for the job's estimated size; False once the job has been finished instead.
+
+        With ``wait=False`` a job that would have to wait for space is left
+        unfinished and False is returned straight away.
+        """
+        try:
+            if self.disk_space.admit(job, self.settings.downloads_dir, job.estimated_bytes, wait):
+                return True
+            if wait:
+                job.finish(False, None, "Cancelled")
+        except DiskSpaceError as e:
+            app_logger.log_error(f"Job {job.job_id}: {e}")
+            job.on_line(f"Download failed!\n{e}")
+            job.finish(False, None, str(e))
+        return False
+
+    def _note_format_choice(self, job: DownloadJob, choice: FormatChoice) -> None:
+        job.estimated_bytes = choice.estimated_bytes
+        job.format_spec = choice.spec
+        job.on_line(f"[format] Selected {choice.describe()}")
+        app_logger.log_info(f"Job {job.job_id} format: {choice.describe()}")
+
+    def _staged_audio(self, req: DownloadRequest) -> bool:
+        """Whether audio extraction for ``req`` is left to the post-processing stage."""
+        return (
+            req.format_ == "Audio"
+            and self.settings.staged_postprocessing
+            and self._ffmpeg_binary() is not None
+        )
+
+    def _finish_download(
+        self,
+        job: DownloadJob,
+        path: Optional[str],
+        info: Optional[dict] = None,
+        emitter: Optional[ProgressEmitter] = None,
+    ) -> None:
+        """Report a finished download, first handing audio requests to the post-processing stage."""
+        if isinstance(info, dict):
+            job.title = info.get('title') or job.title
+            job.video_key = info_video_key(info) or job.video_key
+        source = path
+        if not (self._staged_audio(job.req) and source and os.path.isfile(source)):
+            self._record_download(job.req, path, info)
+            job.finish(True, path, None)
+            return
+        if os.path.splitext(source)[1].lower() == ".mp3":
+            self._record_download(job.req, source, info)
+            job.finish(True, source, None)
+            return
+
+        # The download worker is released now; the stage finishes the job later
+        job.defer_finish()
+        emitter = emitter or self._progress_emitter(job)
+        destination = os.path.splitext(source)[0] + ".mp3"
+
+        def extract() -> None:
+            emitter.emit(ProgressEvent(
+                job.job_id, ProgressPhase.POSTPROCESSING, filename=source,
+                postprocessor="ExtractAudio started",
+            ))
+            partial = destination + ".part"
+            try:
+                with self.metrics.span(
+                    job.job_id, "postprocess", "ytd_postprocess_seconds", step="extract_audio"
+                ):
+                    run_ffmpeg(job, extract_audio_command(self._ffmpeg_binary() or "ffmpeg", source, partial))
+                os.replace(partial, destination)
+                os.remove(source)
+            except Exception as e:
+                if os.path.exists(partial):
+                    os.remove(partial)
+                if job.cancelled:
+                    job.on_line("Download cancelled")
+                    job.finish(False, source, "Cancelled")
+                    raise
+                app_logger.log_exception(f"Audio extraction failed for job {job.job_id}")
+                self.metrics.inc("ytd_failures_total", stage="postprocess")
+                job.on_line(f"Error: audio extraction failed: {e}")
+                job.finish(False, source, f"Audio extraction failed: {e}")
+                raise
+            emitter.emit(ProgressEvent(
+                job.job_id, ProgressPhase.POSTPROCESSING, filename=destination,
+                postprocessor="ExtractAudio finished",
+            ))
+            app_logger.log_info(f"Audio extracted to {destination}")
+            self._record_download(job.req, destination, info)
+            job.finish(True, destination, None)
+
+        self.postprocess.submit(job.job_id, extract)
+
+    def add_progress_listener(self, listener: Callable[[ProgressEvent], None]) -> None:
+        """Receive progress events from every job (after per-job coalescing)."""
+        self.progress_listeners.append(listener)
+
+    def _progress_emitter(self, job: DownloadJob) -> ProgressEmitter:
+        emitter = ProgressEmitter(self.settings.progress_interval)
+        # The classic text log is just one more subscriber
+        emitter.subscribe(lambda event: job.on_line(format_progress_line(event)))
+        if job.on_progress is not None:
+            emitter.subscribe(job.on_progress)
+        emitter.subscribe(lambda event: self._journal_progress(job, event))
+        emitter.subscribe(lambda event: self._disk_progress(job, event))
+        if self.metrics.enabled:
+            emitter.subscribe(self._progress_metrics(job))
+        for listener in self.progress_listeners:
+            emitter.subscribe(listener)
+        return emitter
+
     def run(
         self,
         req: DownloadRequest,
         on_line: Callable[[str], None],
         on_done: Callable[[bool, Optional[str], Optional[str]], None],
-    ) -> None:
-        """Run yt-dlp in a background thread, streaming stdout lines."""
+        priority: int = 0,
+        on_entry_done: Optional[Callable[[bool, Optional[str], Optional[str]], None]] = None,
+        job_id: Optional[str] = None,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+    ) -> str:
+        """Queue a download and return its job ID.
+
+        The job runs on the bounded worker pool, streaming output lines to
+        ``on_line`` and reporting the outcome through ``on_done``. Playlist
+        and channel URLs fan out into one job per entry (on the binary
+        backend, URLs shaped like one; see ``looks_like_playlist``). Each
+        entry reports through ``on_entry_done`` and ``on_done`` fires once
+        with a summary.
+        ``on_progress`` receives typed ProgressEvent updates for the job.
+
+        The job is journaled until it finishes; see ``interrupted_requests``.
+        """
+        job = self.create_job(
+            req, on_line, on_done, priority, on_entry_done, job_id, on_progress
+        )
+        return self.queue.submit(job)
+
+    def create_job(
+        self,
+        req: DownloadRequest,
+        on_line: Callable[[str], None],
+        on_done: Callable[[bool, Optional[str], Optional[str]], None],
+        priority: int = 0,
+        on_entry_done: Optional[Callable[[bool, Optional[str], Optional[str]], None]] = None,
+        job_id: Optional[str] = None,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+    ) -> DownloadJob:
+        """Build a journaled job for ``execute``, without queueing it."""
+        def finished(success: bool, destination: Optional[str], error: Optional[str]) -> None:
+            if not job.resumable:
+                self.journal.remove(job.job_id)
+            self.metrics.inc("ytd_jobs_total", result=job.state)
+            self.metrics.record_span(
+                job.job_id, "total", job.submitted_at, job.finished_at or time.time()
+            )
+            on_done(success, destination, error)
+
+        job = DownloadJob(
+            req,
+            on_line=on_line,
+            on_done=finished,
+            priority=priority,
+            job_id=job_id,
+            on_entry_done=on_entry_done,
+            on_progress=on_progress,
+        )
+        self.journal.add(job.job_id, req.url, req.format_, req.quality, req.force, priority)
+        self.track(job)
+        return job
+
+    def track(self, job: DownloadJob) -> None:
+        """Record ``job`` in the job history and release its output paths and disk space once it finishes."""
+        job.add_finish_callback(self._record_history)
+        job.add_finish_callback(lambda finished: self.path_claims.release(finished.job_id))
+        job.add_finish_callback(lambda finished: self.disk_space.release(finished.job_id))
+
+    def _record_history(self, job: DownloadJob) -> None:
+        url = job.req.url
+        if job.video_key is None:
+            cached = self.metadata_cache.get(url)
+            if cached:
+                job.video_key = info_video_key(cached)
+                job.title = job.title or cached.get('title')
+        video_key = job.video_key or canonical_video_id(url)
+        size = None
+        if job.destination and os.path.isfile(job.destination):
+            size = os.path.getsize(job.destination)
+        title = job.title
+        if title is None and job.destination:
+            title = os.path.splitext(os.path.basename(job.destination))[0]
+        self.history.record({
+            "job_id": job.job_id,
+            "url": url,
+            "video_key": video_key,
+            "video_id": video_key.split(":", 1)[1] if video_key else None,
+            "title": title,
+            "format": job.req.format_,
+            "quality": job.req.quality,
+            "format_spec": job.format_spec,
+            "destination": job.destination,
+            "size": size,
+            "estimated_size": job.estimated_bytes,
+            "submitted_at": job.submitted_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at or time.time(),
+            "duration": (job.finished_at - job.started_at) if job.started_at and job.finished_at else None,
+            "attempts": job.attempts,
+            "status": job.state,
+            "error": job.error,
+        })
+
+    def interrupted_requests(self) -> List[DownloadRequest]:
+        """Requests left unfinished by an earlier run that quit or crashed.
+
+        They are removed from the journal; pass each one to ``run`` again and
+        yt-dlp picks up the partial file where it stopped.
+        """
+        requests = []
+        for entry in self.journal.take_interrupted():
+            if entry.get("partial_path"):
+                app_logger.log_info(
+                    f"Resuming {entry['url']}: {entry.get('downloaded_bytes') or 0} bytes "
+                    f"already in {entry['partial_path']}"
+                )
+            else:
+                app_logger.log_info(f"Resuming {entry['url']}")
+            requests.append(DownloadRequest(
+                url=entry["url"],
+                format_=entry.get("format") or "Video",
+                quality=entry.get("quality") or "High",
+                force=bool(entry.get("force")),
+            ))
+        return requests
+
+    def record_job_start(self, job: DownloadJob) -> None:
+        """Record how long a job waited between submission and a worker picking it up."""
+        if job.started_at is not None:
+            self.metrics.observe("ytd_queue_wait_seconds", job.started_at - job.submitted_at)
+            self.metrics.record_span(job.job_id, "queued", job.submitted_at, job.started_at)
+
+    def _progress_metrics(self, job: DownloadJob) -> Callable[[ProgressEvent], None]:
+        """Progress subscriber recording time-to-first-byte, download time and bytes."""
+        first_byte_at: List[float] = []
+
+        def observe(event: ProgressEvent) -> None:
+            started = job.started_at or job.submitted_at
+            if event.phase == ProgressPhase.DOWNLOADING and event.downloaded_bytes and not first_byte_at:
+                first_byte_at.append(event.timestamp)
+                self.metrics.observe("ytd_time_to_first_byte_seconds", event.timestamp - started)
+            elif event.phase == ProgressPhase.FINISHED:
+                self.metrics.observe("ytd_download_seconds", event.timestamp - started)
+                self.metrics.inc(
+                    "ytd_downloaded_bytes_total", event.total_bytes or event.downloaded_bytes or 0
+                )
+                self.metrics.record_span(
+                    job.job_id, "download", first_byte_at[0] if first_byte_at else started, event.timestamp
+                )
+
+        return observe
+
+    def _journal_progress(self, job: DownloadJob, event: ProgressEvent) -> None:
+        if event.phase != ProgressPhase.DOWNLOADING or not event.filename:
+            return
+        partial_path = event.filename if event.filename.endswith(".part") else f"{event.filename}.part"
+        self.journal.update_progress(
+            job.job_id, partial_path, event.downloaded_bytes, event.total_bytes
+        )
+
+    def _disk_progress(self, job: DownloadJob, event: ProgressEvent) -> None:
+        if event.phase == ProgressPhase.DOWNLOADING:
+            self.disk_space.progress(job.job_id, event.filename, event.downloaded_bytes)
+
+    def cancel(self, job_id: str, resumable: bool = False) -> bool:
+        """Cancel a job; with ``resumable`` it stays journaled for the next launch."""
+        return self.queue.cancel(job_id, resumable)
+
+    def pause(self, job_id: str) -> bool:
+        return self.queue.pause(job_id)
+
+    def resume(self, job_id: str) -> bool:
+        return self.queue.resume(job_id)
+
+    def set_max_concurrency(self, max_concurrent: int) -> None:
+        self.settings.max_concurrent_downloads = max_concurrent
+        self.queue.set_max_workers(max_concurrent)
+
+    def set_global_rate_limit(self, limit: Optional[float]) -> None:
+        """Change the shared bandwidth cap (bytes/s); running jobs adapt within a second."""
+        self.settings.global_rate_limit = limit
+        self.bandwidth.set_global_limit(limit)
+
+    def set_job_rate_limit(self, job_id: str, limit: Optional[float]) -> bool:
+        """Change one running job's bandwidth cap (bytes/s); None removes it."""
+        return self.bandwidth.set_job_limit(job_id, limit)
+
+    def open_stream(
+        self,
+        req: DownloadRequest,
+        on_line: Optional[Callable[[str], None]] = None,
+        on_done: Optional[Callable[[bool, Optional[str], Optional[str]], None]] = None,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> MediaStream:
+        """Download ``req`` as a byte stream instead of a file; see MediaStream.
+
+        Only single-file formats can be streamed (a pipe can't be merged), and
+        audio comes as downloaded rather than converted to mp3; pipe it through
+        ffmpeg with ``MediaStream.pipe_to`` if needed. Streams start right away,
+        outside the queue and the archive, but share the bandwidth limits.
+        Raises RuntimeError when yt-dlp can't be started.
+        """
+        command = self._stream_command(req)
+        job = DownloadJob(
+            req,
+            on_line=on_line or (lambda line: None),
+            on_done=on_done or (lambda success, destination, error: None),
+            on_progress=on_progress,
+        )
+        job.state = JobState.RUNNING
+        job.started_at = time.time()
+        self.track(job)
+        app_logger.log_info(f"Streaming {req.url} as job {job.job_id}: {' '.join(command)}")
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self._subprocess_env(),
+        )
+        job.attach_process(process)
+        self.bandwidth.register(job.job_id, req.rate_limit or self.settings.job_rate_limit)
+        output = BinaryOutput(self, job)
+
+        def finish(returncode: Optional[int], error_output: str) -> None:
+            self.bandwidth.unregister(job.job_id)
+            if job.cancelled:
+                job.finish(False, None, "Cancelled")
+            elif returncode != 0:
+                app_logger.log_error(f"Stream {job.job_id} failed with return code {returncode}")
+                self.metrics.inc("ytd_failures_total", stage="download")
+                job.finish(False, None, error_output.strip() or "Unknown error")
+            else:
+                app_logger.log_info(f"Stream {job.job_id} finished")
+                job.finish(True, None, None)
+
+        return MediaStream(job, process, output.feed, finish, chunk_size)
+
+    def _stream_command(self, req: DownloadRequest) -> List[str]:
+        if self.yt_dlp_path:
+            command = [self.yt_dlp_path]
+        elif self.use_python_module and not getattr(sys, "frozen", False):
+            # No standalone binary, but the installed module runs as one
+            command = [sys.executable, "-m", "yt_dlp"]
+        else:
+            raise RuntimeError("Streaming needs the yt-dlp binary or an installed yt-dlp module")
+        # Messages and progress go to stderr once the media goes to stdout
+        command += ["-o", "-"] + binary_progress_args() + self._retry_args()
+        choice = self.choose_formats(req, self.metadata_cache.get(req.url), can_merge=False)
+        if choice is not None:
+            command += ["-f", choice.spec]
+        else:
+            spec, sort = format_spec(req.format_, req.quality, can_merge=False)
+            command += ["-f", spec, "-S", ",".join(sort)]
+        if self.settings.ffmpeg_path:
+            command += ["--ffmpeg-location", self.settings.ffmpeg_path]
+        command.append(req.url)
+        return command
+
+    def status(self) -> Dict[str, Any]:
+        """Queue depth and throughput snapshot, cheap enough to poll from the UI."""
+        status = self.queue.status()
+        status["toolchain_ready"] = self.toolchain_ready
+        status["global_rate_limit"] = self.settings.global_rate_limit
+        status["postprocess"] = self.postprocess.status()
+        status["paused_hosts"] = self.retry_policy.breaker.open_hosts()
+        status["disk_reserved_bytes"] = self.disk_space.reserved()
+        return status
+
+    def find_existing(self, req: DownloadRequest) -> Optional[dict]:
+        """Look the request up in the download archive without any network I/O."""
+        keys = [cache_key_for_url(req.url)]
+        cached = self.metadata_cache.get(req.url)
+        if cached:
+            video_key = info_video_key(cached)
+            if video_key:
+                keys.append(video_key)
+        return self.archive.lookup(keys, format_key(req.format_, req.quality))
+
+    def rebuild_archive(self) -> int:
+        """Seed the download archive from files already in the downloads directory."""
+        from download_archive import title_index_from_cache
+
+        titles = title_index_from_cache(self.metadata_cache.cache_dir)
+        return self.archive.rebuild(self.settings.downloads_dir, titles)
+
+    def _record_download(self, req: DownloadRequest, path: Optional[str], info=None) -> None:
+        if not path or not os.path.isfile(path):
+            return
+        keys = [cache_key_for_url(req.url)]
+        if isinstance(info, dict) and info_video_key(info):
+            keys.append(info_video_key(info))
+        self.archive.record(keys, format_key(req.format_, req.quality), path)
+
+    def execute(self, job: DownloadJob) -> None:
+        """Run one attempt of a queued job on the calling thread (a pool worker).
+
+        When the retry policy allows another try, or the job's host has an
+        open circuit, the job is left with ``pending_retry`` set and the
+        queue runs it again after that delay; backoff never holds a worker.
+        With the binary backend, compatible queued jobs are pulled in to
+        share the job's yt-dlp process (see BinaryBatch).
+        """
+        self.start_job(job)
+        wait = self.host_wait(job)
+        if wait > 0:
+            job.pending_retry = wait
+            return
+        companions = self._batch_companions(job)
+        if companions:
+            self._execute_batch([job] + companions)
+        else:
+            self.attempt(job)
+
+    def start_job(self, job: DownloadJob) -> None:
+        """Bookkeeping for a job's first dispatch: queue-wait metrics and the retry hook."""
+        if job.retry_delay is None:
+            self.record_job_start(job)
+            job.retry_delay = self.retry_delay
+
+    def attempt(self, job: DownloadJob) -> None:
+        """Make one download attempt; a retryable failure leaves ``job.pending_retry`` set."""
+        job.attempts += 1
+        self._execute_attempt(job)
+        self.end_attempt(job)
+
+    def end_attempt(self, job: DownloadJob) -> None:
+        """Report an attempt to the circuit breaker; a job that will be retried gives up its disk space.
 
-        def worker():
+        The reservation (and placeholder) would otherwise be held through the
+        whole backoff; the next attempt reserves the space again.
+        """
+        self._settle_host(job)
+        if job.pending_retry is not None:
+            self.disk_space.release(job.job_id)
+
+    def _batch_companions(self, job: DownloadJob) -> List[DownloadJob]:
+        """Queued jobs that can run in the same yt-dlp process as ``job``.
+
+        Their disk space is only reserved if it is free right away (see
+        ``_execute_batch``); the others go straight back in the queue.
+        """
+        limit = self.settings.binary_batch_size - 1
+        if self.use_python_module or not self.yt_dlp_path or limit < 1:
+            return []
+        if looks_like_playlist(job.req.url):
+            # Fanned out into per-entry jobs instead
+            return []
+        if job.req.rate_limit:
+            # Throttling stops the shared process, which would slow the other URLs too
+            return []
+        breaker = self.retry_policy.breaker
+        if breaker.remaining(host_of(job.req.url)):
+            return []
+        urls = {job.req.url}
+
+        def compatible(other: DownloadJob) -> bool:
+            req = other.req
+            if (
+                req.url in urls
+                or looks_like_playlist(req.url)
+                or req.rate_limit
+                or (req.format_, req.quality) != (job.req.format_, job.req.quality)
+                or breaker.acquire(host_of(req.url), other.job_id)
+            ):
+                return False
+            urls.add(req.url)
+            return True
+
+        return self.queue.take_queued(compatible, limit)
+
+    def _execute_batch(self, jobs: List[DownloadJob]) -> None:
+        batch = []
+        for job in jobs:
+            self.start_job(job)
+            job.attempts += 1
+            existing = None if job.req.force else self.find_existing(job.req)
+            if existing:
+                app_logger.log_info(f"Already downloaded: {existing['path']}")
+                job.on_line(f"[archive] Already downloaded: {existing['path']}")
+                job.finish(True, existing["path"], None)
+                continue
+            choice = self.choose_formats(job.req, self.metadata_cache.get(job.req.url))
+            if choice is not None:
+                job.estimated_bytes = choice.estimated_bytes
+            # Companions mustn't wait: the space may be held by their own batch-mates, which
+            # can't start until admission is over. One that doesn't fit now is left out and
+            # goes back in the queue with the other leftovers below.
+            if self._admit_download(job, wait=job is jobs[0]):
+                batch.append(job)
+        if batch:
+            app_logger.log_info(f"Running {len(batch)} jobs in one yt-dlp process")
+            for job in batch:
+                self.bandwidth.register(job.job_id, job.req.rate_limit or self.settings.job_rate_limit)
+            try:
+                BinaryBatch(self, batch).run()
+            except Exception as exc:
+                app_logger.log_exception("Error in batch download")
+                for job in batch:
+                    job.finish(False, None, str(exc))
+            finally:
+                for job in batch:
+                    self.bandwidth.unregister(job.job_id)
+
+        # Retries, and URLs the batch never got to, go back in the queue as jobs of their own
+        for job in jobs:
+            self._settle_host(job)
+            if job.state in JobState.FINISHED or job.deferred:
+                continue
+            if job.pending_retry is None:
+                # Stopped before this URL's turn; not a failed attempt
+                job.attempts -= 1
+                job.pending_retry = 0.0
+            # Don't hold disk space while queued; the next attempt reserves it again
+            self.disk_space.release(job.job_id)
+            if job is not jobs[0]:
+                # The worker requeues its own job once this returns
+                delay, job.pending_retry = job.pending_retry, None
+                self.queue.requeue(job, delay)
+
+    def retry_delay(self, job: DownloadJob, error: Optional[str]) -> Optional[float]:
+        """Backoff before re-running ``job`` after a failed attempt, or None to fail it now."""
+        delay = self.retry_policy.job_delay(job.req.url, error, job.attempts)
+        if delay is None:
+            return None
+        error_class = classify_error(error)
+        self.metrics.inc("ytd_retries_total", error_class=error_class)
+        app_logger.log_warning(
+            f"Job {job.job_id} attempt {job.attempts} failed ({error_class}: {error}); "
+            f"retrying in {delay:.1f}s"
+        )
+        job.on_line(f"[retry] Attempt {job.attempts} failed ({error_class}); retrying in {delay:.1f}s")
+        return delay
+
+    def host_wait(self, job: DownloadJob) -> float:
+        """Seconds to hold ``job`` back because its host's circuit is open.
+
+        0 means go ahead, possibly as the single trial of a half-open host.
+        """
+        host = host_of(job.req.url)
+        wait = self.retry_policy.breaker.acquire(host, job.job_id)
+        if wait > 0:
+            job.on_line(f"[retry] {host} is failing; waiting {wait:.0f}s before trying it")
+        return wait
+
+    def take_retry(self, job: DownloadJob) -> Optional[float]:
+        """After an attempt: the pending retry delay, if the attempt failed and will be retried."""
+        delay, job.pending_retry = job.pending_retry, None
+        return delay
+
+    def _settle_host(self, job: DownloadJob) -> None:
+        """Report an attempt's outcome to the circuit breaker (failures are counted by retry_delay)."""
+        host = host_of(job.req.url)
+        if job.state == JobState.COMPLETED:
+            self.retry_policy.breaker.record_success(host)
+        else:
+            self.retry_policy.breaker.release(host, job.job_id)
+
+    def _execute_attempt(self, job: DownloadJob) -> None:
+        try:
+            app_logger.log_info(f"Starting download job {job.job_id}")
+
+            # Skip anything already downloaded before touching the network
+            existing = None if job.req.force else self.find_existing(job.req)
+            if existing:
+                app_logger.log_info(f"Already downloaded: {existing['path']}")
+                job.on_line(f"[archive] Already downloaded: {existing['path']}")
+                job.finish(True, existing["path"], None)
+                return
+
+            self.bandwidth.register(job.job_id, job.req.rate_limit or self.settings.job_rate_limit)
             try:
-                app_logger.log_info("Starting download worker thread")
-                
                 # Use Python module if available (better SSL support)
                 if self.use_python_module:
-                    try:
-                        import yt_dlp
-                        
-                        options = self.build_options(req)
-                        on_line("Download Started...\n")
-                        on_line(f"Using yt-dlp Python module with options: {options}")
-                        
-                        # Create yt-dlp downloader with options
-                        ydl = yt_dlp.YoutubeDL(options)
-                        
-                        # Create a custom progress hook to capture output
-                        destination_path: Optional[str] = None
-                        
-                        def progress_hook(d):
-                            nonlocal destination_path
-                            status = d.get('status', '')
-                            if status == 'downloading':
-                                percent = d.get('_percent_str', 'N/A')
-                                speed = d.get('_speed_str', 'N/A')
-                                total = d.get('_total_bytes_str', 'N/A')
-                                downloaded = d.get('downloaded_bytes', 0)
-                                on_line(f"[download] {percent} of ~{total} at {speed} ETA {d.get('_eta_str', 'N/A')}")
-                            elif status == 'finished':
-                                filename = d.get('filename') or d.get('filepath')
-                                if filename:
-                                    destination_path = filename
-                                total_bytes = d.get('_total_bytes_str', d.get('total_bytes', 'N/A'))
-                                on_line(f"[download] 100% of {total_bytes}")
-                                if destination_path:
-                                    on_line(f"[download] Saved to: {destination_path}")
-                        
-                        ydl.add_progress_hook(progress_hook)
-                        
-                        # Download
-                        app_logger.log_info(f"Downloading URL: {req.url}")
-                        info = ydl.extract_info(req.url, download=True)
-                        
-                        # Determine the final file path
-                        final_path = destination_path
-                        if not final_path:
-                            # Try to get path from info
-                            if isinstance(info, dict):
-                                # For playlists, get the first entry
-                                if 'entries' in info and info['entries']:
-                                    entry = info['entries'][0]
-                                    if isinstance(entry, dict) and 'requested_downloads' in entry:
-                                        if entry['requested_downloads']:
-                                            final_path = entry['requested_downloads'][0].get('filepath')
-                                    elif isinstance(entry, dict):
-                                        final_path = entry.get('filepath') or entry.get('filename')
-                                # For single videos
-                                elif 'requested_downloads' in info and info['requested_downloads']:
-                                    final_path = info['requested_downloads'][0].get('filepath')
-                                elif 'filepath' in info:
-                                    final_path = info['filepath']
-                                elif 'filename' in info:
-                                    final_path = info['filename']
-                            
-                            # Last resort: construct filename
-                            if not final_path:
-                                try:
-                                    final_path = ydl.prepare_filename(info)
-                                except:
-                                    final_path = os.path.join(self.settings.downloads_dir, f"{info.get('title', 'video')}.{info.get('ext', 'mp4')}")
-                        
-                        app_logger.log_info(f"Download completed successfully. File: {final_path}")
-                        on_done(True, final_path, None)
-                        return
-                        
-                    except Exception as e:
-                        app_logger.log_exception("Error using yt-dlp Python module")
-                        error_msg = f"Python module error: {str(e)}"
-                        on_line(f"Error: {error_msg}")
-                        on_done(False, None, error_msg)
-                        return
-                
-                # Fallback to binary if module not available
-                if not self.yt_dlp_path:
-                    error_msg = "yt-dlp not found! Ensure it is bundled in the app or install yt-dlp Python package."
-                    app_logger.log_error(error_msg)
-                    on_line(error_msg)
-                    on_done(False, None, "yt-dlp path is not configured")
-                    return
+                    self._run_with_module(job)
+                else:
+                    self._run_with_binary(job)
+            finally:
+                self.bandwidth.unregister(job.job_id)
 
-                command = self.build_command(req)
-                on_line("Download Started...\n")
-                on_line("Running command: " + " ".join(command))
+        except Exception as exc:
+            app_logger.log_exception("Error in download worker thread")
+            self.metrics.inc("ytd_failures_total", stage="download")
+            job.finish(False, None, str(exc))
 
-                app_logger.log_info("Starting subprocess for yt-dlp binary")
-                # Prepare environment for subprocess
-                popen_env = os.environ.copy()
-                
-                # Ensure ffmpeg directory is on PATH if provided
-                if self.settings.ffmpeg_path:
-                    ffmpeg_dir = os.path.dirname(self.settings.ffmpeg_path)
-                    popen_env["PATH"] = ffmpeg_dir + os.pathsep + popen_env.get("PATH", "")
-                
-                # Ensure SSL certificate environment variables are passed to yt-dlp subprocess
-                # These are set by configure_ssl_certificates() in main.py
-                if "SSL_CERT_FILE" in os.environ:
-                    popen_env["SSL_CERT_FILE"] = os.environ["SSL_CERT_FILE"]
-                    app_logger.log_info(f"Passing SSL_CERT_FILE to yt-dlp: {os.environ['SSL_CERT_FILE']}")
-                if "REQUESTS_CA_BUNDLE" in os.environ:
-                    popen_env["REQUESTS_CA_BUNDLE"] = os.environ["REQUESTS_CA_BUNDLE"]
-                    app_logger.log_info(f"Passing REQUESTS_CA_BUNDLE to yt-dlp: {os.environ['REQUESTS_CA_BUNDLE']}")
-
-                process = subprocess.Popen(
-                    command,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    bufsize=1,
-                    env=popen_env,
-                )
-                app_logger.log_info(f"Process started with PID: {process.pid}")
+    def _run_with_module(self, job: DownloadJob) -> None:
+        req = job.req
+        on_line = job.on_line
+        on_done = job.finish
+        emitter = self._progress_emitter(job)
 
+        try:
+            options = self.build_options(req)
+            on_line("Download Started...\n")
+            on_line(f"Using yt-dlp Python module with options: {options}")
+
+            # Borrow a warm yt-dlp downloader for this option set
+            with self.ydl_pool.checkout(options) as ydl:
+                # Turn yt-dlp hook callbacks into typed, rate-limited progress events
                 destination_path: Optional[str] = None
-                if process.stdout is not None:
-                    for line in process.stdout:
-                        clean = line.rstrip()
-                        on_line(clean)
-                        app_logger.log_debug(f"yt-dlp output: {clean}")
-                        
-                        if (
-                            "[download]" in clean
-                            and "Destination:" in clean
-                            and destination_path is None
-                        ):
-                            destination_path = clean.split("Destination:")[-1].strip()
-                            app_logger.log_info(f"Destination path found: {destination_path}")
-
-                app_logger.log_info("Waiting for process to complete...")
-                process.wait()
-                app_logger.log_info(f"Process completed with return code: {process.returncode}")
-
-                if process.returncode != 0:
-                    error_message = (
-                        process.stderr.read().strip()
-                        if process.stderr
-                        else "Unknown error"
-                    )
-                    app_logger.log_error(f"Download failed with return code {process.returncode}: {error_message}")
-                    on_line(f"Download failed!\n{error_message}")
-                    on_done(False, destination_path, error_message)
+
+                def progress_hook(d):
+                    nonlocal destination_path
+                    if d.get("status") == "downloading":
+                        job.throttle(self.bandwidth.consume_progress(
+                            job.job_id, d.get("filename"), d.get("downloaded_bytes")
+                        ))
+                    # Honour pause/cancel between chunks
+                    job.checkpoint()
+                    event = event_from_hook(job.job_id, d)
+                    if event.phase == ProgressPhase.FINISHED and event.filename:
+                        destination_path = event.filename
+                    emitter.emit(event)
+
+                ydl.add_progress_hook(progress_hook)
+                ydl.add_postprocessor_hook(
+                    lambda d: emitter.emit(event_from_postprocessor_hook(job.job_id, d))
+                )
+                emitter.emit(ProgressEvent(job.job_id, ProgressPhase.EXTRACTING))
+
+                # Download
+                app_logger.log_info(f"Downloading URL: {req.url}")
+                info = self._download_with_cache(job, ydl)
+                if info is None:
+                    # Playlist handed off to per-entry jobs, which report on their own
                     return
+                final_path = destination_path or self._resolve_final_path(ydl, info)
 
-                app_logger.log_info("Download completed successfully")
-                on_done(True, destination_path, None)
-                
-            except Exception as exc:
-                app_logger.log_exception("Error in download worker thread")
-                on_done(False, None, str(exc))
+            app_logger.log_info(f"Download completed successfully. File: {final_path}")
+            self._finish_download(job, final_path, info, emitter)
+
+        except Exception as e:
+            if job.cancelled:
+                app_logger.log_info(f"Job {job.job_id} cancelled")
+                on_line("Download cancelled")
+                on_done(False, None, "Cancelled")
+                return
+            app_logger.log_exception("Error using yt-dlp Python module")
+            self.metrics.inc("ytd_failures_total", stage="download")
+            error_msg = f"Python module error: {str(e)}"
+            on_line(f"Error: {error_msg}")
+            on_done(False, None, error_msg)
+
+    def probe(self, req: DownloadRequest) -> Optional[dict]:
+        """Extract metadata and available formats without downloading.
+
+        Served from the metadata cache when the video was probed recently.
+        """
+        if self.use_python_module:
+            options = self.build_options(req)
+            with self.ydl_pool.checkout(options) as ydl:
+                return self.metadata_cache.get_or_extract(
+                    req.url, lambda url: self._extract_raw_info(ydl, url)
+                )
+
+        def extract_with_binary(url: str) -> dict:
+            result = subprocess.run(
+                [self.yt_dlp_path, "-J", "--flat-playlist", url],
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip() or "yt-dlp metadata probe failed")
+            return json.loads(result.stdout)
+
+        if not self.yt_dlp_path:
+            return None
+        return self.metadata_cache.get_or_extract(req.url, extract_with_binary)
+
+    def fan_out_binary(self, job: DownloadJob) -> bool:
+        """Expand a playlist URL into per-entry jobs on the binary backend.
+
+        Only URLs that look like playlists are probed (``-J --flat-playlist``
+        costs a yt-dlp run); True if the job was handed to a PlaylistFanOut.
+        """
+        if job.preloaded_info is not None or not looks_like_playlist(job.req.url):
+            return False
+        try:
+            with self.metrics.span(job.job_id, "extract", "ytd_extract_seconds"):
+                info = self.probe(job.req)
+        except Exception as e:
+            # The download itself reports whatever is wrong with the URL
+            app_logger.log_warning(f"Could not expand {job.req.url} ({e}); downloading it as one job")
+            return False
+        if not is_playlist(info):
+            return False
+        PlaylistFanOut(
+            self, job, None, info, self.settings.playlist_concurrency, job.on_entry_done
+        ).start()
+        return True
+
+    def cache_entry_info(self, url: str, entry: dict) -> None:
+        """Cache a fully extracted playlist entry so its own job skips extraction."""
+        if not self.use_python_module or not entry.get('formats'):
+            return
+        if entry.get('_type', 'video') != 'video':
+            return
+        from yt_dlp import YoutubeDL
+
+        self.metadata_cache.put(url, YoutubeDL.sanitize_info(dict(entry), remove_private_keys=True))
+
+    @staticmethod
+    def _extract_unprocessed(ydl, url: str):
+        """Extract without processing, following plain URL redirects (e.g. watch?list=)."""
+        info = ydl.extract_info(url, download=False, process=False)
+        for _ in range(5):
+            if not isinstance(info, dict) or info.get('_type') != 'url':
+                break
+            info = ydl.extract_info(
+                info['url'], download=False, process=False, ie_key=info.get('ie_key')
+            )
+        return info
+
+    @classmethod
+    def _extract_raw_info(cls, ydl, url: str) -> dict:
+        info = cls._extract_unprocessed(ydl, url)
+        if isinstance(info, dict) and info.get('_type', 'video') == 'video':
+            return ydl.sanitize_info(info, remove_private_keys=True)
+        return info
+
+    def _download_with_cache(self, job: DownloadJob, ydl):
+        """Download ``job.req.url``, skipping extraction when metadata is cached.
+
+        Returns the processed info dict, or None if the URL was a playlist
+        that has been fanned out into per-entry jobs.
+        """
+        url = job.req.url
+        if job.preloaded_info is not None:
+            return ydl.process_ie_result(self._apply_format_choice(job, job.preloaded_info, ydl), download=True)
+
+        cached = self.metadata_cache.get(url)
+        if cached is not None:
+            job.on_line("[cache] Using cached video metadata")
+            try:
+                return ydl.process_ie_result(self._apply_format_choice(job, cached, ydl), download=True)
+            except (JobCancelled, DiskSpaceError):
+                # Fresh metadata wouldn't change either outcome
+                raise
+            except Exception as e:
+                if job.cancelled:
+                    raise
+                # Most likely expired stream URLs; fall back to a fresh extraction
+                app_logger.log_warning(f"Download from cached metadata failed ({e}); re-extracting")
+                self.metadata_cache.invalidate(url)
+
+        with self.metrics.span(job.job_id, "extract", "ytd_extract_seconds"):
+            info = self._extract_unprocessed(ydl, url)
+        if is_playlist(info):
+            # The lazy entry generator keeps using this instance, so take it out of the pool
+            self.ydl_pool.detach(ydl)
+            PlaylistFanOut(
+                self, job, ydl, info, self.settings.playlist_concurrency, job.on_entry_done
+            ).start()
+            return None
+        if isinstance(info, dict) and info.get('_type', 'video') == 'video':
+            self.metadata_cache.put(url, ydl.sanitize_info(info, remove_private_keys=True))
+            info = self._apply_format_choice(job, info, ydl)
+        return ydl.process_ie_result(info, download=True)
+
+    def _resolve_final_path(self, ydl, info) -> Optional[str]:
+        """Work out the downloaded file path from an info dict."""
+        final_path = None
+        if isinstance(info, dict):
+            # For playlists, get the first entry
+            if 'entries' in info and info['entries']:
+                entry = info['entries'][0]
+                if isinstance(entry, dict) and 'requested_downloads' in entry:
+                    if entry['requested_downloads']:
+                        final_path = entry['requested_downloads'][0].get('filepath')
+                elif isinstance(entry, dict):
+                    final_path = entry.get('filepath') or entry.get('filename')
+            # For single videos
+            elif 'requested_downloads' in info and info['requested_downloads']:
+                final_path = info['requested_downloads'][0].get('filepath')
+            elif 'filepath' in info:
+                final_path = info['filepath']
+            elif 'filename' in info:
+                final_path = info['filename']
+
+        # Last resort: construct filename
+        if not final_path:
+            try:
+                final_path = ydl.prepare_filename(info)
+            except:
+                final_path = os.path.join(self.settings.downloads_dir, f"{info.get('title', 'video')}.{info.get('ext', 'mp4')}")
+        return final_path
+
+    def _prepare_binary(self, job: DownloadJob) -> Optional[Tuple[List[str], Dict[str, str]]]:
+        """Command line and environment for a yt-dlp subprocess; None if the job already failed."""
+        if not self.yt_dlp_path:
+            error_msg = "yt-dlp not found! Ensure it is bundled in the app or install yt-dlp Python package."
+            app_logger.log_error(error_msg)
+            job.on_line(error_msg)
+            job.finish(False, None, "yt-dlp path is not configured")
+            return None
+
+        # With metadata already cached (probe, earlier run) pick the exact formats up
+        # front, as the module backend does; otherwise yt-dlp ranks with the same rules
+        choice = self.choose_formats(job.req, self.metadata_cache.get(job.req.url))
+        if choice is not None:
+            self._note_format_choice(job, choice)
+        if not self._admit_download(job):
+            return None
+        command = self.build_command(job.req, choice)
+        job.on_line("Download Started...\n")
+        job.on_line("Running command: " + " ".join(command))
+
+        app_logger.log_info("Starting subprocess for yt-dlp binary")
+        return command, self._subprocess_env()
+
+    def _subprocess_env(self) -> Dict[str, str]:
+        """Environment for yt-dlp subprocesses: ffmpeg on PATH, SSL settings passed through."""
+        popen_env = os.environ.copy()
+        
+        # Ensure ffmpeg directory is on PATH if provided
+        if self.settings.ffmpeg_path:
+            ffmpeg_dir = os.path.dirname(self.settings.ffmpeg_path)
+            popen_env["PATH"] = ffmpeg_dir + os.pathsep + popen_env.get("PATH", "")
+        
+        # Ensure SSL certificate environment variables are passed to yt-dlp subprocess
+        # These are set by configure_ssl_certificates() in main.py
+        if "SSL_CERT_FILE" in os.environ:
+            popen_env["SSL_CERT_FILE"] = os.environ["SSL_CERT_FILE"]
+            app_logger.log_info(f"Passing SSL_CERT_FILE to yt-dlp: {os.environ['SSL_CERT_FILE']}")
+        if "REQUESTS_CA_BUNDLE" in os.environ:
+            popen_env["REQUESTS_CA_BUNDLE"] = os.environ["REQUESTS_CA_BUNDLE"]
+            app_logger.log_info(f"Passing REQUESTS_CA_BUNDLE to yt-dlp: {os.environ['REQUESTS_CA_BUNDLE']}")
+        return popen_env
+
+    def _finish_binary(
+        self,
+        job: DownloadJob,
+        returncode: Optional[int],
+        error_output: str,
+        destination_path: Optional[str],
+    ) -> None:
+        """Report the outcome of a yt-dlp subprocess once it has exited."""
+        app_logger.log_info(f"Process completed with return code: {returncode}")
+
+        if job.cancelled:
+            app_logger.log_info(f"Job {job.job_id} cancelled")
+            job.on_line("Download cancelled")
+            job.finish(False, destination_path, "Cancelled")
+            return
+
+        if returncode != 0:
+            error_message = error_output.strip() or "Unknown error"
+            app_logger.log_error(f"Download failed with return code {returncode}: {error_message}")
+            self.metrics.inc("ytd_failures_total", stage="download")
+            job.on_line(f"Download failed!\n{error_message}")
+            job.finish(False, destination_path, error_message)
+            return
+
+        app_logger.log_info("Download completed successfully")
+        self._finish_download(job, destination_path)
+
+    def _run_with_binary(self, job: DownloadJob) -> None:
+        if self.fan_out_binary(job):
+            return
+        prepared = self._prepare_binary(job)
+        if prepared is None:
+            return
+        command, popen_env = prepared
+
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            env=popen_env,
+        )
+        app_logger.log_info(f"Process started with PID: {process.pid}")
+        job.attach_process(process)
+
+        output = BinaryOutput(self, job)
+        if process.stdout is not None:
+            for line in process.stdout:
+                job.throttle(output.feed(line))
+
+        app_logger.log_info("Waiting for process to complete...")
+        process.wait()
+        error_output = process.stderr.read() if process.returncode and process.stderr else ""
+        self._finish_binary(job, process.returncode, error_output, output.destination_path)
+
+
+class BinaryOutput:
+    """Interprets one yt-dlp subprocess's stdout, line by line.
+
+    Progress lines become ProgressEvents, the ``[final]`` line gives the
+    destination and everything else is forwarded to the job's log.
+    """
+
+    def __init__(self, service: DownloaderService, job: DownloadJob):
+        self.job = job
+        self.bandwidth = service.bandwidth
+        self.emitter = service._progress_emitter(job)
+        self.destination_path: Optional[str] = None
+
+    def feed(self, line: str) -> float:
+        """Handle one output line; returns the seconds to throttle the process for."""
+        job = self.job
+        clean = line.rstrip()
+        event = parse_progress_line(job.job_id, clean)
+        if event is not None:
+            self.emitter.emit(event)
+            if event.phase == ProgressPhase.DOWNLOADING:
+                return self.bandwidth.consume_progress(job.job_id, event.filename, event.downloaded_bytes)
+            return 0.0
+        if clean.startswith(FINAL_PATH_PREFIX):
+            self.destination_path = clean[len(FINAL_PATH_PREFIX):]
+            app_logger.log_info(f"Destination path found: {self.destination_path}")
+            return 0.0
+
+        # Forwarded to the job log only; logging every line here too was a hot-path cost
+        job.on_line(clean)
+        if (
+            "[download]" in clean
+            and "Destination:" in clean
+            and self.destination_path is None
+        ):
+            self.destination_path = clean.split("Destination:")[-1].strip()
+        return 0.0
+
+
+class BinaryBatch:
+    """Several jobs downloaded by one yt-dlp process, which reads their URLs from stdin.
+
+    Saves a yt-dlp interpreter start per URL. yt-dlp reads the whole list
+    before starting and then works through it in order, printing an
+    ``[item]`` line as each URL starts; output goes to that URL's job until
+    the next one starts. Errors between URLs belong to the URLs that never
+    got an ``[item]`` line (their extraction failed).
+
+    Pausing or cancelling one job doesn't signal the shared process: a job
+    whose turn hasn't come is detached (a cancelled one finishes at once),
+    and the process is stopped only when it reaches that job, or when the
+    job is the one downloading. Jobs it hadn't finished by then are left
+    unreported for the caller to rerun on their own.
+    """
+
+    def __init__(self, service: DownloaderService, jobs: List[DownloadJob]):
+        self.service = service
+        self.jobs = jobs
+        self.outputs = [BinaryOutput(service, job) for job in jobs]
+        self.errors: List[List[str]] = [[] for _ in jobs]
+        self._current: Optional[int] = None
+        self._next = 0
+        self._gap_errors: List[str] = []
+        self._settled = set()
+        self._settle_lock = threading.Lock()
+        self._process: Optional["subprocess.Popen"] = None
+        self._stopped = False
+
+    def command(self) -> List[str]:
+        # A format selector rather than per-URL format IDs, so one command fits every job
+        command = self.service.build_command(self.jobs[0].req)[:-1]
+        return command + ["--ignore-errors", "--print", ITEM_TEMPLATE, "--batch-file", "-"]
+
+    def run(self) -> None:
+        command = self.command()
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            # One stream, so errors arrive in order with the lines they belong to
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env=self.service._subprocess_env(),
+        )
+        app_logger.log_info(f"Batch process started with PID: {process.pid} for {len(self.jobs)} URLs")
+        self._process = process
+        for index, job in enumerate(self.jobs):
+            # Not attach_process(): pause and cancel of one job mustn't stop the others
+            job.add_cancel_callback(lambda index=index: self._cancelled(index))
+            job.on_line("Download Started...\n")
+            job.on_line("Running command: " + " ".join(command))
+        try:
+            process.stdin.write("".join(job.req.url + "\n" for job in self.jobs))
+            process.stdin.close()
+        except OSError as e:
+            app_logger.log_warning(f"Could not pass the URL list to yt-dlp: {e}")
+
+        for line in process.stdout:
+            self.feed(line)
+        process.wait()
+        self._finish(process.returncode)
+
+    def feed(self, line: str) -> None:
+        if self._stopped:
+            return
+        clean = line.rstrip()
+        if clean.startswith(ITEM_PREFIX):
+            index = self._pending_index(clean[len(ITEM_PREFIX):])
+            if index is not None:
+                self._start(index)
+                return
+        index = self._current
+        if index is not None and self.jobs[index].state == JobState.PAUSED:
+            self._stop()
+            return
+        if clean.startswith("ERROR:"):
+            if index is not None and self.outputs[index].destination_path is None and not self.errors[index]:
+                self.errors[index].append(clean)
+            else:
+                self._gap_errors.append(clean)
+                index = None
+        if index is not None:
+            self._throttle(self.jobs[index], self.outputs[index].feed(line))
+        elif self._next < len(self.jobs):
+            self.jobs[self._next].on_line(clean)
+
+    def _pending_index(self, url: str) -> Optional[int]:
+        for index in range(self._next, len(self.jobs)):
+            if self.jobs[index].req.url == url:
+                return index
+        return None
+
+    def _start(self, index: int) -> None:
+        self._close_gap(index)
+        self._current = index
+        self._next = index + 1
+        job = self.jobs[index]
+        if job.cancelled or job.state == JobState.PAUSED:
+            self._stop()
+
+    def _close_gap(self, upto: int) -> None:
+        """Settle the current job and the URLs skipped before ``upto``."""
+        skipped = list(range(self._next, upto))
+        if skipped:
+            # One error line per failed extraction; any extra lines stay with the last one
+            for n, index in enumerate(skipped):
+                self.errors[index] = self._gap_errors[n:n + 1] if index != skipped[-1] else self._gap_errors[n:]
+        elif self._current is not None:
+            # e.g. a failed entry of a playlist URL
+            self.errors[self._current] += self._gap_errors
+        self._gap_errors = []
+        if self._current is not None:
+            self._settle(self._current)
+        for index in skipped:
+            self._settle(index)
+
+    def _settle(self, index: int) -> None:
+        with self._settle_lock:
+            if index in self._settled:
+                return
+            self._settled.add(index)
+        destination = self.outputs[index].destination_path
+        failed = bool(self.errors[index]) or destination is None
+        error = "\n".join(self.errors[index]) or ("yt-dlp reported no file for this URL" if failed else "")
+        self.service._finish_binary(self.jobs[index], 1 if failed else 0, error, destination)
+
+    def _cancelled(self, index: int) -> None:
+        """Cancel callback of one job; runs on the cancelling thread."""
+        if self._process is None or self._process.poll() is not None:
+            return
+        if index == self._current:
+            self._stop()
+        elif index >= self._next:
+            # Detached: it ends now, and the process stops if it gets to the URL anyway
+            self._settle(index)
+
+    def _stop(self) -> None:
+        self._stopped = True
+        if self._process is not None and self._process.poll() is None:
+            # A throttled process can't act on SIGTERM until it is continued
+            self._signal("SIGCONT")
+            self._process.terminate()
+
+    def _throttle(self, job: DownloadJob, seconds: float) -> None:
+        """DownloadJob.throttle for the job currently downloading in the shared process."""
+        if seconds <= 0:
+            return
+        stopped = self._signal("SIGSTOP")
+        try:
+            job.wait_cancelled(seconds)
+        finally:
+            if stopped:
+                self._signal("SIGCONT")
+
+    def _signal(self, sig_name: str) -> bool:
+        sig = getattr(signal, sig_name, None)
+        if self._process is None or sig is None or self._process.poll() is not None:
+            return False
+        try:
+            os.kill(self._process.pid, sig)
+        except OSError as e:
+            app_logger.log_warning(f"Could not send {sig_name} to batch process {self._process.pid}: {e}")
+            return False
+        return True
+
+    def _finish(self, returncode: int) -> None:
+        if returncode < 0 or self._stopped:
+            # Stopped part-way: only the cancelled jobs end here
+            for index, job in enumerate(self.jobs):
+                if job.cancelled:
+                    self._settle(index)
+            return
+        self._close_gap(len(self.jobs))
 
-        threading.Thread(target=worker, daemon=True).start()
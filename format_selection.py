@@ -0,0 +1,225 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+# Earlier entries are preferred; anything unlisted ranks after them
+VIDEO_CODECS = ("avc1", "h264", "vp9", "vp09", "av01", "hevc", "hvc1")
+AUDIO_CODECS = ("mp4a", "aac", "opus", "vorbis", "mp3")
+# Containers that merge into an mp4 without re-encoding come first
+VIDEO_CONTAINERS = ("mp4", "webm", "mkv", "flv")
+AUDIO_CONTAINERS = ("m4a", "mp4", "webm", "opus", "mp3")
+# Plain HTTP resumes with a single range request; fragmented protocols don't
+PROTOCOLS = ("https", "http", "http_dash_segments", "m3u8_native", "m3u8")
+
+# Which audio container pairs with a video container without re-encoding
+_AUDIO_FOR_VIDEO = {"mp4": ("m4a", "mp4"), "webm": ("webm", "opus")}
+
+
+class FormatProfile:
+    """What a quality setting asks for.
+
+    ``max_height`` and ``max_tbr`` (total bitrate, KBit/s) are ceilings:
+    the best format under them wins, and formats above them are only used
+    when nothing fits. ``max_abr`` does the same for audio-only downloads.
+    """
+
+    def __init__(
+        self,
+        max_height: Optional[int] = None,
+        max_tbr: Optional[float] = None,
+        max_abr: Optional[float] = None,
+    ):
+        self.max_height = max_height
+        self.max_tbr = max_tbr
+        self.max_abr = max_abr
+
+
+QUALITY_PROFILES: Dict[str, FormatProfile] = {
+    "High": FormatProfile(),
+    "Medium": FormatProfile(max_height=720, max_tbr=4000, max_abr=160),
+    "Low": FormatProfile(max_height=480, max_tbr=1500, max_abr=96),
+}
+
+
+def profile_for(quality: str) -> FormatProfile:
+    return QUALITY_PROFILES.get(quality, QUALITY_PROFILES["High"])
+
+
+class FormatChoice:
+    """The format(s) picked for a download and what they are expected to cost."""
+
+    def __init__(self, formats: List[Dict[str, Any]], duration: Optional[float] = None):
+        self.formats = formats
+        self.format_ids = [str(f.get("format_id")) for f in formats]
+        # yt-dlp format spec selecting exactly these formats
+        self.spec = "+".join(self.format_ids)
+        self.needs_merge = len(formats) > 1
+        # Extension of the file yt-dlp will write
+        self.ext = _output_ext(formats)
+        sizes = [estimate_format_size(f, duration) for f in formats]
+        self.estimated_bytes: Optional[int] = (
+            int(sum(sizes)) if sizes and all(size is not None for size in sizes) else None
+        )
+
+    def describe(self) -> str:
+        parts = []
+        for f in self.formats:
+            label = f"{f.get('height')}p" if _has_video(f) and f.get("height") else ""
+            codecs = [c for c in (_codec(f, "vcodec"), _codec(f, "acodec")) if c]
+            parts.append(" ".join(filter(None, [label, "/".join(codecs), f.get("ext")])) or str(f.get("format_id")))
+        text = f"{self.spec} ({' + '.join(parts)})"
+        if self.estimated_bytes is not None:
+            text += f", ~{self.estimated_bytes / (1024 * 1024):.1f} MiB"
+        return text
+
+
+def estimate_format_size(fmt: Dict[str, Any], duration: Optional[float] = None) -> Optional[float]:
+    """Exact or approximate size of one format in bytes; bitrate x duration as a last resort."""
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return float(size)
+    bitrate = fmt.get("tbr") or ((fmt.get("vbr") or 0) + (fmt.get("abr") or 0))
+    if bitrate and duration:
+        return bitrate * 1000 / 8 * duration
+    return None
+
+
+def select_formats(info: Dict[str, Any], format_: str, quality: str, can_merge: bool) -> Optional[FormatChoice]:
+    """Pick formats for a request from an extracted info dict.
+
+    Returns None when the info dict carries no format list (yt-dlp then
+    falls back to the selector from ``format_spec``).
+    """
+    formats = [f for f in info.get("formats") or [] if f.get("format_id") is not None]
+    if not formats:
+        return None
+    profile = profile_for(quality)
+    duration = info.get("duration")
+    if format_ == "Audio":
+        # Sites without audio-only formats: the smallest video carrying the best audio
+        chosen = _best_audio(formats, profile, None) or _best_audio(formats, profile, None, audio_only=False)
+        return FormatChoice([chosen], duration) if chosen else None
+
+    progressive = [f for f in formats if _has_video(f) and _has_audio(f)]
+    best_single = _best_video(progressive, profile) if progressive else None
+    if can_merge:
+        video = _best_video([f for f in formats if _has_video(f)], profile)
+        if video is not None and not _has_audio(video):
+            audio = _best_audio(formats, profile, container=video.get("ext"))
+            if audio is not None:
+                return FormatChoice([video, audio], duration)
+        if video is not None and best_single is None:
+            return FormatChoice([video], duration)
+    if best_single is not None:
+        return FormatChoice([best_single], duration)
+    # Nothing marked as having both streams; take whatever ranks best
+    fallback = _best_video(formats, profile)
+    return FormatChoice([fallback], duration) if fallback else None
+
+
+def format_spec(format_: str, quality: str, can_merge: bool) -> Tuple[str, List[str]]:
+    """yt-dlp ``format`` / ``format_sort`` equivalents of ``select_formats``.
+
+    Used when formats can't be listed up front (e.g. the yt-dlp binary
+    without cached metadata): yt-dlp then ranks with the same ceilings and
+    codec/container preferences.
+    """
+    profile = profile_for(quality)
+    if format_ == "Audio":
+        sort = ["hasaud"]
+        if profile.max_abr:
+            sort.append(f"abr:{profile.max_abr:g}")
+        return "ba/b", sort + ["acodec:aac", "ext:m4a", "proto:https"]
+    sort = []
+    if profile.max_height:
+        sort.append(f"res:{profile.max_height}")
+    if profile.max_tbr:
+        sort.append(f"tbr:{profile.max_tbr:g}")
+    sort += ["vcodec:h264", "acodec:aac", "ext:mp4:m4a", "proto:https"]
+    return ("bv*+ba/b" if can_merge else "b"), sort
+
+
+def _output_ext(formats: List[Dict[str, Any]]) -> Optional[str]:
+    if len(formats) == 1:
+        return formats[0].get("ext")
+    video_ext, audio_ext = formats[0].get("ext"), formats[1].get("ext")
+    # yt-dlp keeps the container when both streams fit it, else merges into mkv
+    if audio_ext in _AUDIO_FOR_VIDEO.get(video_ext or "", ()):
+        return video_ext
+    return "mkv"
+
+
+def _codec(fmt: Dict[str, Any], key: str) -> Optional[str]:
+    value = fmt.get(key)
+    if not value or value == "none":
+        return None
+    return str(value).split(".")[0].lower()
+
+
+def _has_video(fmt: Dict[str, Any]) -> bool:
+    # Missing codec info (e.g. direct links) counts as "probably both"
+    return fmt.get("vcodec") != "none" and not (fmt.get("video_ext") == "none")
+
+
+def _has_audio(fmt: Dict[str, Any]) -> bool:
+    return fmt.get("acodec") != "none" and not (fmt.get("audio_ext") == "none")
+
+
+def _preference(value: Optional[str], order: Tuple[str, ...]) -> int:
+    """Higher is better; unknown values rank below every listed one."""
+    if value is None:
+        return -1
+    try:
+        return len(order) - order.index(value)
+    except ValueError:
+        return 0
+
+
+def _within(value: Optional[float], ceiling: Optional[float]) -> bool:
+    return ceiling is None or value is None or value <= ceiling
+
+
+def _best_video(formats: List[Dict[str, Any]], profile: FormatProfile) -> Optional[Dict[str, Any]]:
+    def key(f: Dict[str, Any]):
+        height = f.get("height") or 0
+        tbr = f.get("tbr") or 0
+        fits = _within(f.get("height"), profile.max_height)
+        return (
+            fits,
+            _within(f.get("tbr"), profile.max_tbr),
+            # Under the ceiling bigger is better; over it, closest to the ceiling
+            height if fits else -height,
+            # At equal resolution a progressive format saves a merge
+            _has_audio(f),
+            _preference(_codec(f, "vcodec"), VIDEO_CODECS),
+            _preference(f.get("ext"), VIDEO_CONTAINERS),
+            f.get("fps") or 0,
+            _preference(f.get("protocol"), PROTOCOLS),
+            tbr if _within(tbr, profile.max_tbr) else -tbr,
+        )
+
+    return max(formats, key=key) if formats else None
+
+
+def _best_audio(
+    formats: List[Dict[str, Any]],
+    profile: FormatProfile,
+    container: Optional[str],
+    audio_only: bool = True,
+) -> Optional[Dict[str, Any]]:
+    audio = [f for f in formats if _has_audio(f) and not (audio_only and _has_video(f))]
+    matching = _AUDIO_FOR_VIDEO.get(container or "", ())
+
+    def key(f: Dict[str, Any]):
+        abr = f.get("abr") or f.get("tbr") or 0
+        fits = _within(abr or None, profile.max_abr)
+        return (
+            # Same container family as the video merges without re-encoding
+            f.get("ext") in matching,
+            fits,
+            abr if fits else -abr,
+            -(f.get("height") or 0),
+            _preference(_codec(f, "acodec"), AUDIO_CODECS),
+            _preference(f.get("ext"), AUDIO_CONTAINERS),
+            _preference(f.get("protocol"), PROTOCOLS),
+        )
+
+    return max(audio, key=key) if audio else None
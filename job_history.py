@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from logger_config import app_logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    video_key TEXT,
+    video_id TEXT,
+    title TEXT,
+    format TEXT,
+    quality TEXT,
+    format_spec TEXT,
+    destination TEXT,
+    size INTEGER,
+    estimated_size INTEGER,
+    submitted_at REAL,
+    started_at REAL,
+    finished_at REAL NOT NULL,
+    duration REAL,
+    attempts INTEGER,
+    status TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+CREATE INDEX IF NOT EXISTS jobs_url ON jobs (url, finished_at);
+CREATE INDEX IF NOT EXISTS jobs_video_id ON jobs (video_id, finished_at);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, finished_at);
+"""
+
+_COLUMNS = (
+    "job_id", "url", "video_key", "video_id", "title", "format", "quality", "format_spec",
+    "destination", "size", "estimated_size", "submitted_at", "started_at", "finished_at",
+    "duration", "attempts", "status", "error",
+)
+
+
+class JobHistory:
+    """SQLite record of every finished job, searchable by URL, video ID, date and status.
+
+    Each lookup is served by an index on ``(column, finished_at)`` and
+    results come newest first, so queries stay fast however many rows
+    accumulate. Page through long results with ``before`` (the
+    ``finished_at`` of the last row seen) rather than offsets.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """Insert or replace one job's row; keys are the column names above."""
+        row = tuple(entry.get(column) for column in _COLUMNS)
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        try:
+            with self._lock:
+                conn = self._connect_locked()
+                with conn:
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO jobs ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+                        row,
+                    )
+        except sqlite3.Error as e:
+            app_logger.log_warning(f"Could not record job {entry.get('job_id')} in history: {e}")
+
+    def search(
+        self,
+        url: Optional[str] = None,
+        video_id: Optional[str] = None,
+        status: Optional[str] = None,
+        since: Optional[float] = None,
+        before: Optional[float] = None,
+        text: Optional[str] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """Newest-first rows matching every given filter.
+
+        ``since``/``before`` bound ``finished_at`` (inclusive/exclusive).
+        ``text`` matches titles and URLs as a substring; it narrows the other
+        filters but has no index of its own.
+        """
+        clauses, params = [], []
+        for column, value in (("url", url), ("video_id", video_id), ("status", status)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("finished_at >= ?")
+            params.append(since)
+        if before is not None:
+            clauses.append("finished_at < ?")
+            params.append(before)
+        if text:
+            clauses.append("(title LIKE ? ESCAPE '\\' OR url LIKE ? ESCAPE '\\')")
+            pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params += [pattern, pattern]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = f"SELECT * FROM jobs {where} ORDER BY finished_at DESC LIMIT ?"
+        try:
+            with self._lock:
+                conn = self._connect_locked()
+                return [dict(row) for row in conn.execute(query, params + [limit])]
+        except sqlite3.Error as e:
+            app_logger.log_warning(f"Could not search job history: {e}")
+            return []
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect_locked().execute(
+                "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+        with self._lock:
+            rows = self._connect_locked().execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    def prune(self, older_than: float) -> int:
+        """Delete rows that finished before ``older_than``; returns how many went."""
+        with self._lock:
+            conn = self._connect_locked()
+            with conn:
+                return conn.execute("DELETE FROM jobs WHERE finished_at < ?", (older_than,)).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connect_locked(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL keeps readers (history view, CLI) from blocking the writer
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+
+def format_row(row: Dict[str, Any]) -> str:
+    """One-line summary of a history row for terminal output."""
+    when = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["finished_at"]))
+    size = f"{row['size'] / (1024 * 1024):.1f} MiB" if row.get("size") else "-"
+    outcome = row.get("destination") or row.get("error") or ""
+    return f"{when}  {row['status']:<9} {size:>10}  {row.get('title') or row['url']}  {outcome}"
+
+
+def main(argv=None) -> int:
+    from downloader_service import default_data_dir
+
+    parser = argparse.ArgumentParser(description="List and search finished downloads")
+    parser.add_argument("--data-dir", default=default_data_dir())
+    parser.add_argument("--url", help="Exact URL")
+    parser.add_argument("--video-id", help="Video ID (e.g. the 11-character YouTube ID)")
+    parser.add_argument("--status", choices=["completed", "failed", "cancelled"])
+    parser.add_argument("--since", help="Only jobs finished on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--search", help="Substring of the title or URL")
+    parser.add_argument("-n", "--limit", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="One JSON object per line")
+    args = parser.parse_args(argv)
+
+    since = time.mktime(time.strptime(args.since, "%Y-%m-%d")) if args.since else None
+    history = JobHistory(os.path.join(args.data_dir, "job_history.sqlite3"))
+    rows = history.search(
+        url=args.url, video_id=args.video_id, status=args.status,
+        since=since, text=args.search, limit=args.limit,
+    )
+    for row in rows:
+        print(json.dumps(row, ensure_ascii=False) if args.json else format_row(row))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
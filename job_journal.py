@@ -0,0 +1,226 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from logger_config import app_logger
+
+
+def _pid_alive(pid: int) -> bool:
+    """True if a process with ``pid`` is still running."""
+    if pid <= 0:
+        return False
+    if sys.platform == "win32":
+        # os.kill(pid, 0) would terminate the process on Windows
+        import ctypes
+
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class JobJournal:
+    """Jobs that were queued or running, persisted so they survive a crash or quit.
+
+    Each entry holds the request (URL, format, quality), the partial file
+    yt-dlp is writing and how many bytes it had when last flushed. Entries are
+    removed as soon as a job finishes, so whatever is left when the app starts
+    again was interrupted. Resuming just queues the request again: yt-dlp
+    finds the ``.part`` file and continues it with an HTTP range request.
+
+    The journal is an append-only JSON-lines file shared by the GUI and the
+    CLI: adding a job, flushing its progress and removing it each append one
+    line, and the file is replayed only when someone asks what is still
+    open. It is compacted down to the open entries once superseded lines
+    outnumber them. Progress is flushed at most once per ``flush_interval``
+    seconds per job; the byte counts are informational, yt-dlp trusts the
+    file on disk.
+    """
+
+    # Lines appended by this process before it checks whether to compact
+    COMPACT_CHECK_LINES = 1000
+
+    def __init__(self, path: str, flush_interval: float = 5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # Only this process's jobs; everyone else's are replayed from disk
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # Distinguishes this process from an earlier one that had the same PID
+        self._owner = uuid.uuid4().hex
+        self._last_flush: Dict[str, float] = {}
+        self._appended = 0
+
+    def add(
+        self,
+        job_id: str,
+        url: str,
+        format_: str,
+        quality: str,
+        force: bool = False,
+        priority: int = 0,
+    ) -> None:
+        now = time.time()
+        entry = {
+            "job_id": job_id,
+            "url": url,
+            "format": format_,
+            "quality": quality,
+            "force": force,
+            "priority": priority,
+            "pid": os.getpid(),
+            "owner": self._owner,
+            "partial_path": None,
+            "downloaded_bytes": None,
+            "total_bytes": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._lock:
+            self._entries[job_id] = entry
+            self._append_locked(dict(entry, op="add"))
+
+    def update_progress(
+        self,
+        job_id: str,
+        partial_path: Optional[str],
+        downloaded_bytes: Optional[int],
+        total_bytes: Optional[int],
+    ) -> None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(job_id)
+            if entry is None:
+                return
+            changed_file = partial_path and partial_path != entry["partial_path"]
+            if not changed_file and now - self._last_flush.get(job_id, 0.0) < self.flush_interval:
+                return
+            if partial_path:
+                entry["partial_path"] = partial_path
+            entry["downloaded_bytes"] = downloaded_bytes
+            entry["total_bytes"] = total_bytes
+            entry["updated_at"] = time.time()
+            self._last_flush[job_id] = now
+            self._append_locked({
+                "op": "progress",
+                "job_id": job_id,
+                "partial_path": entry["partial_path"],
+                "downloaded_bytes": downloaded_bytes,
+                "total_bytes": total_bytes,
+                "updated_at": entry["updated_at"],
+            })
+
+    def remove(self, job_id: str) -> None:
+        with self._lock:
+            self._last_flush.pop(job_id, None)
+            if self._entries.pop(job_id, None) is None:
+                return
+            self._append_locked({"op": "remove", "job_id": job_id})
+            if self._appended >= self.COMPACT_CHECK_LINES:
+                # Replaying costs as much as the lines appended since the last check
+                self._appended = 0
+                self._maybe_compact_locked(*self._replay_locked())
+
+    def take_interrupted(self) -> List[Dict[str, Any]]:
+        """Remove and return entries left behind by processes that are no longer running.
+
+        Oldest first. Entries owned by another live process (e.g. the GUI
+        while the CLI starts up) are left alone.
+        """
+        with self._lock:
+            open_entries, lines = self._replay_locked()
+            interrupted = [
+                entry for entry in open_entries.values()
+                if entry.get("owner") != self._owner
+                and (entry.get("pid") == os.getpid() or not _pid_alive(int(entry.get("pid") or 0)))
+            ]
+            for entry in interrupted:
+                del open_entries[entry["job_id"]]
+                self._append_locked({"op": "remove", "job_id": entry["job_id"]})
+            self._maybe_compact_locked(open_entries, lines + len(interrupted))
+        return sorted(interrupted, key=lambda entry: entry.get("created_at") or 0)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            merged, _lines = self._replay_locked()
+            merged.update(self._entries)
+            return [dict(entry) for entry in merged.values()]
+
+    def _replay_locked(self) -> Tuple[Dict[str, Dict[str, Any]], int]:
+        """Entries still open in the file, and how many lines it took to find them."""
+        entries: Dict[str, Dict[str, Any]] = {}
+        lines = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # e.g. a line cut short by a crash
+                        continue
+                    job_id = record.get("job_id")
+                    op = record.pop("op", None)
+                    if not job_id:
+                        continue
+                    if op == "add" and record.get("url"):
+                        entries[job_id] = record
+                    elif op == "progress" and job_id in entries:
+                        entries[job_id].update(record)
+                    elif op == "remove":
+                        entries.pop(job_id, None)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            app_logger.log_warning(f"Ignoring unreadable job journal {self.path}: {e}")
+        return entries, lines
+
+    def _append_locked(self, record: Dict[str, Any]) -> None:
+        # Opened per line so a compaction by another process is never written past
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            self._appended += 1
+        except OSError as e:
+            app_logger.log_warning(f"Could not write job journal {self.path}: {e}")
+
+    def _maybe_compact_locked(self, open_entries: Dict[str, Dict[str, Any]], lines: int) -> None:
+        """Rewrite the file as just the open entries once it is mostly superseded lines.
+
+        A line another process appends while the file is being replaced can
+        be lost; at worst a finished job is offered for resuming, or an
+        interrupted one isn't.
+        """
+        if lines <= 2 * len(open_entries) + 100:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in open_entries.values():
+                    f.write(json.dumps(dict(entry, op="add")) + "\n")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            app_logger.log_warning(f"Could not compact job journal {self.path}: {e}")
+            return
+        self._appended = 0
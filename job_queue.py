@@ -0,0 +1,549 @@
+import heapq
+import itertools
+import os
+import signal
+import threading
+import time
+import uuid
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from logger_config import app_logger
+
+if TYPE_CHECKING:
+    import subprocess
+    from downloader_service import DownloadRequest
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled."""
+
+
+class JobState:
+    QUEUED = "queued"
+    RUNNING = "running"
+    PAUSED = "paused"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+
+class DownloadJob:
+    def __init__(
+        self,
+        req: "DownloadRequest",
+        on_line: Callable[[str], None],
+        on_done: Callable[[bool, Optional[str], Optional[str]], None],
+        priority: int = 0,
+        job_id: Optional[str] = None,
+        on_entry_done: Optional[Callable[[bool, Optional[str], Optional[str]], None]] = None,
+        on_progress: Optional[Callable[[Any], None]] = None,
+    ):
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.req = req
+        self.on_line = on_line
+        self._on_done = on_done
+        # Per-entry results when the job turns out to be a playlist
+        self.on_entry_done = on_entry_done
+        # Receives ProgressEvent objects (see progress_events)
+        self.on_progress = on_progress
+        self.priority = priority
+        self.state = JobState.QUEUED
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.destination: Optional[str] = None
+        self.error: Optional[str] = None
+        self.process: Optional["subprocess.Popen"] = None
+        # Info dict already extracted by a parent playlist job, if any
+        self.preloaded_info: Optional[Dict[str, Any]] = None
+        # Expected download size from format selection, when known
+        self.estimated_bytes: Optional[int] = None
+        # Filled in as the job learns them; kept for the job history
+        self.format_spec: Optional[str] = None
+        self.title: Optional[str] = None
+        self.video_key: Optional[str] = None
+
+        self._cancel_event = threading.Event()
+        # Set while the job is allowed to make progress; cleared on pause
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+        self._finish_lock = threading.Lock()
+        self._cancel_callbacks: List[Callable[[], None]] = []
+        self._finish_callbacks: List[Callable[["DownloadJob"], None]] = []
+        # Set by the queue; counts the job as finished
+        self._after_finish: Optional[Callable[["DownloadJob"], None]] = None
+        self.deferred = False
+        # Cancelled only because the process is going away; resume it next launch
+        self.resumable = False
+        # Set by the service: seconds to wait before re-running a failed attempt, or None
+        self.retry_delay: Optional[Callable[["DownloadJob", Optional[str]], Optional[float]]] = None
+        self.attempts = 0
+        # Delay before the next attempt, when the last one failed and will be retried.
+        # A handler that returns with this set hands the job back to the queue.
+        self.pending_retry: Optional[float] = None
+        # time.monotonic() before which the queue won't dispatch the job
+        self.not_before = 0.0
+        # In the queue's heap, waiting for a worker (as opposed to running or finished)
+        self._waiting = False
+        self._recorded = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def checkpoint(self) -> None:
+        """Block while the job is paused and raise JobCancelled once cancelled.
+
+        Called from progress hooks so pause/cancel take effect between chunks.
+        """
+        self._resume_event.wait()
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.job_id} was cancelled")
+
+    def throttle(self, seconds: float) -> None:
+        """Hold the job back for ``seconds`` to stay within its bandwidth allowance.
+
+        A yt-dlp subprocess is stopped for the duration (where SIGSTOP
+        exists); in-process downloads simply block the calling hook.
+        Cancellation cuts the wait short.
+        """
+        if seconds <= 0:
+            return
+        stopped = self.process is not None and hasattr(signal, "SIGSTOP")
+        if stopped:
+            self._signal_process("SIGSTOP")
+        try:
+            self._cancel_event.wait(seconds)
+        finally:
+            # Don't wake a job the user paused in the meantime
+            if stopped and self._resume_event.is_set():
+                self._signal_process("SIGCONT")
+
+    def wait_cancelled(self, seconds: float) -> bool:
+        """Sleep up to ``seconds``, returning early (True) if the job is cancelled."""
+        if seconds <= 0:
+            return self.cancelled
+        return self._cancel_event.wait(seconds)
+
+    def attach_process(self, process: "subprocess.Popen") -> None:
+        """Register the yt-dlp subprocess so pause/cancel can signal it."""
+        self.process = process
+        if self.cancelled:
+            self._terminate_process()
+
+    def defer_finish(self) -> None:
+        """Let the job outlive its worker; whoever deferred it must call finish().
+
+        Used by jobs that only coordinate other jobs (playlist fan-out) so they
+        don't hold a worker slot while their children run.
+        """
+        self.deferred = True
+
+    def add_cancel_callback(self, callback: Callable[[], None]) -> None:
+        self._cancel_callbacks.append(callback)
+
+    def remove_cancel_callback(self, callback: Callable[[], None]) -> None:
+        """Unregister a callback that is no longer needed, e.g. after a wait ends."""
+        try:
+            self._cancel_callbacks.remove(callback)
+        except ValueError:
+            pass
+
+    def add_finish_callback(self, callback: Callable[["DownloadJob"], None]) -> None:
+        """Call ``callback(job)`` once the job has finished, after its on_done."""
+        self._finish_callbacks.append(callback)
+
+    def request_cancel(self, resumable: bool = False) -> None:
+        """Flag the job as cancelled, wake it if paused and stop its subprocess."""
+        self.resumable = self.resumable or resumable
+        self._cancel_event.set()
+        self._resume_event.set()
+        self._terminate_process()
+        for callback in list(self._cancel_callbacks):
+            try:
+                callback()
+            except Exception:
+                app_logger.log_exception(f"Error in cancel callback for job {self.job_id}")
+
+    def finish(self, success: bool, destination: Optional[str], error: Optional[str]) -> None:
+        """Record the outcome and forward it to the caller's on_done exactly once."""
+        with self._finish_lock:
+            if self.state in JobState.FINISHED:
+                return
+            if not success and not self.cancelled and not self.deferred and self.retry_delay is not None:
+                delay = self.retry_delay(self, error)
+                if delay is not None:
+                    # Queued again once the attempt returns, instead of finishing
+                    self.pending_retry = delay
+                    return
+            if self.cancelled:
+                self.state = JobState.CANCELLED
+                success, error = False, error or "Cancelled"
+            else:
+                self.state = JobState.COMPLETED if success else JobState.FAILED
+            self.finished_at = time.time()
+            self.destination = destination
+            self.error = error
+        try:
+            self._on_done(success, destination, error)
+        except Exception:
+            app_logger.log_exception(f"Error in on_done callback for job {self.job_id}")
+        for callback in list(self._finish_callbacks):
+            try:
+                callback(self)
+            except Exception:
+                app_logger.log_exception(f"Error in finish callback for job {self.job_id}")
+        if self._after_finish is not None:
+            self._after_finish(self)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "url": self.req.url,
+            "format": self.req.format_,
+            "quality": self.req.quality,
+            "priority": self.priority,
+            "state": self.state,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "destination": self.destination,
+            "error": self.error,
+            "estimated_bytes": self.estimated_bytes,
+            "attempts": self.attempts,
+        }
+
+    def _signal_process(self, sig_name: str) -> None:
+        sig = getattr(signal, sig_name, None)
+        if self.process is None or sig is None or self.process.poll() is not None:
+            return
+        try:
+            os.kill(self.process.pid, sig)
+        except OSError as e:
+            app_logger.log_warning(f"Could not send {sig_name} to job {self.job_id}: {e}")
+
+    def _terminate_process(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            # A stopped process can't act on SIGTERM until it is continued
+            self._signal_process("SIGCONT")
+            self.process.terminate()
+
+
+class JobQueue:
+    """Priority job queue drained by a bounded pool of worker threads.
+
+    Higher ``priority`` values run first; jobs with equal priority run in
+    submission order. Workers are started lazily up to ``max_workers``.
+
+    A handler that returns with ``job.pending_retry`` set doesn't finish the
+    job: it goes back in the queue and isn't dispatched again for that many
+    seconds, so backoff never holds a worker slot.
+    """
+
+    THROUGHPUT_WINDOW = 60.0
+    # Finished jobs kept around for status/listing before being forgotten
+    FINISHED_HISTORY = 1000
+
+    def __init__(self, handler: Callable[[DownloadJob], None], max_workers: int = 2):
+        self._handler = handler
+        self._max_workers = max(1, int(max_workers))
+        self._heap: List[Tuple[int, int, DownloadJob]] = []
+        self._seq = itertools.count()
+        self._jobs: Dict[str, DownloadJob] = {}
+        self._cond = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._idle_workers = 0
+        self._running = 0
+        self._dispatch_paused = False
+        self._shutdown = False
+
+        self._finished_times: Deque[float] = deque()
+        self._finished_ids: Deque[str] = deque()
+        self._totals = {JobState.COMPLETED: 0, JobState.FAILED: 0, JobState.CANCELLED: 0}
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    def set_max_workers(self, max_workers: int) -> None:
+        """Resize the pool; surplus workers exit once their current job ends."""
+        with self._cond:
+            self._max_workers = max(1, int(max_workers))
+            app_logger.log_info(f"Download worker pool resized to {self._max_workers}")
+            self._spawn_workers_locked()
+            self._cond.notify_all()
+
+    def submit(self, job: DownloadJob) -> str:
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Job queue has been shut down")
+            self._jobs[job.job_id] = job
+            job._after_finish = self._record_finished
+            self._push_locked(job)
+            app_logger.log_info(
+                f"Queued job {job.job_id} (priority {job.priority}), depth={len(self._heap)}"
+            )
+        return job.job_id
+
+    def requeue(self, job: DownloadJob, delay: float = 0.0) -> None:
+        """Put a started job back in the queue, to be dispatched again after ``delay`` seconds.
+
+        For jobs a handler ran outside its own worker slot (see
+        ``take_queued``); the worker's own job is requeued through
+        ``pending_retry``. A job cancelled meanwhile is finished instead.
+        """
+        with self._cond:
+            cancelled = job.cancelled
+            if not cancelled:
+                self._push_locked(job, delay)
+        if cancelled:
+            job.finish(False, None, "Cancelled")
+
+    def get(self, job_id: str) -> Optional[DownloadJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[DownloadJob]:
+        with self._cond:
+            return list(self._jobs.values())
+
+    def take_queued(self, predicate: Callable[[DownloadJob], bool], limit: int) -> List[DownloadJob]:
+        """Start up to ``limit`` queued jobs accepted by ``predicate`` on the caller's worker.
+
+        For handlers that run several jobs at once (one process for a batch
+        of URLs). The jobs are marked running without taking extra worker
+        slots; each is counted as finished when it calls finish().
+        ``predicate`` runs under the queue lock, in priority order.
+        """
+        taken: List[DownloadJob] = []
+        now = time.monotonic()
+        with self._cond:
+            if self._dispatch_paused or self._shutdown:
+                return taken
+            kept: List[Tuple[int, int, DownloadJob]] = []
+            while self._heap and len(taken) < limit:
+                entry = heapq.heappop(self._heap)
+                job = entry[2]
+                if job.cancelled:
+                    job._waiting = False
+                    continue
+                if job.state == JobState.QUEUED and job.not_before <= now and predicate(job):
+                    self._start_locked(job)
+                    taken.append(job)
+                elif job.state in (JobState.QUEUED, JobState.PAUSED):
+                    kept.append(entry)
+            for entry in kept:
+                heapq.heappush(self._heap, entry)
+        return taken
+
+    def cancel(self, job_id: str, resumable: bool = False) -> bool:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in JobState.FINISHED:
+                return False
+            job.resumable = job.resumable or resumable
+            job._cancel_event.set()
+            job._resume_event.set()
+            not_started = job._waiting
+        app_logger.log_info(f"Cancelling job {job_id}")
+        if not_started:
+            # Still in the heap; the worker skips it when popped
+            job.finish(False, None, "Cancelled")
+        job.request_cancel(resumable)
+        return True
+
+    def pause(self, job_id: str) -> bool:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in (JobState.QUEUED, JobState.RUNNING):
+                return False
+            job.state = JobState.PAUSED
+            job._resume_event.clear()
+        job._signal_process("SIGSTOP")
+        app_logger.log_info(f"Paused job {job_id}")
+        return True
+
+    def resume(self, job_id: str) -> bool:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != JobState.PAUSED:
+                return False
+            job._resume_event.set()
+            if job._waiting:
+                job.state = JobState.QUEUED
+                self._cond.notify()
+            else:
+                job.state = JobState.RUNNING
+        job._signal_process("SIGCONT")
+        app_logger.log_info(f"Resumed job {job_id}")
+        return True
+
+    def pause_all(self) -> None:
+        """Stop dispatching queued jobs; running jobs are left alone."""
+        with self._cond:
+            self._dispatch_paused = True
+
+    def resume_all(self) -> None:
+        with self._cond:
+            self._dispatch_paused = False
+            self._cond.notify_all()
+
+    def status(self) -> Dict[str, Any]:
+        """Return queue depth, pool usage and throughput counters."""
+        now = time.time()
+        with self._cond:
+            while self._finished_times and now - self._finished_times[0] > self.THROUGHPUT_WINDOW:
+                self._finished_times.popleft()
+            queued = paused = 0
+            for job in self._jobs.values():
+                if job.state == JobState.QUEUED:
+                    queued += 1
+                elif job.state == JobState.PAUSED:
+                    paused += 1
+            finished = sum(self._totals.values())
+            return {
+                "queued": queued,
+                "running": self._running,
+                "paused": paused,
+                "max_workers": self._max_workers,
+                "dispatch_paused": self._dispatch_paused,
+                "completed": self._totals[JobState.COMPLETED],
+                "failed": self._totals[JobState.FAILED],
+                "cancelled": self._totals[JobState.CANCELLED],
+                "jobs_per_minute": len(self._finished_times) * 60.0 / self.THROUGHPUT_WINDOW,
+                "avg_wait_seconds": self._total_wait / finished if finished else 0.0,
+                "avg_run_seconds": self._total_run / finished if finished else 0.0,
+            }
+
+    def shutdown(self, cancel_pending: bool = True) -> None:
+        with self._cond:
+            self._shutdown = True
+            pending = [j for j in self._jobs.values() if j.state not in JobState.FINISHED]
+            self._cond.notify_all()
+        if cancel_pending:
+            for job in pending:
+                self.cancel(job.job_id)
+
+    def _spawn_workers_locked(self) -> None:
+        while len(self._workers) < self._max_workers and self._idle_workers < len(self._heap):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"download-worker-{len(self._workers) + 1}",
+                daemon=True,
+            )
+            self._workers.append(worker)
+            self._idle_workers += 1
+            worker.start()
+
+    def _push_locked(self, job: DownloadJob, delay: float = 0.0) -> None:
+        job.not_before = time.monotonic() + delay if delay > 0 else 0.0
+        if job.state != JobState.PAUSED:
+            job.state = JobState.QUEUED
+        job._waiting = True
+        heapq.heappush(self._heap, (-job.priority, next(self._seq), job))
+        self._spawn_workers_locked()
+        self._cond.notify()
+
+    def _start_locked(self, job: DownloadJob) -> None:
+        job._waiting = False
+        job.state = JobState.RUNNING
+        if job.started_at is None:
+            job.started_at = time.time()
+
+    def _next_job_locked(self) -> Tuple[Optional[DownloadJob], Optional[float]]:
+        """The next job to run, or None and how long until a delayed job becomes due."""
+        # Jobs paused, cancelled or not yet due stay in the heap and are skipped
+        skipped: List[Tuple[int, int, DownloadJob]] = []
+        job = None
+        due_in: Optional[float] = None
+        now = time.monotonic()
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            candidate = entry[2]
+            if candidate.cancelled:
+                candidate._waiting = False
+                continue
+            if candidate.state == JobState.QUEUED and candidate.not_before > now:
+                wait = candidate.not_before - now
+                due_in = wait if due_in is None else min(due_in, wait)
+                skipped.append(entry)
+                continue
+            if candidate.state == JobState.QUEUED:
+                job = candidate
+                break
+            if candidate.state == JobState.PAUSED:
+                skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return job, due_in
+
+    def _worker_loop(self) -> None:
+        me = threading.current_thread()
+        while True:
+            with self._cond:
+                job = None
+                while True:
+                    if self._shutdown or len(self._workers) > self._max_workers:
+                        self._workers.remove(me)
+                        self._idle_workers -= 1
+                        return
+                    due_in = None
+                    if not self._dispatch_paused and self._running < self._max_workers:
+                        job, due_in = self._next_job_locked()
+                        if job is not None:
+                            break
+                    self._cond.wait(due_in)
+                self._idle_workers -= 1
+                self._running += 1
+                self._start_locked(job)
+
+            app_logger.log_info(f"Worker {me.name} started job {job.job_id}")
+            try:
+                self._handler(job)
+            except Exception as exc:
+                app_logger.log_exception(f"Unhandled error in job {job.job_id}")
+                job.pending_retry = None
+                job.finish(False, None, str(exc))
+            finally:
+                self._after_run(job)
+
+    def _after_run(self, job: DownloadJob) -> None:
+        """Free the worker's slot and requeue, or make sure of a result for, the job it ran."""
+        retry = job.pending_retry if job.state not in JobState.FINISHED and not job.deferred else None
+        job.pending_retry = None
+        if retry is None and job.state not in JobState.FINISHED and not job.deferred:
+            job.finish(False, None, "Job ended without reporting a result")
+        with self._cond:
+            self._running -= 1
+            self._idle_workers += 1
+            # Checked under the lock, which cancel() also takes
+            requeued = retry is not None and not job.cancelled
+            if requeued:
+                self._push_locked(job, retry)
+            self._cond.notify_all()
+        if requeued:
+            app_logger.log_info(f"Job {job.job_id} requeued to run again in {retry:.1f}s")
+        elif retry is not None:
+            job.finish(False, None, "Cancelled")
+
+    def _record_finished(self, job: DownloadJob) -> None:
+        with self._cond:
+            if job._recorded:
+                return
+            job._recorded = True
+            self._totals[job.state] = self._totals.get(job.state, 0) + 1
+            now = time.time()
+            self._finished_times.append(job.finished_at or now)
+            while self._finished_times and now - self._finished_times[0] > self.THROUGHPUT_WINDOW:
+                self._finished_times.popleft()
+            self._finished_ids.append(job.job_id)
+            while len(self._finished_ids) > self.FINISHED_HISTORY:
+                self._jobs.pop(self._finished_ids.popleft(), None)
+            if job.started_at is not None:
+                self._total_wait += job.started_at - job.submitted_at
+                self._total_run += (job.finished_at or time.time()) - job.started_at
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from logger_config import app_logger
+
+_YOUTUBE_ID_RE = re.compile(r"^[0-9A-Za-z_-]{11}$")
+_YOUTUBE_HOSTS = ("youtube.com", "youtube-nocookie.com", "music.youtube.com")
+
+
+def canonical_video_id(url: str) -> Optional[str]:
+    """Return ``"youtube:<id>"`` for the common YouTube URL shapes, else None.
+
+    Different spellings of the same video (youtu.be, shorts, embed, extra
+    query parameters) map to the same key. A URL that also names a playlist
+    (``list=``) is a playlist download, not that one video, and gets no key.
+    """
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return None
+    host = (parsed.hostname or "").lower()
+    if "list" in parse_qs(parsed.query):
+        return None
+    if host.startswith("www.") or host.startswith("m."):
+        host = host.split(".", 1)[1]
+
+    candidate = None
+    if host == "youtu.be":
+        candidate = parsed.path.lstrip("/").split("/")[0]
+    elif host in _YOUTUBE_HOSTS:
+        if parsed.path == "/watch":
+            candidate = (parse_qs(parsed.query).get("v") or [None])[0]
+        else:
+            parts = parsed.path.strip("/").split("/")
+            if len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+                candidate = parts[1]
+    if candidate and _YOUTUBE_ID_RE.match(candidate):
+        return f"youtube:{candidate}"
+    return None
+
+
+def info_video_key(info: Dict[str, Any]) -> Optional[str]:
+    """Canonical key for an extracted info dict (``extractor:id``)."""
+    extractor = info.get("extractor_key") or info.get("extractor")
+    video_id = info.get("id")
+    if not extractor or not video_id:
+        return None
+    return f"{str(extractor).lower()}:{video_id}"
+
+
+def cache_key_for_url(url: str) -> str:
+    return canonical_video_id(url) or f"url:{url.strip()}"
+
+
+class MetadataCache:
+    """On-disk cache of yt-dlp info dicts with TTL and LRU eviction.
+
+    Each entry is a JSON file named after a hash of its key; the file's mtime
+    doubles as the last-access time so the LRU order survives restarts. Hits
+    reorder the in-memory index and only touch the file once the recorded
+    access is ``TOUCH_INTERVAL`` old, so repeated lookups during one job
+    don't write to disk.
+    Only single-video results are cached. Playlists are lazy and expensive to
+    serialize, and their entries are cached individually as they download.
+    """
+
+    TOUCH_INTERVAL = 300.0
+
+    def __init__(self, cache_dir: str, ttl: float = 3600.0, max_entries: int = 2000):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._index: Optional["OrderedDict[str, float]"] = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        return self._load(cache_key_for_url(url))
+
+    def get_by_key(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._load(key)
+
+    def put(self, url: str, info: Dict[str, Any]) -> None:
+        if info.get("_type", "video") != "video":
+            return
+        keys = {cache_key_for_url(url)}
+        video_key = info_video_key(info)
+        if video_key:
+            keys.add(video_key)
+        for key in keys:
+            self._store(key, info)
+
+    def invalidate(self, url: str) -> None:
+        """Drop the entry for ``url`` and the copy ``put`` stored under its ``extractor:id`` key."""
+        key = cache_key_for_url(url)
+        path = self._path(key)
+        with self._lock:
+            self._ensure_index_locked()
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                record = None
+            paths = {path}
+            if isinstance(record, dict) and record.get("key") == key and isinstance(record.get("info"), dict):
+                video_key = info_video_key(record["info"])
+                if video_key:
+                    paths.add(self._path(video_key))
+            for stale in paths:
+                self._remove_path_locked(stale)
+
+    def get_or_extract(
+        self, url: str, extract: Callable[[str], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Return cached info for ``url`` or call ``extract`` and cache its result."""
+        info = self.get(url)
+        if info is not None:
+            return info
+        info = extract(url)
+        if isinstance(info, dict):
+            self.put(url, info)
+        return info
+
+    def formats(self, url: str) -> Optional[List[Dict[str, Any]]]:
+        info = self.get(url)
+        return info.get("formats") if info else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = len(self._ensure_index_locked())
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _ensure_index_locked(self) -> "OrderedDict[str, float]":
+        if self._index is None:
+            entries = []
+            if os.path.isdir(self.cache_dir):
+                for name in os.listdir(self.cache_dir):
+                    if name.endswith(".json"):
+                        path = os.path.join(self.cache_dir, name)
+                        try:
+                            entries.append((os.path.getmtime(path), path))
+                        except OSError:
+                            continue
+            entries.sort()
+            self._index = OrderedDict((path, mtime) for mtime, path in entries)
+        return self._index
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        with self._lock:
+            index = self._ensure_index_locked()
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                index.pop(path, None)
+                self.misses += 1
+                return None
+            if record.get("key") != key or time.time() - record.get("stored_at", 0) > self.ttl:
+                self._remove_path_locked(path)
+                self.misses += 1
+                return None
+            now = time.time()
+            if now - index.get(path, 0) >= self.TOUCH_INTERVAL:
+                try:
+                    os.utime(path, (now, now))
+                except OSError:
+                    pass
+                index[path] = now
+            index.move_to_end(path)
+            self.hits += 1
+        app_logger.log_info(f"Metadata cache hit for {key}")
+        return record["info"]
+
+    def _store(self, key: str, info: Dict[str, Any]) -> None:
+        path = self._path(key)
+        record = {"key": key, "stored_at": time.time(), "info": info}
+        with self._lock:
+            index = self._ensure_index_locked()
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(record, f)
+                os.replace(tmp_path, path)
+            except (OSError, TypeError, ValueError) as e:
+                app_logger.log_warning(f"Could not write metadata cache entry for {key}: {e}")
+                return
+            index[path] = time.time()
+            index.move_to_end(path)
+            while len(index) > self.max_entries:
+                oldest, _ = index.popitem(last=False)
+                self._remove_path_locked(oldest)
+
+    def _remove_path_locked(self, path: str) -> None:
+        if self._index is not None:
+            self._index.pop(path, None)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,224 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from logger_config import app_logger
+
+# Upper bounds (seconds) shared by every timing histogram
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+METRIC_HELP = {
+    "ytd_jobs_total": "Jobs finished, by result",
+    "ytd_queue_wait_seconds": "Time jobs spent queued before a worker picked them up",
+    "ytd_extract_seconds": "Time spent extracting video metadata (Python module backend)",
+    "ytd_time_to_first_byte_seconds": "Time from job start to the first downloaded bytes",
+    "ytd_download_seconds": "Time from job start until a file finished downloading",
+    "ytd_downloaded_bytes_total": "Bytes of finished downloads",
+    "ytd_postprocess_seconds": "Time spent in the post-processing stage, by step",
+    "ytd_failures_total": "Failed jobs, by stage",
+    "ytd_retries_total": "Job attempts retried after a failure, by error class",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[int]:
+        total, result = 0, []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+class Metrics:
+    """In-process counters, histograms and per-job timing spans.
+
+    Export with ``to_prometheus`` / ``to_dict``, or let ``start_export``
+    rewrite a file periodically (Prometheus text, or JSON when the path ends
+    in ``.json``). Spans are kept for the most recent ``span_history`` jobs.
+    Use ``NullMetrics`` when metrics are disabled; every call is a no-op.
+    """
+
+    enabled = True
+
+    def __init__(self, span_history: int = 200):
+        self.span_history = span_history
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._spans: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._export_stop: Optional[threading.Event] = None
+        self._export_path = ""
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(DEFAULT_BUCKETS)
+            histogram.observe(value)
+
+    def record_span(self, job_id: str, name: str, start: float, end: float) -> None:
+        """Record a named phase of a job; ``start``/``end`` are ``time.time()`` values."""
+        with self._lock:
+            spans = self._spans.get(job_id)
+            if spans is None:
+                spans = self._spans[job_id] = []
+                while len(self._spans) > self.span_history:
+                    self._spans.popitem(last=False)
+            spans.append({"name": name, "start": start, "end": end, "seconds": end - start})
+
+    @contextmanager
+    def span(self, job_id: str, name: str, histogram: Optional[str] = None, **labels: Any) -> Iterator[None]:
+        """Time a block as a job span, optionally also observing it in ``histogram``."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            end = time.time()
+            self.record_span(job_id, name, start, end)
+            if histogram:
+                self.observe(histogram, end - start, **labels)
+
+    def job_spans(self, job_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(span) for span in self._spans.get(job_id, [])]
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: [
+                        {
+                            "labels": dict(key),
+                            "count": h.count,
+                            "sum": h.sum,
+                            "buckets": dict(zip(map(str, h.buckets), h.cumulative())),
+                        }
+                        for key, h in series.items()
+                    ]
+                    for name, series in self._histograms.items()
+                },
+                "spans": {job_id: list(spans) for job_id, spans in self._spans.items()},
+                "generated_at": time.time(),
+            }
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in series.items():
+                    for bound, count in zip(h.buckets, h.cumulative()):
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {h.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Write a snapshot atomically; JSON if ``path`` ends in .json, else Prometheus text."""
+        text = json.dumps(self.to_dict()) if path.endswith(".json") else self.to_prometheus()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def start_export(self, path: str, interval: float = 15.0) -> None:
+        """Rewrite ``path`` every ``interval`` seconds on a daemon thread."""
+        self.stop_export()
+        stop = self._export_stop = threading.Event()
+        self._export_path = path
+
+        def loop() -> None:
+            while not stop.wait(interval):
+                self._write_quietly(path)
+
+        threading.Thread(target=loop, name="metrics-export", daemon=True).start()
+
+    def stop_export(self) -> None:
+        """Stop periodic export, writing one final snapshot."""
+        if self._export_stop is not None:
+            self._export_stop.set()
+            self._export_stop = None
+            self._write_quietly(self._export_path)
+
+    def _write_quietly(self, path: str) -> None:
+        try:
+            self.write(path)
+        except OSError as e:
+            app_logger.log_warning(f"Could not write metrics to {path}: {e}")
+
+
+class NullMetrics(Metrics):
+    """Metrics disabled: same interface, nothing recorded."""
+
+    enabled = False
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        pass
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        pass
+
+    def record_span(self, job_id: str, name: str, start: float, end: float) -> None:
+        pass
+
+    @contextmanager
+    def span(self, job_id: str, name: str, histogram: Optional[str] = None, **labels: Any) -> Iterator[None]:
+        yield
+
+    def start_export(self, path: str, interval: float = 15.0) -> None:
+        pass
@@ -0,0 +1,69 @@
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+# Named layouts for Settings.output_template; anything else is used as a yt-dlp template.
+# Every layout keeps the video ID in the name, so two videos can't map to one file,
+# and the sharded ones keep each directory small enough to list quickly.
+OUTPUT_LAYOUTS: Dict[str, str] = {
+    "flat": "%(title)s [%(id)s].%(ext)s",
+    "by-uploader": "%(uploader,channel,uploader_id|Unknown)s/%(title)s [%(id)s].%(ext)s",
+    "by-date": "%(upload_date>%Y|unknown)s/%(upload_date>%m|00)s/%(title)s [%(id)s].%(ext)s",
+    "by-id": "%(id.0:2)s/%(title)s [%(id)s].%(ext)s",
+}
+DEFAULT_LAYOUT = "flat"
+
+# Info dict field holding a " (n)" disambiguator when a name is already taken
+SUFFIX_FIELD = "ytd_suffix"
+_EXT_MARKER = ".%(ext)s"
+
+
+def output_template(layout_or_template: Optional[str]) -> str:
+    """Expand a layout name; custom templates pass through unchanged."""
+    value = layout_or_template or DEFAULT_LAYOUT
+    return OUTPUT_LAYOUTS.get(value, value)
+
+
+def collision_safe(template: str) -> str:
+    """Add the disambiguator field ahead of the extension (it renders empty by default)."""
+    if template.endswith(_EXT_MARKER) and SUFFIX_FIELD not in template:
+        return template[: -len(_EXT_MARKER)] + f"%({SUFFIX_FIELD}|)s" + _EXT_MARKER
+    return template
+
+
+class PathClaims:
+    """Output paths reserved by running jobs, so two jobs never write the same file.
+
+    ``claim`` returns the suffix that makes a path free: "" when nothing
+    else uses it, otherwise " (1)", " (2)", ... A path counts as taken when
+    another job has claimed it or a file is already there that
+    ``is_same_download`` doesn't recognise as this job's own earlier result.
+    """
+
+    MAX_SUFFIX = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owners: Dict[str, str] = {}
+
+    def claim(self, owner: str, path: str, is_same_download: Callable[[str], bool]) -> str:
+        stem, ext = os.path.splitext(path)
+        with self._lock:
+            for n in range(self.MAX_SUFFIX):
+                suffix = f" ({n})" if n else ""
+                candidate = os.path.normcase(os.path.abspath(f"{stem}{suffix}{ext}"))
+                holder = self._owners.get(candidate)
+                if holder == owner:
+                    return suffix
+                if holder is not None:
+                    continue
+                if os.path.exists(candidate) and not is_same_download(candidate):
+                    continue
+                self._owners[candidate] = owner
+                return suffix
+        raise RuntimeError(f"No free file name for {path}")
+
+    def release(self, owner: str) -> None:
+        with self._lock:
+            for path in [p for p, holder in self._owners.items() if holder == owner]:
+                del self._owners[path]
@@ -0,0 +1,231 @@
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from logger_config import app_logger
+from job_queue import DownloadJob
+
+if TYPE_CHECKING:
+    from downloader_service import DownloaderService
+
+PLAYLIST_TYPES = ("playlist", "multi_video")
+# Leading path segments of playlist, channel and user pages
+_LIST_PATH_SEGMENTS = ("playlist", "channel", "c", "user")
+
+
+def is_playlist(info: Any) -> bool:
+    return isinstance(info, dict) and info.get("_type") in PLAYLIST_TYPES
+
+
+def looks_like_playlist(url: str) -> bool:
+    """Whether ``url`` is shaped like a playlist or channel page (no network I/O).
+
+    Only used where finding out for sure costs a yt-dlp run of its own
+    (the binary backend); the module backend asks the extractor instead.
+    """
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return False
+    if "list" in parse_qs(parsed.query):
+        return True
+    first = parsed.path.strip("/").split("/")[0]
+    return first in _LIST_PATH_SEGMENTS or first.startswith("@")
+
+
+def entry_url(entry: Dict[str, Any]) -> Optional[str]:
+    """URL a child job should download for a (possibly flat) playlist entry."""
+    if entry.get("_type") in ("url", "url_transparent"):
+        return entry.get("url") or entry.get("webpage_url")
+    return entry.get("webpage_url") or entry.get("original_url") or entry.get("url")
+
+
+def iter_entries(info: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield ``(url, entry)`` pairs, pulling further pages only as needed.
+
+    Nested playlists that were already extracted (e.g. channel tabs) are
+    flattened; ones still given as URLs become their own fan-out job.
+    Entries embedded in the playlist page itself have no URL of their own
+    and are addressed as ``<playlist url>#<entry id>``.
+    """
+    for position, entry in enumerate(info.get("entries") or (), start=1):
+        if not isinstance(entry, dict):
+            continue
+        if is_playlist(entry):
+            yield from iter_entries(entry)
+            continue
+        url = entry_url(entry)
+        if not url and entry.get("formats"):
+            url = f"{info.get('webpage_url')}#{entry.get('id') or position}"
+        if url:
+            yield url, entry
+
+
+class PlaylistFanOut:
+    """Runs each entry of a playlist as its own queued job.
+
+    At most ``limit`` entries are in flight at a time; the next entry is
+    pulled from the lazy entry generator whenever one finishes, so large
+    channels are never fully expanded up front. One thread at a time pulls
+    entries, outside the lock, so a page load never holds up siblings that
+    are only reporting a result. The parent job gives up its worker slot
+    while its children run and finishes once the last one does.
+
+    ``ydl`` is the YoutubeDL instance behind a lazy generator, closed once
+    the playlist is done; the binary backend passes None with a flat
+    ``-J --flat-playlist`` result.
+    """
+
+    def __init__(
+        self,
+        service: "DownloaderService",
+        parent: DownloadJob,
+        ydl: Optional[Any],
+        info: Dict[str, Any],
+        limit: int,
+        on_entry_done: Optional[Callable[[bool, Optional[str], Optional[str]], None]] = None,
+    ):
+        self.service = service
+        self.parent = parent
+        self.ydl = ydl
+        self.title = info.get("title") or info.get("id") or parent.req.url
+        self.limit = max(1, limit)
+        self.on_entry_done = on_entry_done
+        self._entries = iter_entries(info)
+        self._lock = threading.RLock()
+        self._active: Dict[str, int] = {}
+        self._index = 0
+        self._exhausted = False
+        # A thread is pulling entries; others leave new slots to it
+        self._pulling = False
+        self._completed = False
+        self.succeeded: List[str] = []
+        self.failed: List[Tuple[str, Optional[str]]] = []
+
+    def start(self) -> None:
+        self.parent.defer_finish()
+        self.parent.add_cancel_callback(self.cancel)
+        self.parent.on_line(f"[playlist] Expanding '{self.title}' ({self.limit} entries at a time)")
+        self._fill()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._exhausted = True
+            child_ids = list(self._active)
+        for child_id in child_ids:
+            self.service.queue.cancel(child_id)
+        self._maybe_complete()
+
+    def _next_entry(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        # May load the next page of the playlist, so never called under self._lock
+        try:
+            return next(self._entries)
+        except StopIteration:
+            return None
+        except Exception as e:
+            app_logger.log_exception(f"Error expanding playlist {self.parent.req.url}")
+            with self._lock:
+                self.failed.append((self.parent.req.url, f"Playlist expansion failed: {e}"))
+            return None
+
+    def _fill(self) -> None:
+        with self._lock:
+            if self._pulling:
+                # That thread checks for free slots again before it stops
+                return
+            self._pulling = True
+        try:
+            while True:
+                with self._lock:
+                    if self.parent.cancelled:
+                        self._exhausted = True
+                    if self._exhausted or len(self._active) >= self.limit:
+                        self._pulling = False
+                        break
+                item = self._next_entry()
+                if item is None:
+                    with self._lock:
+                        self._exhausted = True
+                    continue
+                self._submit_entry(*item)
+        except Exception:
+            with self._lock:
+                self._pulling = False
+            raise
+        finally:
+            self._maybe_complete()
+
+    def _submit_entry(self, url: str, entry: Dict[str, Any]) -> None:
+        from downloader_service import DownloadRequest
+
+        self.service.cache_entry_info(url, entry)
+        parent_req = self.parent.req
+        req = DownloadRequest(
+            url,
+            parent_req.format_,
+            parent_req.quality,
+            force=parent_req.force,
+            rate_limit=parent_req.rate_limit,
+        )
+        with self._lock:
+            if self._exhausted:
+                # Cancelled while the entry was being fetched
+                return
+            self._index += 1
+            index = self._index
+            child = DownloadJob(
+                req,
+                on_line=lambda line, i=index: self.parent.on_line(f"[{i}] {line}"),
+                on_done=lambda ok, dest, err, i=index, u=url: self._on_child_done(i, u, ok, dest, err),
+                priority=self.parent.priority,
+                on_entry_done=self.on_entry_done,
+                on_progress=self.parent.on_progress,
+            )
+            self._active[child.job_id] = index
+        if entry.get("formats"):
+            # Already fully extracted; the child only has to download
+            child.preloaded_info = entry
+        child.title = entry.get("title")
+        self.service.track(child)
+        app_logger.log_info(f"Playlist entry {index} queued as job {child.job_id}: {url}")
+        self.service.queue.submit(child)
+        if self.parent.cancelled:
+            # Cancelled between registering the child and queueing it
+            self.service.queue.cancel(child.job_id)
+
+    def _on_child_done(
+        self, index: int, url: str, success: bool, destination: Optional[str], error: Optional[str]
+    ) -> None:
+        with self._lock:
+            for job_id, child_index in list(self._active.items()):
+                if child_index == index:
+                    del self._active[job_id]
+            if success:
+                self.succeeded.append(destination or url)
+            else:
+                self.failed.append((url, error))
+        self.parent.on_line(
+            f"[{index}] {'Saved to: ' + str(destination) if success else 'Failed: ' + str(error)}"
+        )
+        if self.on_entry_done is not None:
+            try:
+                self.on_entry_done(success, destination, error)
+            except Exception:
+                app_logger.log_exception("Error in on_entry_done callback")
+        self._fill()
+
+    def _maybe_complete(self) -> None:
+        with self._lock:
+            if self._completed or not self._exhausted or self._active or self._pulling:
+                return
+            self._completed = True
+        if self.ydl is not None:
+            self.ydl.close()
+        total = len(self.succeeded) + len(self.failed)
+        summary = f"[playlist] {len(self.succeeded)} of {total} entries downloaded"
+        app_logger.log_info(f"{summary} for {self.parent.req.url}")
+        self.parent.on_line(summary)
+        if self.failed:
+            self.parent.finish(False, self.service.settings.downloads_dir, f"{len(self.failed)} of {total} entries failed")
+        else:
+            self.parent.finish(True, self.service.settings.downloads_dir, None)
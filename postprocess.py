@@ -0,0 +1,110 @@
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from logger_config import app_logger
+
+if TYPE_CHECKING:
+    from job_queue import DownloadJob
+
+
+def extract_audio_command(ffmpeg_path: str, source: str, destination: str) -> List[str]:
+    """ffmpeg arguments equivalent to yt-dlp's FFmpegExtractAudio (mp3, VBR quality 0)."""
+    return [
+        ffmpeg_path,
+        "-y",
+        "-nostdin",
+        "-loglevel", "error",
+        "-i", source,
+        "-vn",
+        "-codec:a", "libmp3lame",
+        "-q:a", "0",
+        "-f", "mp3",
+        destination,
+    ]
+
+
+def run_ffmpeg(job: "DownloadJob", command: List[str]) -> None:
+    """Run ffmpeg as the job's process, so pause/cancel reach it; raise on failure."""
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    job.attach_process(process)
+    _, stderr = process.communicate()
+    if job.cancelled:
+        raise RuntimeError("Cancelled")
+    if process.returncode != 0:
+        raise RuntimeError((stderr or "").strip() or f"ffmpeg exited with code {process.returncode}")
+
+
+class PostProcessStage:
+    """Second pipeline stage: CPU-bound conversions after the download has finished.
+
+    Each slot supervises one ffmpeg process, so at most ``max_workers``
+    transcodes (one per core by default) run alongside the download workers
+    instead of inside them. Keeps queue/latency counters for ``status``.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="postprocess"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    def submit(self, name: str, task: Callable[[], Any]) -> "Future[Any]":
+        submitted_at = time.monotonic()
+        with self._lock:
+            self._queued += 1
+        app_logger.log_info(f"Queued post-processing for {name}")
+
+        def run() -> Any:
+            started_at = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._total_wait += started_at - submitted_at
+            ok = False
+            try:
+                result = task()
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._total_run += time.monotonic() - started_at
+                    if ok:
+                        self._completed += 1
+                    else:
+                        self._failed += 1
+
+        return self._executor.submit(run)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "queued": self._queued,
+                "running": self._running,
+                "max_workers": self.max_workers,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_wait_seconds": self._total_wait / finished if finished else 0.0,
+                "avg_run_seconds": self._total_run / finished if finished else 0.0,
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait)
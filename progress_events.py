@@ -0,0 +1,237 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from logger_config import app_logger
+
+
+class ProgressPhase:
+    EXTRACTING = "extracting"
+    DOWNLOADING = "downloading"
+    FINISHED = "finished"
+    POSTPROCESSING = "postprocessing"
+    ERROR = "error"
+
+
+class ProgressEvent:
+    """One progress update for a job, shared by both backends."""
+
+    def __init__(
+        self,
+        job_id: str,
+        phase: str,
+        downloaded_bytes: Optional[int] = None,
+        total_bytes: Optional[int] = None,
+        speed: Optional[float] = None,
+        eta: Optional[float] = None,
+        filename: Optional[str] = None,
+        fragment_index: Optional[int] = None,
+        fragment_count: Optional[int] = None,
+        postprocessor: Optional[str] = None,
+        timestamp: Optional[float] = None,
+    ):
+        self.job_id = job_id
+        self.phase = phase
+        self.downloaded_bytes = downloaded_bytes
+        self.total_bytes = total_bytes
+        self.speed = speed
+        self.eta = eta
+        self.filename = filename
+        self.fragment_index = fragment_index
+        self.fragment_count = fragment_count
+        self.postprocessor = postprocessor
+        self.timestamp = timestamp if timestamp is not None else time.time()
+
+    @property
+    def fraction(self) -> Optional[float]:
+        if self.downloaded_bytes is None or not self.total_bytes:
+            return None
+        return min(1.0, self.downloaded_bytes / self.total_bytes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "phase": self.phase,
+            "downloaded_bytes": self.downloaded_bytes,
+            "total_bytes": self.total_bytes,
+            "speed": self.speed,
+            "eta": self.eta,
+            "filename": self.filename,
+            "fragment_index": self.fragment_index,
+            "fragment_count": self.fragment_count,
+            "postprocessor": self.postprocessor,
+            "timestamp": self.timestamp,
+        }
+
+
+def event_from_hook(job_id: str, d: Dict[str, Any]) -> ProgressEvent:
+    """Convert a yt-dlp progress hook dict into a ProgressEvent."""
+    status = d.get("status")
+    if status == "finished":
+        phase = ProgressPhase.FINISHED
+    elif status == "error":
+        phase = ProgressPhase.ERROR
+    else:
+        phase = ProgressPhase.DOWNLOADING
+    return ProgressEvent(
+        job_id,
+        phase,
+        downloaded_bytes=d.get("downloaded_bytes"),
+        total_bytes=d.get("total_bytes") or d.get("total_bytes_estimate"),
+        speed=d.get("speed"),
+        eta=d.get("eta"),
+        filename=d.get("filename") or d.get("filepath"),
+        fragment_index=d.get("fragment_index"),
+        fragment_count=d.get("fragment_count"),
+    )
+
+
+def event_from_postprocessor_hook(job_id: str, d: Dict[str, Any]) -> ProgressEvent:
+    info = d.get("info_dict") or {}
+    return ProgressEvent(
+        job_id,
+        ProgressPhase.POSTPROCESSING,
+        filename=info.get("filepath"),
+        postprocessor=f"{d.get('postprocessor')} {d.get('status')}",
+    )
+
+
+# Machine-readable progress for the yt-dlp binary (--newline --progress-template).
+# The filename goes last because it may contain spaces.
+PROGRESS_PREFIX = "[progress] "
+POSTPROCESS_PREFIX = "[postprocess] "
+FINAL_PATH_PREFIX = "[final] "
+PROGRESS_TEMPLATE = (
+    "download:" + PROGRESS_PREFIX
+    + "%(progress.status)s %(progress.downloaded_bytes)s %(progress.total_bytes)s "
+    "%(progress.total_bytes_estimate)s %(progress.speed)s %(progress.eta)s "
+    "%(progress.fragment_index)s %(progress.fragment_count)s %(progress.filename)s"
+)
+POSTPROCESS_TEMPLATE = (
+    "postprocess:" + POSTPROCESS_PREFIX + "%(progress.status)s %(progress.postprocessor)s"
+)
+FINAL_PATH_TEMPLATE = "after_move:" + FINAL_PATH_PREFIX + "%(filepath)s"
+# Printed as each URL of a --batch-file run starts (after extraction, before download)
+ITEM_PREFIX = "[item] "
+ITEM_TEMPLATE = "pre_process:" + ITEM_PREFIX + "%(original_url)s"
+
+
+def binary_progress_args() -> List[str]:
+    """yt-dlp command-line options that make it print parseable progress lines."""
+    return [
+        "--newline",
+        "--progress",
+        "--no-simulate",
+        "--progress-template", PROGRESS_TEMPLATE,
+        "--progress-template", POSTPROCESS_TEMPLATE,
+        "--print", FINAL_PATH_TEMPLATE,
+    ]
+
+
+def _number(value: str) -> Optional[float]:
+    if value in ("NA", "None", ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _int(value: str) -> Optional[int]:
+    number = _number(value)
+    return None if number is None else int(number)
+
+
+def parse_progress_line(job_id: str, line: str) -> Optional[ProgressEvent]:
+    """Parse a line produced by ``binary_progress_args``; None for any other line."""
+    if line.startswith(PROGRESS_PREFIX):
+        parts = line[len(PROGRESS_PREFIX):].split(" ", 8)
+        if len(parts) < 9:
+            return None
+        status, done, total, estimate, speed, eta, frag_index, frag_count, filename = parts
+        hook = {
+            "status": status,
+            "downloaded_bytes": _int(done),
+            "total_bytes": _int(total),
+            "total_bytes_estimate": _int(estimate),
+            "speed": _number(speed),
+            "eta": _number(eta),
+            "fragment_index": _int(frag_index),
+            "fragment_count": _int(frag_count),
+            "filename": None if filename == "NA" else filename,
+        }
+        return event_from_hook(job_id, hook)
+    if line.startswith(POSTPROCESS_PREFIX):
+        return ProgressEvent(
+            job_id, ProgressPhase.POSTPROCESSING, postprocessor=line[len(POSTPROCESS_PREFIX):]
+        )
+    return None
+
+
+def _human_bytes(value: Optional[float]) -> str:
+    if value is None:
+        return "N/A"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(value) < 1024 or unit == "GiB":
+            return f"{value:.2f}{unit}" if unit != "B" else f"{int(value)}B"
+        value /= 1024.0
+    return "N/A"
+
+
+def format_progress_line(event: ProgressEvent) -> str:
+    """Human-readable log line for an event (the classic ``[download]`` output)."""
+    if event.phase == ProgressPhase.DOWNLOADING:
+        fraction = event.fraction
+        percent = f"{fraction * 100:5.1f}%" if fraction is not None else "  N/A%"
+        eta = f"{int(event.eta) // 60:02d}:{int(event.eta) % 60:02d}" if event.eta is not None else "N/A"
+        speed = f"{_human_bytes(event.speed)}/s" if event.speed is not None else "N/A"
+        return f"[download] {percent} of ~{_human_bytes(event.total_bytes)} at {speed} ETA {eta}"
+    if event.phase == ProgressPhase.FINISHED:
+        size = _human_bytes(event.total_bytes or event.downloaded_bytes)
+        return f"[download] 100% of {size}" + (f"\n[download] Saved to: {event.filename}" if event.filename else "")
+    if event.phase == ProgressPhase.POSTPROCESSING:
+        return f"[postprocess] {event.postprocessor or ''}".rstrip()
+    if event.phase == ProgressPhase.EXTRACTING:
+        return "[extract] Extracting video information"
+    return f"[{event.phase}]"
+
+
+class ProgressEmitter:
+    """Fans one job's events out to subscribers, coalescing high-frequency updates.
+
+    ``downloading`` events are forwarded at most once per ``min_interval``
+    seconds; the ones in between are dropped, which loses nothing because
+    every event carries cumulative counters. Phase changes always go through.
+    """
+
+    def __init__(self, min_interval: float = 0.25):
+        self.min_interval = min_interval
+        self._subscribers: List[Callable[[ProgressEvent], None]] = []
+        self._lock = threading.Lock()
+        self._last_phase: Optional[str] = None
+        self._last_sent = 0.0
+        self.received = 0
+        self.forwarded = 0
+
+    def subscribe(self, callback: Callable[[ProgressEvent], None]) -> None:
+        self._subscribers.append(callback)
+
+    def emit(self, event: ProgressEvent) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.received += 1
+            if (
+                event.phase == ProgressPhase.DOWNLOADING
+                and self._last_phase == ProgressPhase.DOWNLOADING
+                and now - self._last_sent < self.min_interval
+                and event.fraction != 1.0
+            ):
+                return
+            self._last_phase = event.phase
+            self._last_sent = now
+            self.forwarded += 1
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception:
+                app_logger.log_exception("Error in progress subscriber")
@@ -0,0 +1,210 @@
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from logger_config import app_logger
+
+# Error classes, from yt-dlp / network error messages
+NETWORK = "network"
+SERVER = "server"
+THROTTLED = "throttled"
+FORBIDDEN = "forbidden"
+FATAL = "fatal"
+UNKNOWN = "unknown"
+
+# Classes that say something about the origin's health, not the request
+HOST_ERRORS = (NETWORK, SERVER, THROTTLED)
+
+_PATTERNS = [
+    (FATAL, re.compile(
+        r"HTTP Error (400|401|404|410)|Unsupported URL|is not a valid URL|Video unavailable|"
+        r"Private video|Sign in to confirm|members-only|not available in your country|"
+        r"No space left on device|Not enough disk space|Permission denied|Requested format is not available",
+        re.IGNORECASE,
+    )),
+    (THROTTLED, re.compile(r"HTTP Error 429|Too Many Requests|rate.?limit", re.IGNORECASE)),
+    (SERVER, re.compile(r"HTTP Error 5\d\d|Service Unavailable|Bad Gateway", re.IGNORECASE)),
+    (FORBIDDEN, re.compile(r"HTTP Error 403|Forbidden", re.IGNORECASE)),
+    (NETWORK, re.compile(
+        r"timed? ?out|Connection (reset|refused|aborted)|Remote end closed|IncompleteRead|"
+        r"urlopen error|Temporary failure in name resolution|Name or service not known|"
+        r"Network is unreachable|EOF occurred|giving up after \d+ (fragment )?retries|"
+        r"did not get any data blocks|Unable to download",
+        re.IGNORECASE,
+    )),
+]
+
+
+def classify_error(message: Optional[str]) -> str:
+    """Map an error message to one of the error classes above."""
+    if not message:
+        return UNKNOWN
+    for error_class, pattern in _PATTERNS:
+        if pattern.search(message):
+            return error_class
+    return UNKNOWN
+
+
+def host_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+class RetryRule:
+    """How often and how patiently to retry one error class.
+
+    ``max_attempts`` counts the first try; 1 means never retry. Delays grow
+    as ``base_delay * 2**(attempt - 1)`` up to ``max_delay``.
+    """
+
+    def __init__(self, max_attempts: int, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+
+DEFAULT_RULES: Dict[str, RetryRule] = {
+    NETWORK: RetryRule(5, base_delay=2.0, max_delay=60.0),
+    SERVER: RetryRule(4, base_delay=5.0, max_delay=120.0),
+    THROTTLED: RetryRule(4, base_delay=30.0, max_delay=300.0),
+    # Usually an expired stream URL; one fresh extraction tends to fix it
+    FORBIDDEN: RetryRule(2, base_delay=2.0, max_delay=10.0),
+    UNKNOWN: RetryRule(2, base_delay=5.0, max_delay=30.0),
+    FATAL: RetryRule(1),
+}
+
+
+class CircuitBreaker:
+    """Per-host circuit breaker.
+
+    After ``failure_threshold`` consecutive host-level failures the host's
+    circuit opens for ``reset_timeout`` seconds, during which new attempts
+    wait instead of hitting the origin. Once it elapses one attempt goes
+    through (half-open); success closes the circuit, failure reopens it.
+    Everyone else keeps waiting, re-checking every ``trial_poll`` seconds,
+    until the trial reports back or ``reset_timeout`` passes without a word.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0, trial_poll: float = 5.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_poll = trial_poll
+        self._lock = threading.Lock()
+        self._failures: Dict[str, int] = {}
+        self._open_until: Dict[str, float] = {}
+        # Half-open hosts: who holds the trial, and until when
+        self._trials: Dict[str, Tuple[str, float]] = {}
+
+    def remaining(self, host: str) -> float:
+        """Seconds until ``host`` may be tried again (0 when the circuit is closed)."""
+        with self._lock:
+            return self._remaining_locked(host, time.monotonic())
+
+    def acquire(self, host: str, holder: str) -> float:
+        """Like ``remaining``, but hands a half-open host's single trial to ``holder``.
+
+        Returns 0 when ``holder`` may go ahead; it should then report back
+        with ``record_success``, ``record_failure`` or ``release``.
+        """
+        now = time.monotonic()
+        with self._lock:
+            wait = self._remaining_locked(host, now)
+            if wait == 0 and host in self._open_until:
+                self._trials[host] = (holder, now + self.reset_timeout)
+            elif self._trials.get(host, ("", 0.0))[0] == holder:
+                return 0.0
+            return wait
+
+    def release(self, host: str, holder: str) -> None:
+        """Give back ``holder``'s trial without a verdict on the host (e.g. a 404, or cancelled)."""
+        with self._lock:
+            if self._trials.get(host, ("", 0.0))[0] == holder:
+                del self._trials[host]
+
+    def record_success(self, host: str) -> None:
+        with self._lock:
+            self._failures.pop(host, None)
+            self._open_until.pop(host, None)
+            self._trials.pop(host, None)
+
+    def record_failure(self, host: str) -> None:
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if failures >= self.failure_threshold:
+                self._open_until[host] = time.monotonic() + self.reset_timeout
+                self._trials.pop(host, None)
+                if failures == self.failure_threshold:
+                    app_logger.log_warning(
+                        f"{failures} consecutive failures from {host or 'unknown host'}; "
+                        f"pausing requests to it for {self.reset_timeout:.0f}s"
+                    )
+
+    def _remaining_locked(self, host: str, now: float) -> float:
+        until = self._open_until.get(host)
+        if until is None:
+            return 0.0
+        if until > now:
+            return until - now
+        trial = self._trials.get(host)
+        if trial is not None and trial[1] > now:
+            return min(self.trial_poll, trial[1] - now)
+        return 0.0
+
+    def open_hosts(self) -> Dict[str, float]:
+        now = time.monotonic()
+        with self._lock:
+            return {host: until - now for host, until in self._open_until.items() if until > now}
+
+
+class RetryPolicy:
+    """Retry rules per error class, exponential backoff with jitter and a host circuit breaker.
+
+    Applied at three levels: whole jobs are re-run by the service after
+    ``job_delay``; yt-dlp retries individual HTTP requests and fragments
+    itself with ``request_retries`` / ``fragment_retries``, sleeping
+    according to ``sleep_function``.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[Dict[str, RetryRule]] = None,
+        jitter: float = 0.5,
+        request_retries: int = 10,
+        fragment_retries: int = 10,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.rules = dict(DEFAULT_RULES)
+        self.rules.update(rules or {})
+        # Fraction of each delay that is randomised, so retries don't line up
+        self.jitter = jitter
+        self.request_retries = request_retries
+        self.fragment_retries = fragment_retries
+        self.breaker = breaker or CircuitBreaker()
+
+    def backoff(self, rule: RetryRule, attempt: int) -> float:
+        delay = min(rule.max_delay, rule.base_delay * (2 ** max(0, attempt - 1)))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+    def job_delay(self, url: str, error: Optional[str], attempt: int) -> Optional[float]:
+        """Seconds to wait before re-running a job whose ``attempt``-th try failed, or None to give up."""
+        error_class = classify_error(error)
+        host = host_of(url)
+        if error_class in HOST_ERRORS:
+            self.breaker.record_failure(host)
+        rule = self.rules.get(error_class, self.rules[UNKNOWN])
+        if attempt >= rule.max_attempts:
+            return None
+        return max(self.backoff(rule, attempt), self.breaker.remaining(host))
+
+    def sleep_function(self, error_class: str) -> Callable[[int], float]:
+        """yt-dlp ``retry_sleep_functions`` entry; yt-dlp passes the retry number from 0."""
+        rule = self.rules.get(error_class, self.rules[UNKNOWN])
+        return lambda n: self.backoff(rule, n + 1)
+
+    def sleep_expression(self, error_class: str) -> str:
+        """yt-dlp ``--retry-sleep`` equivalent of ``sleep_function`` (without jitter)."""
+        rule = self.rules.get(error_class, self.rules[UNKNOWN])
+        return f"exp={rule.base_delay:g}:{rule.max_delay:g}"
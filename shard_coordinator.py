@@ -0,0 +1,446 @@
+"""Spread one large batch of URLs over several downloader nodes.
+
+The nodes share a SQLite work table (on a shared volume, or a local file
+when the "nodes" are processes on one box). Each worker leases a few URLs
+at a time, renews its leases with heartbeats while it downloads them and
+reports every result back; a lease that stops being renewed expires and
+another node picks the URL up.
+
+    python shard_coordinator.py --db /shared/batch.sqlite3 add urls.txt --format Audio
+    python shard_coordinator.py --db /shared/batch.sqlite3 work -o /data/downloads -j 4
+    python shard_coordinator.py --db /shared/batch.sqlite3 status
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from logger_config import app_logger
+from downloader_service import DownloaderService, DownloadRequest, Settings
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    format TEXT NOT NULL,
+    quality TEXT NOT NULL,
+    force INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    node_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    destination TEXT,
+    size INTEGER,
+    error TEXT,
+    updated_at REAL,
+    UNIQUE (url, format, quality)
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_expires);
+CREATE TABLE IF NOT EXISTS nodes (
+    node_id TEXT PRIMARY KEY,
+    host TEXT,
+    started_at REAL,
+    last_heartbeat REAL,
+    running INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    stopped_at REAL
+);
+"""
+
+
+class ShardQueue:
+    """Leases over a shared table of URLs to download.
+
+    A task is ``pending`` until a node leases it, ``leased`` while that
+    node keeps renewing it, and ``done`` or ``failed`` once reported. An
+    expired lease counts as pending again, so a crashed or stalled node's
+    work moves on. Results from a node that has lost its lease are ignored.
+
+    Every lease counts as an attempt, whether it ends in a reported
+    failure or expires; after ``max_attempts`` the task fails for good, so
+    a URL that hangs whichever node takes it can't circulate forever. A
+    task goes back to another node than the one that last had it whenever
+    another node is alive.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 120.0, max_attempts: int = 3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def add(self, urls: List[str], format_: str = "Video", quality: str = "High", force: bool = False) -> int:
+        """Queue URLs not already in the table; returns how many were new."""
+        now = time.time()
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (url, format, quality, force, state, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(url, format_, quality, int(force), PENDING, now) for url in urls],
+            )
+            return conn.total_changes - before
+
+    def lease(self, node_id: str, limit: int) -> List[Dict[str, Any]]:
+        """Claim up to ``limit`` pending or expired tasks for ``node_id``."""
+        if limit <= 0:
+            return []
+        now = time.time()
+        with self._transaction() as conn:
+            exhausted = conn.execute(
+                "UPDATE tasks SET state = ?, lease_expires = NULL, error = ?, updated_at = ? "
+                "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, "Lease expired on every attempt", now, LEASED, now, self.max_attempts),
+            ).rowcount
+            if exhausted:
+                app_logger.log_warning(f"{exhausted} tasks failed after their last lease expired")
+            others_alive = conn.execute(
+                "SELECT COUNT(*) FROM nodes WHERE node_id != ? AND stopped_at IS NULL AND last_heartbeat >= ?",
+                (node_id, now - self.lease_seconds),
+            ).fetchone()[0]
+            # Tasks remember the node that last had them; leave those to the others
+            avoid = node_id if others_alive else None
+            rows = conn.execute(
+                "SELECT * FROM tasks WHERE (state = ? OR (state = ? AND lease_expires < ?)) "
+                "AND (? IS NULL OR node_id IS NULL OR node_id != ?) ORDER BY task_id LIMIT ?",
+                (PENDING, LEASED, now, avoid, avoid, limit),
+            ).fetchall()
+            for row in rows:
+                if row["state"] == LEASED:
+                    app_logger.log_warning(
+                        f"Lease on task {row['task_id']} held by {row['node_id']} expired; reassigning"
+                    )
+            conn.executemany(
+                "UPDATE tasks SET state = ?, node_id = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE task_id = ?",
+                [(LEASED, node_id, now + self.lease_seconds, now, row["task_id"]) for row in rows],
+            )
+        return [dict(row) for row in rows]
+
+    def heartbeat(self, node_id: str, task_ids: List[int], running: int = 0) -> List[int]:
+        """Renew ``node_id``'s leases; returns the IDs it no longer holds."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE nodes SET last_heartbeat = ?, running = ? WHERE node_id = ?",
+                (now, running, node_id),
+            )
+            lost = []
+            for task_id in task_ids:
+                renewed = conn.execute(
+                    "UPDATE tasks SET lease_expires = ? WHERE task_id = ? AND state = ? AND node_id = ?",
+                    (now + self.lease_seconds, task_id, LEASED, node_id),
+                ).rowcount
+                if not renewed:
+                    lost.append(task_id)
+        return lost
+
+    def complete(
+        self,
+        node_id: str,
+        task_id: int,
+        success: bool,
+        destination: Optional[str] = None,
+        size: Optional[int] = None,
+        error: Optional[str] = None,
+    ) -> bool:
+        """Record a result; False when the lease had already passed to another node."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM tasks WHERE task_id = ? AND state = ? AND node_id = ?",
+                (task_id, LEASED, node_id),
+            ).fetchone()
+            if row is None:
+                return False
+            if success:
+                state = DONE
+            else:
+                # Back in the pool; node_id stays so lease() offers it to other nodes first
+                state = FAILED if row["attempts"] >= self.max_attempts else PENDING
+            conn.execute(
+                "UPDATE tasks SET state = ?, lease_expires = NULL, destination = ?, size = ?, "
+                "error = ?, updated_at = ? WHERE task_id = ?",
+                (state, destination, size, error, now, task_id),
+            )
+            counter = "completed" if success else "failed"
+            conn.execute(
+                f"UPDATE nodes SET {counter} = {counter} + 1, bytes = bytes + ? WHERE node_id = ?",
+                (size or 0, node_id),
+            )
+            return True
+
+    def release(self, node_id: str, task_ids: List[int]) -> None:
+        """Hand unfinished tasks straight back instead of waiting for their leases to expire."""
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE tasks SET state = ?, node_id = NULL, lease_expires = NULL, "
+                "attempts = attempts - 1 WHERE task_id = ? AND state = ? AND node_id = ?",
+                [(PENDING, task_id, LEASED, node_id) for task_id in task_ids],
+            )
+
+    def stop_node(self, node_id: str) -> None:
+        """Mark ``node_id`` as gone, so tasks it failed aren't held back for other nodes."""
+        with self._transaction() as conn:
+            conn.execute("UPDATE nodes SET stopped_at = ? WHERE node_id = ?", (time.time(), node_id))
+
+    def register_node(self, node_id: str) -> None:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO nodes (node_id, host, started_at, last_heartbeat) VALUES (?, ?, ?, ?)",
+                (node_id, socket.gethostname(), now, now),
+            )
+
+    def remaining(self) -> int:
+        """Tasks not yet done or failed for good."""
+        with self._lock:
+            return self._connect_locked().execute(
+                "SELECT COUNT(*) FROM tasks WHERE state IN (?, ?)", (PENDING, LEASED)
+            ).fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect_locked().execute(
+                "SELECT state, COUNT(*) FROM tasks GROUP BY state"
+            ).fetchall()
+        return {state: count for state, count in rows}
+
+    def nodes(self) -> List[Dict[str, Any]]:
+        """Per-node totals and throughput (bytes per second since the node started)."""
+        now = time.time()
+        with self._lock:
+            rows = self._connect_locked().execute("SELECT * FROM nodes ORDER BY node_id").fetchall()
+        nodes = []
+        for row in rows:
+            node = dict(row)
+            elapsed = max(1e-6, (node["last_heartbeat"] or now) - node["started_at"])
+            node["bytes_per_second"] = node["bytes"] / elapsed
+            node["seconds_since_heartbeat"] = now - (node["last_heartbeat"] or now)
+            nodes.append(node)
+        return nodes
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            conn = self._connect_locked()
+            # Take the write lock up front so two nodes can't lease the same rows
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _connect_locked(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=60, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            # Default rollback journal rather than WAL: WAL doesn't work on network filesystems
+            conn.executescript(_SCHEMA)
+            _migrate(conn)
+            self._conn = conn
+        return self._conn
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Bring a work DB created by an older version up to the current schema."""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(nodes)")}
+    if "stopped_at" not in columns:
+        try:
+            conn.execute("ALTER TABLE nodes ADD COLUMN stopped_at REAL")
+        except sqlite3.OperationalError as e:
+            # Another node opening the DB at the same moment added it first
+            if "duplicate column" not in str(e):
+                raise
+
+
+class ShardWorker:
+    """Runs leased tasks on a local DownloaderService until the shared queue is empty.
+
+    Keeps about as many tasks leased as the service has workers, renews the
+    leases every ``lease_seconds / 3`` and cancels any download whose lease
+    was taken over by another node.
+    """
+
+    def __init__(self, service: DownloaderService, shards: ShardQueue, node_id: Optional[str] = None):
+        self.service = service
+        self.shards = shards
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._lock = threading.Lock()
+        self._active: Dict[int, str] = {}  # task ID -> local job ID
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+
+    def run(self) -> None:
+        self.shards.register_node(self.node_id)
+        app_logger.log_info(f"Node {self.node_id} working on {self.shards.path}")
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="shard-heartbeat", daemon=True)
+        heartbeat.start()
+        slots = max(1, self.service.settings.max_concurrent_downloads)
+        try:
+            while not self._stop.is_set():
+                with self._lock:
+                    free = slots - len(self._active)
+                for task in self.shards.lease(self.node_id, free):
+                    self._start(task)
+                with self._lock:
+                    idle = not self._active
+                if idle and self.shards.remaining() == 0:
+                    break
+                # Woken early when a task finishes; otherwise poll for expired leases
+                self._changed.wait(timeout=5.0)
+                self._changed.clear()
+        finally:
+            self.stop()
+            heartbeat.join()
+            self.shards.stop_node(self.node_id)
+
+    def stop(self) -> None:
+        """Cancel local downloads and return their tasks to the pool."""
+        self._stop.set()
+        self._changed.set()
+        with self._lock:
+            active = dict(self._active)
+            self._active.clear()
+        for job_id in active.values():
+            self.service.cancel(job_id)
+        if active:
+            self.shards.release(self.node_id, list(active))
+
+    def _start(self, task: Dict[str, Any]) -> None:
+        task_id = task["task_id"]
+        req = DownloadRequest(task["url"], task["format"], task["quality"], force=bool(task["force"]))
+
+        def on_done(success: bool, destination: Optional[str], error: Optional[str]) -> None:
+            with self._lock:
+                owned = self._active.pop(task_id, None) is not None
+            if owned:
+                size = os.path.getsize(destination) if success and destination and os.path.isfile(destination) else None
+                if not self.shards.complete(self.node_id, task_id, success, destination, size, error):
+                    app_logger.log_warning(f"Task {task_id} was reassigned before node {self.node_id} finished it")
+            self._changed.set()
+
+        # Registered before the job can finish, so on_done always finds it
+        with self._lock:
+            self._active[task_id] = ""
+        job_id = self.service.run(req, on_line=lambda line: None, on_done=on_done)
+        with self._lock:
+            if task_id in self._active:
+                self._active[task_id] = job_id
+
+    def _heartbeat_loop(self) -> None:
+        interval = max(1.0, self.shards.lease_seconds / 3)
+        while not self._stop.wait(interval):
+            with self._lock:
+                active = dict(self._active)
+            try:
+                lost = self.shards.heartbeat(self.node_id, list(active), running=len(active))
+            except sqlite3.Error as e:
+                app_logger.log_warning(f"Heartbeat from node {self.node_id} failed: {e}")
+                continue
+            for task_id in lost:
+                with self._lock:
+                    job_id = self._active.pop(task_id, None)
+                if job_id:
+                    app_logger.log_warning(f"Node {self.node_id} lost its lease on task {task_id}; cancelling")
+                    self.service.cancel(job_id)
+
+
+def format_status(shards: ShardQueue) -> str:
+    counts = shards.counts()
+    lines = ["  ".join(f"{state}={counts.get(state, 0)}" for state in (PENDING, LEASED, DONE, FAILED))]
+    for node in shards.nodes():
+        lines.append(
+            f"{node['node_id']:<28} running={node['running']:<3} done={node['completed']:<5} "
+            f"failed={node['failed']:<4} {node['bytes_per_second'] / (1024 * 1024):7.2f} MiB/s  "
+            f"last heartbeat {node['seconds_since_heartbeat']:.0f}s ago"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    from cli import read_urls
+    from toolchain import discover_toolchain
+
+    parser = argparse.ArgumentParser(description="Share one batch of downloads between several nodes")
+    parser.add_argument("--db", required=True, help="Shared work database (SQLite file)")
+    parser.add_argument("--lease", type=float, default=120.0, help="Seconds a silent node keeps its tasks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Queue the URLs in a batch file ('-' for stdin)")
+    add.add_argument("batch_file")
+    add.add_argument("--format", choices=["Video", "Audio"], default="Video")
+    add.add_argument("--quality", choices=["High", "Medium", "Low"], default="High")
+    add.add_argument("--force", action="store_true")
+
+    work = commands.add_parser("work", help="Download leased URLs until the batch is finished")
+    work.add_argument("-o", "--output-dir", default=os.path.expanduser("~/Downloads"))
+    work.add_argument("-j", "--jobs", type=int, default=2)
+    work.add_argument("--node-id", help="Name shown in status (default: host-pid)")
+
+    status = commands.add_parser("status", help="Progress of the batch and each node's throughput")
+    status.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    shards = ShardQueue(args.db, lease_seconds=args.lease)
+    if args.command == "add":
+        if args.batch_file == "-":
+            urls = read_urls(sys.stdin)
+        else:
+            with open(args.batch_file, encoding="utf-8") as f:
+                urls = read_urls(f)
+        added = shards.add(urls, args.format, args.quality, args.force)
+        print(f"Queued {added} new URLs ({len(urls) - added} already present)")
+        return 0
+    if args.command == "status":
+        if args.json:
+            print(json.dumps({"counts": shards.counts(), "nodes": shards.nodes()}))
+        else:
+            print(format_status(shards))
+        return 0
+
+    settings = Settings(
+        downloads_dir=os.path.abspath(os.path.expanduser(args.output_dir)),
+        max_concurrent_downloads=args.jobs,
+        log_to_stderr=True,
+    )
+    os.makedirs(settings.downloads_dir, exist_ok=True)
+    toolchain = discover_toolchain(os.path.join(settings.data_dir, "toolchain.json"))
+    settings.ffmpeg_path = toolchain.ffmpeg_path
+    service = DownloaderService(yt_dlp_path=toolchain.yt_dlp_path, settings=settings)
+    worker = ShardWorker(service, shards, args.node_id)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+    finally:
+        service.queue.shutdown(cancel_pending=True)
+    print(format_status(shards))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import io
+import subprocess
+import threading
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional
+
+from logger_config import app_logger
+
+if TYPE_CHECKING:
+    from job_queue import DownloadJob
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class StreamError(Exception):
+    """The download behind a MediaStream failed; the bytes read so far are incomplete."""
+
+
+class MediaStream(io.RawIOBase):
+    """Media bytes of one download, read straight from yt-dlp's stdout.
+
+    Nothing touches the disk and memory stays bounded: when the reader
+    falls behind, the pipe fills up and yt-dlp simply blocks. Use it like a
+    read-only binary file, iterate ``iter_chunks()``, or hand the pipe to
+    a consumer process with ``pipe_to``. Once the data runs out, a failed
+    download raises StreamError. Closing early cancels the download.
+    """
+
+    def __init__(
+        self,
+        job: "DownloadJob",
+        process: "subprocess.Popen",
+        feed: Callable[[str], float],
+        finish: Callable[[Optional[int], str], None],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        super().__init__()
+        self.job = job
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self._process = process
+        self._stdout = process.stdout
+        self._feed = feed
+        self._finish = finish
+        self._finished = False
+        self._error_lines: "deque[str]" = deque(maxlen=20)
+        self._stderr_thread = threading.Thread(
+            target=self._read_stderr, name=f"stream-{job.job_id}", daemon=True
+        )
+        self._stderr_thread.start()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._stdout is None:
+            return 0
+        # Whatever is available, so consumers see data as soon as it arrives
+        n = self._stdout.readinto1(buffer)
+        if not n:
+            self._complete(raise_on_error=True)
+            return 0
+        self.bytes_read += n
+        return n
+
+    def iter_chunks(self, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """Yield the media in chunks of at most ``chunk_size`` bytes."""
+        size = chunk_size or self.chunk_size
+        while True:
+            chunk = self.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+    def pipe_to(self, command: List[str], **popen_kwargs) -> int:
+        """Feed the stream into ``command``'s stdin without copying it through Python.
+
+        Must be called before anything is read. Returns the consumer's exit code.
+        """
+        if self._stdout is None or self.bytes_read:
+            raise ValueError("pipe_to() needs an unread stream")
+        consumer = subprocess.Popen(command, stdin=self._stdout, **popen_kwargs)
+        # The consumer holds its own copy of the read end now
+        self._stdout.close()
+        self._stdout = None
+        try:
+            returncode = consumer.wait()
+        except BaseException:
+            consumer.kill()
+            self.close()
+            raise
+        self._complete(raise_on_error=True)
+        return returncode
+
+    def close(self) -> None:
+        if not self.closed:
+            if self._process.poll() is None:
+                self.job.request_cancel()
+            self._complete(raise_on_error=False)
+        super().close()
+
+    def _read_stderr(self) -> None:
+        # yt-dlp writes all of its messages to stderr when the media goes to stdout
+        stderr = self._process.stderr
+        if stderr is None:
+            return
+        for raw in stderr:
+            line = raw.decode("utf-8", errors="replace").rstrip()
+            if line.startswith("ERROR:"):
+                self._error_lines.append(line)
+            try:
+                self.job.throttle(self._feed(line))
+            except Exception:
+                app_logger.log_exception(f"Error handling output of stream {self.job.job_id}")
+
+    def _complete(self, raise_on_error: bool) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        if self._stdout is not None:
+            self._stdout.close()
+            self._stdout = None
+        returncode = self._process.wait()
+        self._stderr_thread.join()
+        error = "\n".join(self._error_lines)
+        self._finish(returncode, error)
+        if raise_on_error and returncode != 0 and not self.job.cancelled:
+            raise StreamError(error or f"yt-dlp exited with code {returncode}")
@@ -0,0 +1,126 @@
+"""Disk-space admission tests; no network or yt-dlp needed.
+
+    python -m pytest tests
+"""
+import collections
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import disk_space  # noqa: E402
+import downloader_service  # noqa: E402
+from disk_space import GiB, parse_size  # noqa: E402
+from downloader_service import DownloaderService, DownloadRequest, Settings  # noqa: E402
+from job_queue import JobState  # noqa: E402
+
+FREE = 100 * GiB
+_Usage = collections.namedtuple("_Usage", "total used free")
+
+
+def test_parse_size():
+    assert parse_size("5G") == 5 * GiB
+    assert parse_size("500MiB") == 500 * 1024 ** 2
+    assert parse_size("1.5gb") == int(1.5 * GiB)
+    assert parse_size(" 1024 ") == 1024
+    assert parse_size(0) == 0
+
+
+@pytest.mark.parametrize("value", ["5G/s", "-1G", "lots", "", "inf", True, float("nan")])
+def test_parse_size_rejects(value):
+    with pytest.raises(ValueError):
+        parse_size(value)
+
+
+class FinishingBatch:
+    """Stands in for BinaryBatch: every URL it is given downloads at once."""
+
+    def __init__(self, service, jobs):
+        self.jobs = jobs
+
+    def run(self):
+        for job in self.jobs:
+            job.finish(True, f"/downloads/{job.job_id}.mp4", None)
+
+
+class FlakyBatch(FinishingBatch):
+    """The first URL downloads, the others hit a retryable server error."""
+
+    def run(self):
+        self.jobs[0].finish(True, f"/downloads/{self.jobs[0].job_id}.mp4", None)
+        for job in self.jobs[1:]:
+            job.finish(False, None, "ERROR: HTTP Error 503: Service Unavailable")
+
+
+def _cached_video(service, url, size):
+    service.metadata_cache.put(url, {
+        "_type": "video", "id": url.rsplit("/", 1)[-1], "extractor_key": "Generic", "duration": 60,
+        "formats": [{"format_id": "18", "ext": "mp4", "vcodec": "avc1", "acodec": "mp4a",
+                     "height": 360, "filesize": size}],
+    })
+
+
+def _batch_service(tmp_path, monkeypatch, batch_class, share_of_free):
+    monkeypatch.setattr(disk_space.shutil, "disk_usage", lambda path: _Usage(FREE, 0, FREE))
+    monkeypatch.setattr(downloader_service, "BinaryBatch", batch_class)
+    settings = Settings(str(tmp_path), data_dir=str(tmp_path / "data"), min_free_space=0, preallocate_space=False)
+    service = DownloaderService(yt_dlp_path="/usr/bin/false", settings=settings)
+    service.use_python_module = False
+    # Nothing dispatches jobs that go back in the queue
+    service.queue.pause_all()
+    jobs = []
+    for url in ["https://example.com/media/a", "https://example.com/media/b"]:
+        _cached_video(service, url, int(FREE * share_of_free))
+        job = service.create_job(DownloadRequest(url, "Video", "High", force=True),
+                                 on_line=lambda line: None, on_done=lambda ok, dest, err: None)
+        # As take_queued leaves them
+        job.state = JobState.RUNNING
+        jobs.append(job)
+    return service, jobs
+
+
+def test_batch_companion_that_does_not_fit_is_requeued(tmp_path, monkeypatch):
+    # Together they need 120% of the free space
+    service, (leader, companion) = _batch_service(tmp_path, monkeypatch, FinishingBatch, 0.6)
+
+    runner = threading.Thread(target=service._execute_batch, args=([leader, companion],), daemon=True)
+    runner.start()
+    runner.join(5)
+
+    assert not runner.is_alive(), "batch admission waited on its own batch-mate's reservation"
+    assert leader.state == JobState.COMPLETED
+    assert companion.state == JobState.QUEUED
+    assert companion.attempts == 0
+    assert service.disk_space.reserved() == 0
+
+
+def test_batch_member_waiting_to_retry_holds_no_space(tmp_path, monkeypatch):
+    service, (leader, companion) = _batch_service(tmp_path, monkeypatch, FlakyBatch, 0.1)
+
+    service._execute_batch([leader, companion])
+
+    assert leader.state == JobState.COMPLETED
+    assert companion.state == JobState.QUEUED
+    assert companion.attempts == 1
+    assert service.disk_space.reserved() == 0
+
+
+def test_job_waiting_to_retry_holds_no_space(tmp_path, monkeypatch):
+    service, (job, _other) = _batch_service(tmp_path, monkeypatch, FinishingBatch, 0.1)
+    job.estimated_bytes = GiB
+
+    def failing_attempt(job):
+        assert service._admit_download(job)
+        assert service.disk_space.reserved() == GiB
+        job.finish(False, None, "ERROR: HTTP Error 503: Service Unavailable")
+
+    monkeypatch.setattr(service, "_execute_attempt", failing_attempt)
+    service.start_job(job)
+
+    service.attempt(job)
+
+    assert job.pending_retry is not None
+    assert service.disk_space.reserved() == 0
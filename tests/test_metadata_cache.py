@@ -0,0 +1,102 @@
+"""MetadataCache tests with a stub extractor; no network or yt-dlp needed.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metadata_cache import MetadataCache, canonical_video_id  # noqa: E402
+
+VIDEO_URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+class StubExtractor:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, url):
+        self.calls.append(url)
+        return {"_type": "video", "id": "dQw4w9WgXcQ", "extractor_key": "Youtube", "title": "Stub"}
+
+
+def test_get_or_extract_extracts_once(tmp_path):
+    cache = MetadataCache(str(tmp_path))
+    extract = StubExtractor()
+
+    first = cache.get_or_extract(VIDEO_URL, extract)
+    second = cache.get_or_extract("https://youtu.be/dQw4w9WgXcQ?t=42", extract)
+
+    assert first == second
+    assert extract.calls == [VIDEO_URL]
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_get_or_extract_survives_restart(tmp_path):
+    MetadataCache(str(tmp_path)).get_or_extract(VIDEO_URL, StubExtractor())
+    extract = StubExtractor()
+
+    info = MetadataCache(str(tmp_path)).get_or_extract(VIDEO_URL, extract)
+
+    assert info["title"] == "Stub"
+    assert extract.calls == []
+
+
+def test_expired_entries_are_extracted_again(tmp_path):
+    cache = MetadataCache(str(tmp_path), ttl=0)
+    extract = StubExtractor()
+
+    cache.get_or_extract(VIDEO_URL, extract)
+    cache.get_or_extract(VIDEO_URL, extract)
+
+    assert len(extract.calls) == 2
+
+
+def test_playlists_are_not_cached(tmp_path):
+    cache = MetadataCache(str(tmp_path))
+    calls = []
+
+    def extract(url):
+        calls.append(url)
+        return {"_type": "playlist", "id": "PL1", "entries": []}
+
+    cache.get_or_extract("https://www.youtube.com/playlist?list=PL1", extract)
+    cache.get_or_extract("https://www.youtube.com/playlist?list=PL1", extract)
+
+    assert len(calls) == 2
+
+
+def test_hits_do_not_touch_the_file_every_time(tmp_path):
+    cache = MetadataCache(str(tmp_path))
+    cache.get_or_extract(VIDEO_URL, StubExtractor())
+    path = cache._path(canonical_video_id(VIDEO_URL))
+    os.utime(path, (1000, 1000))
+    cache._index[path] = cache._index[path] - 1
+
+    cache.get(VIDEO_URL)
+
+    assert os.path.getmtime(path) == 1000
+
+
+def test_invalidate_drops_the_video_key_copy(tmp_path):
+    cache = MetadataCache(str(tmp_path))
+    url = "https://example.com/media/clip.mp4"
+    cache.put(url, {"_type": "video", "id": "clip", "extractor_key": "Generic", "title": "Clip"})
+    assert cache.get_by_key("generic:clip") is not None
+
+    cache.invalidate(url)
+
+    assert cache.get(url) is None
+    assert cache.get_by_key("generic:clip") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_canonical_video_id():
+    assert canonical_video_id(VIDEO_URL) == "youtube:dQw4w9WgXcQ"
+    assert canonical_video_id("https://youtu.be/dQw4w9WgXcQ") == "youtube:dQw4w9WgXcQ"
+    assert canonical_video_id("https://www.youtube.com/shorts/dQw4w9WgXcQ") == "youtube:dQw4w9WgXcQ"
+    # A video inside a playlist is a playlist download, not that one video
+    assert canonical_video_id(VIDEO_URL + "&list=PLabc") is None
+    assert canonical_video_id("https://youtu.be/dQw4w9WgXcQ?list=PLabc") is None
+    assert canonical_video_id("https://example.com/watch?v=dQw4w9WgXcQ") is None
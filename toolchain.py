@@ -0,0 +1,526 @@
+import hashlib
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from logger_config import app_logger
+
+
+def extract_macos_certificates(dest_dir: Optional[str] = None):
+    """Extract root certificates from macOS keychain and create a PEM file.
+
+    The file goes in ``dest_dir`` (the toolchain manifest's directory) so a
+    cached manifest can keep pointing at it; otherwise in the temp directory.
+    """
+    try:
+        import tempfile
+
+        cert_file = os.path.join(dest_dir or tempfile.gettempdir(), "macos_certs.pem")
+        
+        # Extract certificates from macOS keychain using security command
+        # This gets all root certificates trusted by the system
+        try:
+            result = subprocess.run(
+                ['security', 'find-certificate', '-a', '-p', '/System/Library/Keychains/SystemRootCertificates.keychain'],
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
+            
+            if result.returncode == 0 and result.stdout:
+                with open(cert_file, 'w') as f:
+                    f.write(result.stdout)
+                app_logger.log_info(f"Extracted macOS certificates to: {cert_file}")
+                return cert_file
+        except Exception as e:
+            app_logger.log_warning(f"Could not extract certificates from keychain: {e}")
+        
+        return None
+    except Exception as e:
+        app_logger.log_exception("Error extracting macOS certificates")
+        return None
+
+
+def apply_certificate_bundle(cert_path: str) -> None:
+    """Point requests/urllib/yt-dlp at ``cert_path`` via env vars and the default SSL context."""
+    # Set SSL certificate path for requests/urllib/yt-dlp
+    os.environ['SSL_CERT_FILE'] = cert_path
+    os.environ['REQUESTS_CA_BUNDLE'] = cert_path
+    app_logger.log_info(f"SSL certificate environment variables set to: {cert_path}")
+
+    # Create default SSL context with certifi certificates
+    try:
+        ssl_context = ssl.create_default_context(cafile=cert_path)
+        ssl._create_default_https_context = lambda: ssl_context
+        app_logger.log_info("Default SSL context configured")
+    except Exception as e:
+        app_logger.log_warning(f"Could not set default SSL context: {e}")
+
+
+# System CA bundles of the common Linux distributions
+LINUX_CA_BUNDLES = [
+    "/etc/ssl/certs/ca-certificates.crt",  # Debian/Ubuntu/Arch/Gentoo
+    "/etc/pki/tls/certs/ca-bundle.crt",  # Fedora/RHEL
+    "/etc/ssl/ca-bundle.pem",  # openSUSE
+    "/etc/pki/tls/cacert.pem",  # OpenELEC
+    "/etc/ssl/cert.pem",  # Alpine
+]
+
+
+def configure_ssl_certificates(cache_dir: Optional[str] = None):
+    """Configure SSL certificates for the bundled app (macOS or Linux).
+
+    Returns the certificate bundle that was applied, or None.
+    """
+    try:
+        if getattr(sys, "frozen", False):
+            # Running as bundled app
+            app_logger.log_info("Configuring SSL certificates for bundled app...")
+            
+            # Get the base directory of the executable (Contents/MacOS/)
+            base_dir = os.path.dirname(os.path.abspath(sys.executable))
+            contents_dir = os.path.dirname(base_dir)  # Contents/
+            
+            # Try bundled certifi certificate first (if bundled with PyInstaller)
+            # PyInstaller places data files in different locations depending on the mode
+            bundled_cert_paths = [
+                os.path.join(contents_dir, "Resources", "certifi", "cacert.pem"),  # One-file mode
+                os.path.join(contents_dir, "Resources", "certifi", "cacert.pem"),  # One-dir mode
+                os.path.join(base_dir, "certifi", "cacert.pem"),  # Alternative location
+                os.path.join(sys._MEIPASS, "certifi", "cacert.pem") if hasattr(sys, '_MEIPASS') else None,  # PyInstaller temp dir
+            ]
+            
+            # Also check if certifi module is available in the bundle
+            try:
+                import certifi
+                module_cert = certifi.where()
+                if module_cert and os.path.exists(module_cert):
+                    bundled_cert_paths.insert(0, module_cert)  # Check this first
+            except ImportError:
+                pass
+            
+            cert_path = None
+            
+            # Check bundled locations first
+            for bundled_path in bundled_cert_paths:
+                if bundled_path and os.path.exists(bundled_path):
+                    cert_path = bundled_path
+                    app_logger.log_info(f"Found bundled certificate at: {cert_path}")
+                    break
+            
+            # If not found in bundle, try certifi module
+            if not cert_path:
+                try:
+                    import certifi
+                    cert_path = certifi.where()
+                    if os.path.exists(cert_path):
+                        app_logger.log_info(f"Using certifi certificates from: {cert_path}")
+                    else:
+                        cert_path = None
+                except ImportError:
+                    app_logger.log_warning("certifi not available")
+            
+            # If still no certificate, try the system: the macOS keychain or a distro bundle
+            if (not cert_path or not os.path.exists(cert_path)) and sys.platform == "darwin":
+                app_logger.log_info("Attempting to extract certificates from macOS keychain...")
+                macos_cert = extract_macos_certificates(cache_dir)
+                if macos_cert and os.path.exists(macos_cert):
+                    cert_path = macos_cert
+            elif not cert_path or not os.path.exists(cert_path):
+                cert_path = next((path for path in LINUX_CA_BUNDLES if os.path.exists(path)), None)
+                if cert_path:
+                    app_logger.log_info(f"Using system certificates from: {cert_path}")
+            
+            # If certifi path exists, use it
+            if cert_path and os.path.exists(cert_path):
+                apply_certificate_bundle(cert_path)
+                return cert_path
+            else:
+                app_logger.log_error("No SSL certificates found! SSL verification may fail.")
+                # Try macOS system certificates as last resort
+                try:
+                    system_certs = [
+                        "/etc/ssl/cert.pem",
+                        "/usr/local/etc/openssl/cert.pem",
+                        "/opt/homebrew/etc/openssl/cert.pem",
+                    ]
+                    
+                    for cert_file in system_certs:
+                        if os.path.exists(cert_file):
+                            app_logger.log_info(f"Found system certificates at: {cert_file}")
+                            os.environ['SSL_CERT_FILE'] = cert_file
+                            os.environ['REQUESTS_CA_BUNDLE'] = cert_file
+                            return cert_file
+                except Exception as e:
+                    app_logger.log_warning(f"Could not configure system certificates: {e}")
+                
+    except Exception as e:
+        app_logger.log_exception("Error configuring SSL certificates")
+    return None
+
+
+def find_linux_binary(name: str) -> Optional[str]:
+    """A frozen Linux build's own copy of ``name``, else the system's."""
+    base_dir = os.path.dirname(os.path.abspath(sys.executable))
+    bundled = [os.path.join(base_dir, name), os.path.join(base_dir, "app_binaries", name)]
+    if hasattr(sys, "_MEIPASS"):
+        bundled += [os.path.join(sys._MEIPASS, name), os.path.join(sys._MEIPASS, "app_binaries", name)]
+    for path in bundled:
+        if os.path.isfile(path):
+            if not os.access(path, os.X_OK):
+                app_logger.log_info(f"Making {path} executable...")
+                os.chmod(path, 0o755)
+            return os.path.realpath(path)
+    # Desktop launchers often run with a minimal PATH
+    system = [shutil.which(name), f"/usr/local/bin/{name}", f"/usr/bin/{name}",
+              os.path.expanduser(f"~/.local/bin/{name}")]
+    for path in system:
+        if path and os.path.isfile(path) and os.access(path, os.X_OK):
+            return os.path.realpath(path)
+    return None
+
+
+def get_yt_dlp_path():
+    """Find the correct yt-dlp path inside the .app bundle."""
+    try:
+        app_logger.log_info("Determining yt-dlp path...")
+        
+        if getattr(sys, "frozen", False) and sys.platform.startswith("linux"):
+            yt_dlp_path = find_linux_binary("yt-dlp")
+            app_logger.log_info(f"yt-dlp found at: {yt_dlp_path}")
+            return yt_dlp_path
+        if getattr(sys, "frozen", False):
+            app_logger.log_info("Running as frozen/bundled app")
+            
+            # Try multiple possible locations for yt-dlp in the bundle
+            possible_paths = [
+                os.path.join(os.path.dirname(sys.executable), "yt-dlp"),  # Contents/MacOS/
+                os.path.join(os.path.dirname(sys.executable), "..", "Resources", "yt-dlp"),  # Contents/Resources/
+                os.path.join(os.path.dirname(sys.executable), "..", "..", "Resources", "yt-dlp"),  # Alternative path
+            ]
+            
+            for yt_dlp_path in possible_paths:
+                yt_dlp_path = os.path.abspath(yt_dlp_path)
+                app_logger.log_info(f"Looking for yt-dlp at: {yt_dlp_path}")
+                
+                if os.path.exists(yt_dlp_path):
+                    app_logger.log_info(f"yt-dlp found at: {yt_dlp_path}")
+                    # Make sure it's executable
+                    if not os.access(yt_dlp_path, os.X_OK):
+                        app_logger.log_info("Making yt-dlp executable...")
+                        os.chmod(yt_dlp_path, 0o755)
+                    return yt_dlp_path
+            
+            app_logger.log_error("yt-dlp not found in any of the expected locations!")
+            return None
+        else:
+            app_logger.log_info("Running in development mode")
+            return "yt-dlp"
+    except Exception as e:
+        app_logger.log_exception("Error in get_yt_dlp_path")
+        return None
+
+
+def get_ffmpeg_path():
+    """Find the correct ffmpeg path inside the .app bundle, if bundled.
+    Returns None if not found; yt-dlp may still use a system ffmpeg if available.
+    """
+    try:
+        app_logger.log_info("Determining ffmpeg path...")
+
+        if getattr(sys, "frozen", False) and sys.platform.startswith("linux"):
+            ffmpeg_path = find_linux_binary("ffmpeg")
+            if not ffmpeg_path:
+                app_logger.log_warning("ffmpeg not found; audio extraction may rely on system ffmpeg")
+            return ffmpeg_path
+        if getattr(sys, "frozen", False):
+            app_logger.log_info("Running as frozen/bundled app (ffmpeg)")
+            
+            # Get the absolute path of sys.executable first
+            executable_abs = os.path.abspath(sys.executable)
+            app_logger.log_info(f"sys.executable: {sys.executable}")
+            app_logger.log_info(f"sys.executable (absolute): {executable_abs}")
+            
+            # Get the base directory of the executable (Contents/MacOS/)
+            base_dir = os.path.dirname(executable_abs)
+            contents_dir = os.path.dirname(base_dir)  # Contents/
+            
+            app_logger.log_info(f"base_dir (MacOS): {base_dir}")
+            app_logger.log_info(f"contents_dir: {contents_dir}")
+            
+            # Build absolute paths relative to the bundle structure
+            # Use os.path.join with already-absolute paths to ensure we get absolute results
+            possible_paths = [
+                os.path.join(base_dir, "ffmpeg"),  # Contents/MacOS/ffmpeg
+                os.path.join(contents_dir, "Resources", "ffmpeg"),  # Contents/Resources/ffmpeg
+                os.path.join(contents_dir, "Frameworks", "ffmpeg"),  # Contents/Frameworks/ffmpeg
+                # Common Homebrew locations (Finder/open often lacks PATH)
+                "/usr/local/bin/ffmpeg",           # Intel macs
+                "/opt/homebrew/bin/ffmpeg",        # Apple Silicon macs
+            ]
+
+            for ffmpeg_path in possible_paths:
+                # Normalize path (this preserves absolute paths)
+                ffmpeg_path = os.path.normpath(ffmpeg_path)
+                
+                app_logger.log_info(f"Looking for ffmpeg at: {ffmpeg_path}")
+                app_logger.log_info(f"Path exists: {os.path.exists(ffmpeg_path)}")
+                
+                if os.path.exists(ffmpeg_path):
+                    # Resolve symlinks to get the actual binary path
+                    real_path = os.path.realpath(ffmpeg_path)
+                    app_logger.log_info(f"ffmpeg found at: {ffmpeg_path} (resolved to: {real_path})")
+                    
+                    # Use the resolved path (real binary, not symlink)
+                    if os.path.exists(real_path):
+                        final_path = real_path
+                    else:
+                        final_path = ffmpeg_path
+                    
+                    # Ensure it's an absolute path (realpath should already be absolute, but be sure)
+                    if not os.path.isabs(final_path):
+                        final_path = os.path.abspath(final_path)
+                    
+                    # Make sure it's executable
+                    if not os.access(final_path, os.X_OK):
+                        app_logger.log_info("Making ffmpeg executable...")
+                        os.chmod(final_path, 0o755)
+                    
+                    app_logger.log_info(f"Using ffmpeg absolute path: {final_path}")
+                    return final_path
+
+            app_logger.log_warning("ffmpeg not found in bundled locations; audio extraction may rely on system ffmpeg")
+            return None
+        else:
+            # In development, prefer system ffmpeg if present
+            return "ffmpeg"
+    except Exception:
+        app_logger.log_exception("Error in get_ffmpeg_path")
+        return None
+
+
+TOOLCHAIN_CACHE_VERSION = 2
+# A manifest that didn't find every tool is trusted only this long, so an install is picked up
+MISSING_TOOL_TTL = 300.0
+
+
+class Toolchain:
+    def __init__(
+        self,
+        yt_dlp_path: Optional[str],
+        ffmpeg_path: Optional[str],
+        cert_path: Optional[str],
+        from_cache: bool = False,
+        versions: Optional[Dict[str, Optional[str]]] = None,
+        saved_at: Optional[float] = None,
+    ):
+        self.yt_dlp_path = yt_dlp_path
+        self.ffmpeg_path = ffmpeg_path
+        self.cert_path = cert_path
+        self.from_cache = from_cache
+        # Tool name -> version string reported when the toolchain was probed
+        self.versions = versions or {}
+        # When the manifest was written, for a cached toolchain
+        self.saved_at = saved_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The on-disk manifest: resolved paths plus what's needed to revalidate them."""
+        return {
+            "version": TOOLCHAIN_CACHE_VERSION,
+            "saved_at": self.saved_at if self.saved_at is not None else time.time(),
+            "executable": os.path.abspath(sys.executable),
+            "frozen": bool(getattr(sys, "frozen", False)),
+            "platform": sys.platform,
+            "path_env": os.environ.get("PATH", ""),
+            "yt_dlp_path": self.yt_dlp_path,
+            "ffmpeg_path": self.ffmpeg_path,
+            "cert_path": self.cert_path,
+            "cert_sha256": _sha256(self.cert_path) if self.cert_path else None,
+            "versions": self.versions,
+            "files": {
+                path: stamp
+                for path, stamp in ((p, _file_stamp(p)) for p in self._paths())
+                if stamp is not None
+            },
+        }
+
+    def missing_tools(self):
+        """Tools that discovery didn't resolve to an absolute path."""
+        tools = (("yt-dlp", self.yt_dlp_path), ("ffmpeg", self.ffmpeg_path))
+        return [name for name, path in tools if not path or not os.path.isabs(path)]
+
+    def _paths(self):
+        return [p for p in (self.yt_dlp_path, self.ffmpeg_path, self.cert_path) if p and os.path.isabs(p)]
+
+
+def _file_stamp(path: str) -> Optional[Dict[str, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _sha256(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _tool_version(path: Optional[str], flag: str) -> Optional[str]:
+    """First line of ``path flag`` (e.g. ``yt-dlp --version``), or None if it won't run."""
+    if not path:
+        return None
+    try:
+        result = subprocess.run([path, flag], capture_output=True, text=True, timeout=15)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    lines = (result.stdout or "").strip().splitlines()
+    if result.returncode != 0 or not lines:
+        return None
+    # "ffmpeg version 6.1.1 Copyright (c) ..." -> "6.1.1"
+    words = lines[0].split()
+    return words[2] if lines[0].startswith("ffmpeg version") and len(words) > 2 else lines[0].strip()
+
+
+def _resolve_command(path: Optional[str]) -> Optional[str]:
+    """Absolute path for a bare command name, so the manifest can stat it."""
+    if path and not os.path.isabs(path):
+        return shutil.which(path) or path
+    return path
+
+
+def load_cached_toolchain(cache_path: str) -> Optional[Toolchain]:
+    """Return the toolchain from the manifest if it is still valid.
+
+    Costs one stat per recorded file: a binary or certificate bundle that
+    moved, changed size or was modified invalidates the manifest, as does a
+    different interpreter, platform or PATH. A certificate bundle whose
+    timestamp changed but whose hash didn't is accepted. A manifest that
+    didn't find yt-dlp or ffmpeg is only used for ``MISSING_TOOL_TTL``
+    seconds after it was written; after that discovery runs again.
+    """
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        record.get("version") != TOOLCHAIN_CACHE_VERSION
+        or record.get("executable") != os.path.abspath(sys.executable)
+        or record.get("frozen") != bool(getattr(sys, "frozen", False))
+        or record.get("platform") != sys.platform
+        or record.get("path_env") != os.environ.get("PATH", "")
+    ):
+        return None
+    cert_path = record.get("cert_path")
+    files = record.get("files") or {}
+    saved_at = record.get("saved_at")
+    toolchain = Toolchain(
+        record.get("yt_dlp_path"), record.get("ffmpeg_path"), cert_path,
+        from_cache=True, versions=record.get("versions"),
+        saved_at=saved_at if isinstance(saved_at, (int, float)) else 0.0,
+    )
+    missing = toolchain.missing_tools()
+    if missing and not 0 <= time.time() - toolchain.saved_at < MISSING_TOOL_TTL:
+        app_logger.log_info(f"Toolchain manifest is stale: {', '.join(missing)} wasn't found")
+        return None
+    restamped = False
+    for path in toolchain._paths():
+        stamp = _file_stamp(path)
+        if stamp is None or path not in files:
+            app_logger.log_info(f"Toolchain manifest is stale: {path} is missing")
+            return None
+        if stamp == files[path]:
+            continue
+        if path == cert_path and _sha256(path) == record.get("cert_sha256"):
+            restamped = True
+            continue
+        app_logger.log_info(f"Toolchain manifest is stale: {path} has changed")
+        return None
+    if restamped:
+        # Record the new timestamp so the next launch is back to stat calls only
+        save_toolchain(cache_path, toolchain)
+    return toolchain
+
+
+def save_toolchain(cache_path: str, toolchain: Toolchain) -> None:
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(toolchain.to_dict(), f, indent=2)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        app_logger.log_warning(f"Could not cache toolchain discovery results: {e}")
+
+
+def discover_toolchain(cache_path: Optional[str] = None) -> Toolchain:
+    """Resolve certificates, yt-dlp and ffmpeg, reusing the cached manifest while it is valid."""
+    started = time.perf_counter()
+    if cache_path:
+        cached = load_cached_toolchain(cache_path)
+        if cached is not None:
+            if cached.cert_path:
+                apply_certificate_bundle(cached.cert_path)
+            app_logger.log_info(
+                f"Toolchain loaded from cache in {(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+            return cached
+
+    toolchain = Toolchain(
+        yt_dlp_path=None,
+        ffmpeg_path=None,
+        cert_path=configure_ssl_certificates(os.path.dirname(cache_path) if cache_path else None),
+    )
+    toolchain.yt_dlp_path = _resolve_command(get_yt_dlp_path())
+    toolchain.ffmpeg_path = _resolve_command(get_ffmpeg_path())
+    toolchain.versions = {
+        "yt-dlp": _tool_version(toolchain.yt_dlp_path, "--version"),
+        "ffmpeg": _tool_version(toolchain.ffmpeg_path, "-version"),
+    }
+    if cache_path:
+        save_toolchain(cache_path, toolchain)
+    app_logger.log_info(
+        f"Toolchain discovered in {(time.perf_counter() - started) * 1000:.1f} ms: "
+        f"yt-dlp {toolchain.versions['yt-dlp'] or 'unavailable'}, "
+        f"ffmpeg {toolchain.versions['ffmpeg'] or 'unavailable'}"
+    )
+    return toolchain
+
+
+def discover_toolchain_async(
+    cache_path: Optional[str],
+    on_ready: Callable[[Toolchain], None],
+    warm_import: bool = True,
+) -> threading.Thread:
+    """Run ``discover_toolchain`` on a background thread and hand the result to ``on_ready``.
+
+    With ``warm_import`` the yt_dlp module is imported on the same thread so
+    the first download doesn't pay for it.
+    """
+
+    def worker():
+        try:
+            toolchain = discover_toolchain(cache_path)
+        except Exception:
+            app_logger.log_exception("Error discovering toolchain")
+            toolchain = Toolchain(None, None, None)
+        on_ready(toolchain)
+        if warm_import:
+            try:
+                import yt_dlp  # noqa: F401
+            except ImportError:
+                pass
+
+    thread = threading.Thread(target=worker, name="toolchain-discovery", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from logger_config import app_logger
+
+
+def options_key(options: Dict[str, Any]) -> str:
+    """Stable key for an options dict as produced by ``build_options``."""
+    return json.dumps(options, sort_keys=True, default=repr)
+
+
+class PooledYoutubeDL:
+    """A warm ``yt_dlp.YoutubeDL`` plus a per-checkout progress hook list.
+
+    yt-dlp has no API for removing progress hooks, so a single dispatcher
+    hook (and one postprocessor hook) is registered once and forwards to
+    whatever the current borrower added.
+    """
+
+    def __init__(self, key: str, options: Dict[str, Any]):
+        import yt_dlp
+
+        self.key = key
+        self.ydl = yt_dlp.YoutubeDL(dict(options))
+        self.ydl.add_progress_hook(self._dispatch)
+        self.ydl.add_postprocessor_hook(self._dispatch_postprocessor)
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.uses = 0
+        # Set once the borrower takes ownership; the pool then forgets it
+        self.detached = False
+        self._hooks: List[Callable[[Dict[str, Any]], None]] = []
+        self._postprocessor_hooks: List[Callable[[Dict[str, Any]], None]] = []
+
+    def add_progress_hook(self, hook: Callable[[Dict[str, Any]], None]) -> None:
+        self._hooks.append(hook)
+
+    def add_postprocessor_hook(self, hook: Callable[[Dict[str, Any]], None]) -> None:
+        self._postprocessor_hooks.append(hook)
+
+    def reset(self) -> None:
+        self._hooks = []
+        self._postprocessor_hooks = []
+        self.last_used = time.time()
+
+    def close(self) -> None:
+        try:
+            self.ydl.close()
+        except Exception:
+            app_logger.log_exception("Error closing pooled YoutubeDL instance")
+
+    def _dispatch(self, d: Dict[str, Any]) -> None:
+        for hook in self._hooks:
+            hook(d)
+
+    def _dispatch_postprocessor(self, d: Dict[str, Any]) -> None:
+        for hook in self._postprocessor_hooks:
+            hook(d)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.ydl, name)
+
+
+class YoutubeDLPool:
+    """Keeps idle YoutubeDL instances keyed by their option set.
+
+    Instances are checked out exclusively (YoutubeDL is not thread-safe), so
+    concurrent jobs with identical options get separate instances. Idle
+    instances are evicted least-recently-used once ``max_idle`` is exceeded
+    and after ``idle_ttl`` seconds without use; their HTTP handlers, and the
+    kept-alive connections they hold, are reused by the next job.
+    """
+
+    def __init__(self, max_idle: int = 4, idle_ttl: float = 300.0):
+        self.max_idle = max_idle
+        self.idle_ttl = idle_ttl
+        self._idle: "OrderedDict[int, PooledYoutubeDL]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+
+    @contextmanager
+    def checkout(self, options: Dict[str, Any]) -> Iterator[PooledYoutubeDL]:
+        instance = self._acquire(options)
+        ok = False
+        try:
+            yield instance
+            ok = True
+        finally:
+            self._release(instance, reusable=ok)
+
+    def detach(self, instance: PooledYoutubeDL) -> None:
+        """Hand ownership of a checked-out instance to the caller.
+
+        The caller becomes responsible for closing it. Used when lazily
+        evaluated results (playlist entry generators) outlive the checkout.
+        """
+        instance.detached = True
+
+    def clear(self) -> None:
+        with self._lock:
+            instances = list(self._idle.values())
+            self._idle.clear()
+        for instance in instances:
+            instance.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "created": self.created,
+                "reused": self.reused,
+                "evicted": self.evicted,
+            }
+
+    def _acquire(self, options: Dict[str, Any]) -> PooledYoutubeDL:
+        key = options_key(options)
+        expired = []
+        found: Optional[PooledYoutubeDL] = None
+        with self._lock:
+            expired = self._expire_locked()
+            # Most recently released instance for this key first
+            for ident in reversed(self._idle):
+                if self._idle[ident].key == key:
+                    found = self._idle.pop(ident)
+                    self.reused += 1
+                    break
+        for instance in expired:
+            instance.close()
+        if found is not None:
+            found.uses += 1
+            return found
+
+        started = time.perf_counter()
+        instance = PooledYoutubeDL(key, options)
+        instance.uses = 1
+        with self._lock:
+            self.created += 1
+        app_logger.log_info(
+            f"Created YoutubeDL instance in {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+        return instance
+
+    def _release(self, instance: PooledYoutubeDL, reusable: bool) -> None:
+        if instance.detached:
+            return
+        if not reusable or self.max_idle <= 0:
+            # An instance that raised mid-download may be in a bad state
+            instance.close()
+            return
+        instance.reset()
+        evicted = []
+        with self._lock:
+            self._idle[id(instance)] = instance
+            while len(self._idle) > self.max_idle:
+                _, oldest = self._idle.popitem(last=False)
+                evicted.append(oldest)
+            self.evicted += len(evicted)
+        for old in evicted:
+            old.close()
+
+    def _expire_locked(self) -> List[PooledYoutubeDL]:
+        now = time.time()
+        expired = []
+        for ident, instance in list(self._idle.items()):
+            if now - instance.last_used > self.idle_ttl:
+                expired.append(self._idle.pop(ident))
+        self.evicted += len(expired)
+        return expired